@@ -0,0 +1,177 @@
+#  ./benchmarks/cases.py
+import asyncio
+import shutil
+import uuid
+from pathlib import Path
+from starlette.datastructures import UploadFile
+from tests import datasets
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def _check(result):
+    """ Eager apply() stores exceptions instead of raising them. """
+    if result.failed():
+        raise result.result
+
+
+class Case:
+    """
+    One benchmarked path. setup() builds its inputs (untimed) and returns a state object;
+    run(state) is timed and may be called several times with the same state.
+    """
+
+    name = None
+    # Sizes run by default; bigger ones can still be requested with --sizes
+    sizes = SIZES
+
+    def setup(self, workdir: Path, size: int):
+        raise NotImplementedError
+
+    def run(self, state):
+        raise NotImplementedError
+
+
+class Descriptors(Case):
+    """ compute_descriptors over fresh SMILES, with the descriptor cache off. """
+
+    name = "descriptors"
+    sizes = SIZES[:3]
+
+    def setup(self, workdir, size):
+        return datasets.synthetic_smiles(size)
+
+    def run(self, smiles):
+        from src.services.descriptor_service import compute_descriptors
+        compute_descriptors(smiles, use_cache=False)
+
+
+class ResultsFilter(Case):
+    """ GET /projects/{id}/results with typical descriptor ranges, streamed to the end as CSV. """
+
+    name = "results_filter"
+
+    def setup(self, workdir, size):
+        datasets.write_results_run(workdir / "project" / "runs" / "run", size)
+        return None
+
+    def run(self, state):
+        from src.routes.project import get_project_results
+        response = get_project_results(
+            "project", run_id="run",
+            min_qed=0.5, max_qed=1.0, min_weight=200.0, max_weight=500.0,
+            min_logp=-1.0, max_logp=5.0, min_tpsa=0.0, max_tpsa=140.0,
+            min_rotatable=0, max_rotatable=10, min_donors=0, max_donors=5,
+            min_acceptors=0, max_acceptors=10,
+            output_format="csv", preview=False, limit=None, cursor=None,
+        )
+
+        async def drain():
+            async for _ in response.body_iterator:
+                pass
+        asyncio.run(drain())
+
+
+class SimilaritySearch(Case):
+    """ GET /projects/{id}/similar: top-50 Tanimoto over an already indexed project. """
+
+    name = "similarity_search"
+    # Indexing fingerprints every row in setup, which dominates at a million rows
+    sizes = SIZES[:3]
+
+    def setup(self, workdir, size):
+        from src.services import fingerprint_index
+        run_path = workdir / "project" / "runs" / "run"
+        datasets.write_results_run(run_path, size)
+        fingerprint_index.index_run(run_path)
+        return datasets.synthetic_smiles(size)[size // 2]
+
+    def run(self, smiles):
+        from src.routes.project import find_similar_molecules
+        find_similar_molecules("project", smiles=smiles, k=50, min_similarity=0.0, workers=None)
+
+
+class Upload(Case):
+    """ save_smiles_file: streaming validation, canonicalization and de-duplication of an upload. """
+
+    name = "upload"
+
+    def setup(self, workdir, size):
+        (workdir / "project" / "input").mkdir(parents=True, exist_ok=True)
+        return datasets.write_smiles_file(workdir / "upload.csv", size)
+
+    def run(self, upload_path):
+        from src.services.project_service import save_smiles_file
+        with open(upload_path, "rb") as f:
+            asyncio.run(save_smiles_file("project", UploadFile(file=f, filename="upload.csv")))
+
+
+class TomlConfig(Case):
+    """ Writing and parsing back `size` sampling configs, as tasks, shards and coalescing do. """
+
+    name = "toml_config"
+    sizes = SIZES[:2]
+
+    def setup(self, workdir, size):
+        (workdir / "configs").mkdir(exist_ok=True)
+        return workdir / "configs", size
+
+    def run(self, state):
+        from src.executor.coalesce import write_sampling_config
+        from src.executor.runners import read_config
+        config_dir, count = state
+        for i in range(count):
+            config_path = config_dir / f"config_{i % 1000}.toml"
+            write_sampling_config(config_path, {
+                "run_type": "sampling", "device": "cpu", "json_out_config": str(config_dir / "sampling.json"),
+                "parameters": {
+                    "model_file": "priors/reinvent.prior", "output_file": str(config_dir / "raw_results.csv"),
+                    "num_smiles": i + 1, "unique_molecules": True, "randomize_smiles": True,
+                },
+            })
+            read_config(config_path)
+
+
+class GenerationTask(Case):
+    """ run_sampling_from_agent end to end: config, stub `reinvent`, descriptors, parquet and index. """
+
+    name = "task_generation"
+    sizes = SIZES[:3]
+
+    def setup(self, workdir, size):
+        model_path = workdir / "project" / "models"
+        model_path.mkdir(parents=True, exist_ok=True)
+        (model_path / "agent.pt").write_bytes(b"stub-model")
+        return workdir, size
+
+    def run(self, state):
+        from src.tasks.generation import run_sampling_from_agent
+        workdir, size = state
+        run_id = f"run_{uuid.uuid4().hex}"
+        _check(run_sampling_from_agent.apply(("project", size, run_id), task_id=str(uuid.uuid4())))
+        # The task logs failures and returns instead of raising
+        if not (workdir / "project" / "runs" / run_id / "results.parquet").exists():
+            raise RuntimeError(f"Generation produced no results; see {workdir / 'project' / 'runs' / run_id}")
+
+
+class TransferLearningTask(Case):
+    """ run_transfer_learning_task end to end on `size` training rows: data prep plus stub training. """
+
+    name = "task_transfer_learning"
+    sizes = SIZES[:3]
+
+    def setup(self, workdir, size):
+        input_path = workdir / "project" / "input"
+        input_path.mkdir(parents=True, exist_ok=True)
+        datasets.write_smiles_file(input_path / "train.csv", size)
+        return input_path
+
+    def run(self, input_path):
+        from src.tasks.transfer_learning import run_transfer_learning_task
+        # Prepared data is reused for unchanged input; drop it so each repeat measures the prep too
+        shutil.rmtree(input_path / "prepared", ignore_errors=True)
+        # force: otherwise every repeat after the first is skipped as unchanged
+        _check(run_transfer_learning_task.apply(("project",), {"num_epochs": 2, "force": True}, task_id=str(uuid.uuid4())))
+
+
+CASES = {case.name: case for case in (Descriptors(), ResultsFilter(), SimilaritySearch(), Upload(), TomlConfig(), GenerationTask(), TransferLearningTask())}
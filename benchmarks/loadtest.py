@@ -0,0 +1,331 @@
+#  ./benchmarks/loadtest.py
+"""
+Self-contained load test: the FastAPI app runs in-process behind an ASGI transport, Celery
+uses the in-memory broker and result backend with a thread-pool worker, Redis is an
+in-process fake, the DB is SQLite and REINVENT is the stub runner behind the warm executor.
+Concurrent clients drive a weighted mix of design/generate submissions, status polls and
+filtered downloads; the report has throughput and p50/p95/p99 latency per route, plus how
+long submitted jobs took to finish.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.loadtest --clients 50 --duration 60
+    python -m benchmarks.loadtest --mix design=1,generate=1,status=8,download=2 --delay 2 --json report.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from rdkit import RDLogger
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARK_DIR.parent
+DEFAULT_MIX = "design=1,generate=1,status=6,download=2"
+PROJECT_ID = "loadtest"
+SEED_RUN = "seed"
+
+
+def _configure_env(workdir: Path, args):
+    """ Must run before anything from src is imported: most settings are read at import time. """
+    os.environ.update({
+        "PROJECT_DIR": str(workdir / "projects"),
+        "REINVENT_TASKS_DIR": str(workdir / "tasks"),
+        "DATABASE_URL": f"sqlite:///{workdir / 'loadtest.sqlite'}",
+        "CPU_SLOTS_DIR": str(workdir / "cpu-slots"),
+        "EXECUTOR_SOCKET": str(workdir / "executor.sock"),
+        "EXECUTOR_RUNNER": "stub",
+        # Jobs that miss the executor fall back to the stub `reinvent` on PATH
+        "PATH": f"{BENCHMARK_DIR / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        "PYTHON": sys.executable,
+        "EXECUTOR_WORKERS": str(args.executor_workers),
+        "STUB_REINVENT_DELAY": str(args.delay),
+        "STUB_REINVENT_DELAY_PER_SMILES": str(args.delay_per_smiles),
+        "DESCRIPTOR_CACHE_PATH": "",
+        "RUN_CACHE_DIR": "",
+    })
+    # Tunables keep any value set by the caller
+    os.environ.setdefault("JOB_STATUS_FLUSH_INTERVAL", "0.2")
+    os.environ.setdefault("CPU_BUDGET_WAIT", "0")
+
+
+def _use_fake_redis():
+    """ Points every Redis client in the app at one in-process server. """
+    import fakeredis
+    from src.executor import coalesce, progress
+    from src.services import job_status, task_queue
+    server = fakeredis.FakeServer()
+    task_queue._redis = fakeredis.FakeAsyncRedis(server=server)
+    for module in (coalesce, job_status, progress):
+        module._redis = fakeredis.FakeRedis(server=server)
+
+
+def _celery_apps():
+    from src.tasks import celery_worker, generation, molecule_task, reinforcement_learning, sharding, transfer_learning
+    return [module.celery_app for module in (celery_worker, generation, molecule_task, reinforcement_learning, sharding, transfer_learning)]
+
+
+def _init_db():
+    import runpy
+    from sqlalchemy import text
+    runpy.run_module("src.db.init_db")
+    from src.db.connection import engine
+    with engine.connect() as conn:
+        # Lets API reads proceed while workers write
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+
+
+def _start_executor(workdir: Path):
+    log = open(workdir / "executor.log", "w")
+    process = subprocess.Popen([sys.executable, "-m", "src.executor.server"], cwd=REPO_ROOT,
+                               env={**os.environ, "PYTHONPATH": str(REPO_ROOT)}, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while not Path(os.environ["EXECUTOR_SOCKET"]).exists():
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError(f"Warm executor did not start; see {workdir / 'executor.log'}")
+        time.sleep(0.1)
+    return process
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.submitted = {}
+
+    async def request(self, http, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, url, **kwargs)
+        except Exception as e:
+            self.errors[route][type(e).__name__] += 1
+            return None
+        finally:
+            self.latencies[route].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[route][str(response.status_code)] += 1
+            return None
+        return response
+
+
+async def _design(http, rng, recorder, args):
+    response = await recorder.request(http, "POST /molecule/design", "POST", "/api/v1/molecule/design",
+                                      json={"num_smiles": args.num_smiles})
+    if response is not None:
+        recorder.submitted[response.json()["task_id"]] = ("design", datetime.utcnow())
+
+
+async def _generate(http, rng, recorder, args):
+    response = await recorder.request(http, "POST /projects/{id}/generate", "POST",
+                                      f"/api/v1/projects/{PROJECT_ID}/generate", params={"num_smiles": args.num_smiles})
+    if response is not None:
+        recorder.submitted[response.json()["task_id"]] = ("generate", datetime.utcnow())
+
+
+async def _status(http, rng, recorder, args):
+    if not recorder.submitted:
+        return
+    task_id = rng.choice(list(recorder.submitted))
+    await recorder.request(http, "GET /tasks/{id}", "GET", f"/api/v1/tasks/{task_id}")
+
+
+async def _download(http, rng, recorder, args):
+    params = {"run_id": SEED_RUN, "min_qed": rng.choice([0.3, 0.5, 0.7]), "max_weight": rng.choice([400.0, 500.0, 600.0]),
+              "limit": args.download_limit}
+    await recorder.request(http, "GET /projects/{id}/results", "GET", f"/api/v1/projects/{PROJECT_ID}/results", params=params)
+
+
+OPERATIONS = {"design": _design, "generate": _generate, "status": _status, "download": _download}
+
+
+def _parse_mix(spec: str):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def _client(http, seed: int, mix: dict, deadline: float, recorder: Recorder, args):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        await OPERATIONS[rng.choices(names, weights)[0]](http, rng, recorder, args)
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+def _job_outcomes(recorder: Recorder, drain: float):
+    """ Waits up to `drain` seconds for submitted jobs to finish; returns per-type counts and durations. """
+    from sqlalchemy import select
+    from src.db.connection import SessionLocal
+    from src.db.models import Job
+    deadline = time.monotonic() + drain
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(select(Job.task_id, Job.status, Job.finished_at)
+                              .where(Job.task_id.in_(list(recorder.submitted)))).all()
+        finished = {row.task_id: row for row in rows if row.status in ("completed", "failed")}
+        if len(finished) == len(recorder.submitted) or time.monotonic() > deadline:
+            break
+        time.sleep(0.5)
+
+    jobs = defaultdict(lambda: {"submitted": 0, "completed": 0, "failed": 0, "unfinished": 0, "seconds": []})
+    for task_id, (job_type, submitted_at) in recorder.submitted.items():
+        summary = jobs[job_type]
+        summary["submitted"] += 1
+        row = finished.get(task_id)
+        if row is not None:
+            summary[row.status] += 1
+            if row.finished_at:
+                summary["seconds"].append((row.finished_at - submitted_at).total_seconds())
+        else:
+            summary["unfinished"] += 1
+    return jobs
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _report(recorder: Recorder, jobs, elapsed: float, args):
+    routes = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": dict(recorder.errors[route]),
+            "requests_per_second": len(latencies) / elapsed,
+            **{name: value * 1000 if value is not None else None for name, value in _percentiles(latencies).items()},
+        }
+    job_report = {}
+    for job_type, summary in sorted(jobs.items()):
+        job_report[job_type] = {
+            **{key: summary[key] for key in ("submitted", "completed", "failed", "unfinished")},
+            "completed_per_second": summary["completed"] / elapsed,
+            **{f"{name}_seconds": value for name, value in _percentiles(summary["seconds"]).items()},
+        }
+    return {"config": {key: value for key, value in vars(args).items() if key != "json"},
+            "elapsed_seconds": elapsed, "routes": routes, "jobs": job_report}
+
+
+def _print_report(report):
+    print(f"\n{'route':<32}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<32}{stats['requests']:>10}{sum(stats['errors'].values()):>8}{stats['requests_per_second']:>9.1f}"
+              f"{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    for route, stats in report["routes"].items():
+        if stats["errors"]:
+            print(f"  {route} errors: {', '.join(f'{code} x{count}' for code, count in stats['errors'].items())}")
+    print(f"\n{'job':<12}{'submitted':>10}{'completed':>10}{'failed':>8}{'unfinished':>11}{'done/s':>9}"
+          f"{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    for job_type, stats in report["jobs"].items():
+        times = [stats[f"{name}_seconds"] for name in ("p50", "p95", "p99")]
+        print(f"{job_type:<12}{stats['submitted']:>10}{stats['completed']:>10}{stats['failed']:>8}{stats['unfinished']:>11}"
+              f"{stats['completed_per_second']:>9.2f}"
+              + "".join(f"{value:>9.2f}" if value is not None else f"{'-':>9}" for value in times))
+
+
+async def _drive(args, mix, recorder):
+    import httpx
+    from src.main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.request_timeout) as http:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(_client(http, i, mix, deadline, recorder, args) for i in range(args.clients)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the API and workers in one process, without external services.")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a client's requests, seconds")
+    parser.add_argument("--workers", type=int, default=4, help="Celery worker threads")
+    parser.add_argument("--executor-workers", type=int, default=2, help="warm stub REINVENT processes")
+    parser.add_argument("--delay", type=float, default=0.5, help="stub REINVENT seconds per sampling run")
+    parser.add_argument("--delay-per-smiles", type=float, default=0.0, help="extra stub seconds per SMILES")
+    parser.add_argument("--num-smiles", type=int, default=100, help="SMILES per design/generate request")
+    parser.add_argument("--download-rows", type=int, default=100_000, help="rows in the run that downloads filter")
+    parser.add_argument("--download-limit", type=int, default=1000, help="rows per download page")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--drain", type=float, default=60, help="seconds to wait for queued jobs after the load stops")
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args(argv)
+    mix = _parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        workdir = Path(tmp)
+        _configure_env(workdir, args)
+        sys.path.insert(0, str(REPO_ROOT))
+        from celery.contrib.testing.worker import start_worker
+        from celery.worker import state as worker_state
+        from tests import datasets
+
+        log_path = workdir / "app.log"
+        with open(log_path, "w") as log, contextlib.redirect_stdout(log):
+            RDLogger.DisableLog("rdApp.*")
+            _use_fake_redis()
+            apps = _celery_apps()
+            for app in apps:
+                # Prefetch of one keeps queued jobs purgeable when the load stops
+                app.conf.update(broker_url="memory://", result_backend="cache+memory://", worker_prefetch_multiplier=1)
+            _init_db()
+            project_path = Path(os.environ["PROJECT_DIR"]) / PROJECT_ID
+            (project_path / "models").mkdir(parents=True)
+            (project_path / "models" / "agent.pt").write_bytes(b"stub-model")
+            datasets.write_results_run(project_path / "runs" / SEED_RUN, args.download_rows)
+
+            executor = _start_executor(workdir)
+            recorder = Recorder()
+            try:
+                with start_worker(apps[0], concurrency=args.workers, pool="threads", perform_ping_check=False,
+                                  queues=["celery", "molecule", "generation"]):
+                    started = time.monotonic()
+                    asyncio.run(_drive(args, mix, recorder))
+                    elapsed = time.monotonic() - started
+                    jobs = _job_outcomes(recorder, args.drain)
+                    # Drop what is still queued or prefetched, then let the running jobs finish;
+                    # the thread pool does not wait for them on shutdown
+                    apps[0].control.purge()
+                    for task_id in recorder.submitted:
+                        worker_state.revoked.add(task_id)
+                    deadline = time.monotonic() + 60
+                    while worker_state.active_requests and time.monotonic() < deadline:
+                        time.sleep(0.2)
+            finally:
+                executor.terminate()
+                executor.wait(timeout=10)
+
+        report = _report(recorder, jobs, elapsed, args)
+        _print_report(report)
+        if args.json:
+            args.json.write_text(json.dumps(report, indent=2, default=str))
+        failed = sum(stats["failed"] for stats in report["jobs"].values())
+        if failed:
+            print(f"\n{failed} jobs failed; app log tail:\n" + log_path.read_text()[-3000:])
+        # Any 4xx/5xx or transport error means the numbers above describe a broken run
+        errors = sum(sum(stats["errors"].values()) for stats in report["routes"].values())
+        # Jobs still queued after --drain mean the workers could not keep up; their latency is missing above
+        unfinished = sum(stats["unfinished"] for stats in report["jobs"].values())
+        if errors or failed or unfinished:
+            print(f"\nFAILED: {errors} request errors, {failed} failed jobs, "
+                  f"{unfinished} jobs unfinished after {args.drain:g}s of --drain")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
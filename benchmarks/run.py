@@ -0,0 +1,209 @@
+#  ./benchmarks/run.py
+"""
+Benchmarks the backend hot paths on synthetic data and appends the results to a JSONL
+history, one line per run tagged with the git commit. The history is machine-specific
+and kept out of git.
+
+    python -m benchmarks.run                                 # every case at its default sizes
+    python -m benchmarks.run --cases descriptors,upload --sizes 1000,100000
+    python -m benchmarks.run --compare                       # diff against the previous entry
+    python -m benchmarks.run --compare <commit> --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARK_DIR.parent
+HISTORY_FILE = BENCHMARK_DIR / "history.jsonl"
+
+
+def _isolated_env(workdir: Path):
+    """ Environment for a case process: everything on local disk, no Redis, no caches, stub `reinvent`. """
+    return {
+        **os.environ,
+        "PATH": f"{BENCHMARK_DIR / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        "PYTHONPATH": str(REPO_ROOT),
+        "PYTHON": sys.executable,
+        "PROJECT_DIR": str(workdir),
+        "DATABASE_URL": f"sqlite:///{workdir / 'benchmark.sqlite'}",
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+        "CPU_SLOTS_DIR": str(workdir / "cpu-slots"),
+        "EXECUTOR_SOCKET": "",
+        "DESCRIPTOR_CACHE_PATH": "",
+        "RUN_CACHE_DIR": "",
+        "RESULTS_QUERY_CACHE_ENTRIES": "0",
+        "SAMPLING_COALESCE_WINDOW": "0",
+        "SAMPLING_SHARD_SIZE": str(10 ** 9),
+        "TL_MAX_RETRIES": "0",
+    }
+
+
+def _measure(case_name: str, size: int, repeat: int, workdir: Path):
+    """ Runs inside the case process: untimed setup, `repeat` timed runs, then one traced run for memory. """
+    from benchmarks.cases import CASES
+    import runpy
+    case = CASES[case_name]
+    runpy.run_module("src.db.init_db")
+    state = case.setup(workdir, size)
+
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.run(state)
+        seconds.append(time.perf_counter() - started)
+
+    # tracemalloc slows Python down, so memory gets its own run
+    tracemalloc.start()
+    case.run(state)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "case": case_name,
+        "size": size,
+        "repeat": repeat,
+        "seconds_min": min(seconds),
+        "seconds_median": statistics.median(seconds),
+        "rows_per_second": size / min(seconds) if min(seconds) else None,
+        "peak_traced_mb": traced_peak / 2 ** 20,
+        # ru_maxrss is KiB on Linux; covers setup too and not child processes
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_case(case_name: str, size: int, repeat: int, timeout: float):
+    """ Each case runs in a fresh process and temp dir, so peaks and caches don't leak between cases. """
+    with tempfile.TemporaryDirectory(prefix=f"bench-{case_name}-") as tmp:
+        workdir = Path(tmp)
+        result_file = workdir / "result.json"
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", case_name, str(size), str(repeat), str(result_file)]
+        log_file = workdir / "case.log"
+        with open(log_file, "w") as log:
+            completed = subprocess.run(command, cwd=REPO_ROOT, env=_isolated_env(workdir),
+                                       stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+        if completed.returncode != 0 or not result_file.exists():
+            tail = log_file.read_text()[-2000:]
+            return {"case": case_name, "size": size, "error": f"exit code {completed.returncode}", "log_tail": tail}
+        return json.loads(result_file.read_text())
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: Path = HISTORY_FILE):
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """ Prints per-case changes in min time and traced memory; returns the regressions beyond threshold. """
+    before = {(r["case"], r["size"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    print(f"\nCompared with {baseline['commit'] or '?'} ({baseline['timestamp']}):")
+    print(f"{'case':<24}{'size':>10}{'time':>12}{'change':>10}{'memory':>12}{'change':>10}")
+    for result in current["results"]:
+        if "error" in result:
+            print(f"{result['case']:<24}{result['size']:>10}  failed: {result['error']}")
+            continue
+        old = before.get((result["case"], result["size"]))
+        if old is None:
+            print(f"{result['case']:<24}{result['size']:>10}{result['seconds_min']:>11.3f}s{'new':>10}")
+            continue
+        time_change = result["seconds_min"] / old["seconds_min"] - 1 if old["seconds_min"] else 0.0
+        memory_change = result["peak_traced_mb"] / old["peak_traced_mb"] - 1 if old["peak_traced_mb"] else 0.0
+        flag = ""
+        if time_change > threshold or memory_change > threshold:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        print(f"{result['case']:<24}{result['size']:>10}{result['seconds_min']:>11.3f}s{time_change:>+10.1%}"
+              f"{result['peak_traced_mb']:>10.1f}MB{memory_change:>+10.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend hot paths on synthetic data.")
+    parser.add_argument("--cases", help="comma-separated case names (default: all)")
+    parser.add_argument("--sizes", help="comma-separated row counts (default: each case's own sizes)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case and size")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds before a case is abandoned")
+    parser.add_argument("--history", type=Path, default=HISTORY_FILE, help="JSONL file results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    parser.add_argument("--compare", nargs="?", const="", metavar="COMMIT",
+                        help="compare with the previous history entry, or the latest one for COMMIT")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        case_name, size, repeat, result_file = args.worker
+        result = _measure(case_name, int(size), int(repeat), Path(os.environ["PROJECT_DIR"]))
+        Path(result_file).write_text(json.dumps(result))
+        return 0
+
+    from benchmarks.cases import CASES
+    if args.list:
+        for case in CASES.values():
+            print(f"{case.name:<24}{','.join(map(str, case.sizes)):<28}{(case.__doc__ or '').strip()}")
+        return 0
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(",")] if args.sizes else None
+
+    run = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "results": [],
+    }
+    for name in names:
+        for size in sizes or CASES[name].sizes:
+            result = _run_case(name, size, args.repeat, args.timeout)
+            run["results"].append(result)
+            if "error" in result:
+                print(f"{name:<24}{size:>10}  failed: {result['error']}\n{result['log_tail']}")
+            else:
+                print(f"{name:<24}{size:>10}{result['seconds_min']:>11.3f}s{result['rows_per_second'] or 0:>14,.0f} rows/s"
+                      f"{result['peak_traced_mb']:>10.1f}MB traced{result['peak_rss_mb']:>10.1f}MB rss")
+
+    history = load_history(args.history)
+    regressions = []
+    if args.compare is not None:
+        candidates = [entry for entry in history if not args.compare or (entry["commit"] or "").startswith(args.compare)]
+        if candidates:
+            regressions = compare(run, candidates[-1], args.threshold)
+        else:
+            print(f"\nNo history entry to compare with{' for ' + args.compare if args.compare else ''}.")
+
+    if not args.no_save:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(run) + "\n")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,5 +2,14 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql://user:password@db/reinventdb"
+    # Driver for the API's async engine; derived from DATABASE_URL when empty
+    ASYNC_DATABASE_URL: str = ""
+
+    # Connection pool, per process (each uvicorn and Celery worker has its own)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
 
 settings = Settings()
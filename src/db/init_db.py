@@ -1,6 +1,26 @@
+from sqlalchemy import inspect, text
 from src.db.connection import engine
-from src.db.models import Base
+from src.db.models import Base, Job
+
+
+def upgrade_jobs_table():
+    """
+    create_all() only creates missing tables; add the lifecycle columns and indexes
+    that older `jobs` tables don't have yet.
+    """
+    inspector = inspect(engine)
+    existing = {column["name"] for column in inspector.get_columns(Job.__tablename__)}
+    with engine.begin() as conn:
+        for column in Job.__table__.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {Job.__tablename__} ADD COLUMN "{column.name}" {column_type}'))
+                print(f"Added column jobs.{column.name}")
+        for index in Job.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
 
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+upgrade_jobs_table()
 print("Database tables created successfully!")
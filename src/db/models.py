@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Float, Integer, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -11,5 +11,15 @@ class Job(Base):
     project_id = Column(String, nullable=False)
     run_id = Column(String, nullable=False)
     job_type = Column(String, nullable=False)  # train / reinforce / generate
-    status = Column(String, default="queued")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String, default="queued")  # queued / running / completed / failed / revoked
+    created_at = Column(DateTime, default=datetime.utcnow)  # when the job was queued
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    molecule_count = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Run listings filter by project and page by creation time
+        Index("ix_jobs_project_created", "project_id", "created_at", "task_id"),
+    )
@@ -0,0 +1 @@
+from src.executor.client import run_reinvent, run_reinvent_container, submit
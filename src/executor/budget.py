@@ -0,0 +1,206 @@
+#  ./executor/budget.py
+import contextlib
+import contextvars
+import fcntl
+import os
+import time
+from pathlib import Path
+
+# Lock files shared by every worker on the node; mount the same directory into each worker container
+SLOTS_DIR = Path(os.environ.get("CPU_SLOTS_DIR", "/tmp/reinvent-cpu-slots"))
+# Seconds to wait for a job's full thread budget before running on whatever cores are free
+BUDGET_WAIT = float(os.environ.get("CPU_BUDGET_WAIT", "30"))
+POLL_INTERVAL = 0.2
+
+# Read by torch, numpy and RDKit's BLAS backends when the child process starts
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+try:
+    NODE_CPUS = sorted(os.sched_getaffinity(0))
+except AttributeError:
+    NODE_CPUS = list(range(os.cpu_count() or 1))
+
+
+def _default_budgets(cpus: int):
+    # Training is capped at a quarter of the node per queue so sampling always has cores left
+    quarter = max(1, cpus // 4)
+    return {
+        "tl": (quarter, 1),
+        "rl": (quarter, 1),
+        "generation": (quarter, 2),
+        "molecule": (quarter, 2),
+    }
+
+
+def _parse_budgets(spec: str, cpus: int):
+    """ Parses "queue=threads:limit,..." on top of the defaults, e.g. "tl=8:1,generation=2:4". """
+    budgets = _default_budgets(cpus)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        queue, _, value = item.partition("=")
+        queue = queue.strip()
+        threads, _, limit = value.partition(":")
+        default_threads, default_limit = budgets.get(queue, (1, 1))
+        budgets[queue] = (
+            min(cpus, max(1, int(threads or default_threads))),
+            max(1, int(limit or default_limit)),
+        )
+    return budgets
+
+
+# queue -> (threads per job, concurrent jobs on this node)
+QUEUE_BUDGETS = _parse_budgets(os.environ.get("QUEUE_CPU_BUDGETS", ""), len(NODE_CPUS))
+
+_current = contextvars.ContextVar("cpu_budget", default=None)
+
+
+class CpuBudget:
+    """ The cores a job holds; REINVENT runs pinned to them with one thread per core. """
+
+    def __init__(self, queue: str, cpus):
+        self.queue = queue
+        self.cpus = sorted(cpus)
+
+    @property
+    def threads(self):
+        return len(self.cpus)
+
+    def environ(self, base=None):
+        env = dict(os.environ if base is None else base)
+        env.update({name: str(self.threads) for name in THREAD_ENV_VARS})
+        return env
+
+    def as_job(self):
+        return {"cpus": self.cpus, "threads": self.threads}
+
+    def __repr__(self):
+        return f"CpuBudget(queue={self.queue!r}, cpus={self.cpus})"
+
+
+def current_budget():
+    """ The budget held by the running job, or None outside job_budget(). """
+    return _current.get()
+
+
+def _try_lock(path: Path):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _release(fds):
+    for fd in fds:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _acquire_queue_slot(queue: str, limit: int):
+    while True:
+        for i in range(limit):
+            fd = _try_lock(SLOTS_DIR / f"queue_{queue}_{i}.lock")
+            if fd is not None:
+                return fd
+        time.sleep(POLL_INTERVAL)
+
+
+def _acquire_cpus(threads: int):
+    """
+    Takes `threads` free cores, all or nothing, until BUDGET_WAIT has passed;
+    after that any free cores are enough so a long job can't starve a queue.
+    """
+    deadline = time.monotonic() + BUDGET_WAIT
+    while True:
+        held = {}
+        for cpu in NODE_CPUS:
+            fd = _try_lock(SLOTS_DIR / f"cpu_{cpu}.lock")
+            if fd is not None:
+                held[cpu] = fd
+                if len(held) == threads:
+                    return held
+        if held and time.monotonic() >= deadline:
+            return held
+        _release(held.values())
+        time.sleep(POLL_INTERVAL)
+
+
+@contextlib.contextmanager
+def job_budget(queue: str):
+    """
+    Holds a queue slot and a set of cores for the duration of a job. The calling process is
+    pinned to those cores, so child processes and descriptor pools inherit the same budget.
+    Locks are flock()s and are dropped by the kernel if the worker dies.
+    """
+    if _current.get() is not None:
+        # Nested jobs (e.g. a coalescing leader) reuse the budget already held
+        yield _current.get()
+        return
+
+    threads, limit = QUEUE_BUDGETS.get(queue, (1, 1))
+    SLOTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    started = time.monotonic()
+    slot = _acquire_queue_slot(queue, limit)
+    try:
+        cpus = _acquire_cpus(threads)
+    except BaseException:
+        _release([slot])
+        raise
+
+    budget = CpuBudget(queue, cpus)
+    waited = time.monotonic() - started
+    print(f"[INFO] {queue} job running on cpus {budget.cpus} ({budget.threads}/{threads} threads, waited {waited:.1f}s)")
+
+    original_affinity = None
+    try:
+        original_affinity = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, budget.cpus)
+    except (AttributeError, OSError):
+        pass
+
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+        if original_affinity is not None:
+            try:
+                os.sched_setaffinity(0, original_affinity)
+            except OSError:
+                pass
+        _release([slot, *cpus.values()])
+
+
+def budget_status():
+    """ Which cores and queue slots on this node are currently held. """
+    SLOTS_DIR.mkdir(parents=True, exist_ok=True)
+    busy = []
+    for cpu in NODE_CPUS:
+        fd = _try_lock(SLOTS_DIR / f"cpu_{cpu}.lock")
+        if fd is None:
+            busy.append(cpu)
+        else:
+            _release([fd])
+
+    queues = {}
+    for queue, (threads, limit) in QUEUE_BUDGETS.items():
+        running = 0
+        for i in range(limit):
+            fd = _try_lock(SLOTS_DIR / f"queue_{queue}_{i}.lock")
+            if fd is None:
+                running += 1
+            else:
+                _release([fd])
+        queues[queue] = {"threads": threads, "limit": limit, "running": running}
+
+    return {"cpus": len(NODE_CPUS), "busy_cpus": busy, "queues": queues}
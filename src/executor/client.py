@@ -0,0 +1,115 @@
+#  ./executor/client.py
+import os
+import subprocess
+from multiprocessing.connection import Client
+from src.executor.budget import THREAD_ENV_VARS, current_budget
+from src.executor.progress import follow_log, report_result, run_streaming
+from src.executor.runners import read_config
+from src.services import metrics
+
+SOCKET_PATH = os.environ.get("EXECUTOR_SOCKET", "/app/reinvent/executor.sock")
+AUTHKEY = os.environ.get("EXECUTOR_AUTHKEY", "reinvent-executor").encode()
+# Only these run types go to the warm pool; training keeps its own process
+WARM_RUN_TYPES = set(filter(None, os.environ.get("EXECUTOR_RUN_TYPES", "sampling").split(",")))
+
+
+def submit(config_path, log_path, timeout=None):
+    """
+    Runs a REINVENT config on the warm executor over its local socket.
+    Returns a CompletedProcess, or None when no executor is listening.
+    """
+    if not SOCKET_PATH or not os.path.exists(SOCKET_PATH):
+        return None
+    try:
+        conn = Client(SOCKET_PATH, family="AF_UNIX", authkey=AUTHKEY)
+    except OSError:
+        return None
+
+    args = ["reinvent", "-l", str(log_path), str(config_path)]
+    job = {"config": str(config_path), "log": str(log_path)}
+    budget = current_budget()
+    if budget is not None:
+        job.update(budget.as_job())
+    with conn:
+        conn.send(job)
+        if timeout is not None and not conn.poll(timeout):
+            raise TimeoutError(f"Warm executor did not answer within {timeout}s")
+        reply = conn.recv()
+    result = subprocess.CompletedProcess(args, reply["returncode"], reply["stdout"], reply["stderr"])
+    result.cpu_seconds = reply.get("cpu_seconds")
+    return result
+
+
+@metrics.stage("reinvent")
+def run_reinvent(config_path, log_path, command_prefix=()):
+    """
+    Runs REINVENT for a config file. Sampling configs are sent to the warm executor when
+    one is running; everything else, or an unreachable executor, uses a fresh `reinvent` process.
+    Inside job_budget() the run is limited to the job's cores and thread count; inside
+    job_progress() its output and log are streamed as progress updates.
+    """
+    try:
+        warm = read_config(config_path).get("run_type") in WARM_RUN_TYPES
+    except Exception:
+        warm = False
+
+    with follow_log(log_path):
+        if warm:
+            try:
+                result = submit(config_path, log_path)
+            except (OSError, EOFError, TimeoutError) as e:
+                print(f"[WARN] Warm executor failed, falling back to subprocess: {e}")
+                result = None
+            if result is not None:
+                metrics.observe_reinvent_cpu("warm", result.cpu_seconds)
+                return report_result(result)
+
+        budget = current_budget()
+        result = run_streaming(
+            [*command_prefix, "reinvent", "-l", str(log_path), str(config_path)],
+            env=budget.environ() if budget is not None else None,
+        )
+        # With a prefix (e.g. docker exec) the child is only the client, not REINVENT
+        if not command_prefix:
+            metrics.observe_reinvent_cpu("subprocess", result.cpu_seconds)
+        return report_result(result)
+
+
+@metrics.stage("reinvent")
+def run_reinvent_container(config_path, log_path):
+    """ Prefers the warm executor; otherwise runs REINVENT inside the running container. """
+    with follow_log(log_path):
+        try:
+            result = submit(config_path, log_path)
+        except (OSError, EOFError, TimeoutError) as e:
+            print(f"[WARN] Warm executor failed, falling back to docker exec: {e}")
+            result = None
+    if result is not None:
+        metrics.observe_reinvent_cpu("warm", result.cpu_seconds)
+        return report_result(result)
+
+    try:
+        result11 = subprocess.run(
+            ["docker", "ps", "--filter", "name=centella-reinvent-backend-reinvent", "--format", "{{.Names}}"],
+            capture_output=True,
+            text=True
+        )
+        reinvent_container = result11.stdout.strip()
+    except Exception as e:
+        print(f"[ERROR] Failed to find REINVENT container: {e}")
+        raise RuntimeError("Failed to get REINVENT container")
+
+    if not reinvent_container:
+        print("[ERROR] REINVENT container is not running.")
+        raise RuntimeError("REINVENT container not running")
+
+    print(f"[DEBUG] Using REINVENT container: {reinvent_container}")
+    print("[DEBUG] Running REINVENT inside a new Docker container...")
+    # The container has its own process tree, so only the thread count carries over
+    budget = current_budget()
+    thread_env = [arg for name in THREAD_ENV_VARS for arg in ("-e", f"{name}={budget.threads}")] if budget else []
+    with follow_log(log_path):
+        return report_result(run_streaming([
+            "docker", "exec", *thread_env, reinvent_container,
+            "reinvent", "-l", str(log_path), str(config_path)
+        ]))
@@ -0,0 +1,280 @@
+#  ./executor/coalesce.py
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+import redis
+from src.executor.budget import job_budget
+from src.executor.client import run_reinvent
+from src.executor.progress import report_result
+from src.executor.runners import read_config
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+# Seconds a leader waits for compatible requests; 0 disables coalescing
+COALESCE_WINDOW = float(os.environ.get("SAMPLING_COALESCE_WINDOW", "0.5"))
+# A leader renews its claim on the requests it runs every third of this; a follower whose
+# request has been neither pending, claimed nor answered for this long samples alone
+CLAIM_TTL = float(os.environ.get("SAMPLING_COALESCE_CLAIM_TTL", "30"))
+RESULT_TTL = 3600
+
+_redis = None
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def _group_key(config, runner, queue: str = None):
+    """
+    Requests can share a sampling pass when model, device and randomization match and they
+    would run the same way: with the same runner, on the same queue.
+    """
+    parameters = config.get("parameters", {})
+    model_file = str(parameters.get("model_file", ""))
+    model_key = os.path.abspath(model_file) if os.path.exists(model_file) else model_file
+    runner_name = f"{getattr(runner, '__module__', '')}.{getattr(runner, '__qualname__', repr(runner))}"
+    raw = json.dumps([model_key, config.get("device", "cpu"), bool(parameters.get("randomize_smiles", True)), runner_name, queue])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _claim_key(request_id: str):
+    return f"coalesce:claim:{request_id}"
+
+
+@contextlib.contextmanager
+def _claimed(client, batch, leader_id: str):
+    """ Marks the batch's requests as taken by leader_id, renewing the claims until the block exits. """
+    keys = [_claim_key(item["id"]) for item in batch if item["id"] != leader_id]
+    ttl = int(CLAIM_TTL * 1000)
+    stop = threading.Event()
+
+    def renew():
+        with client.pipeline() as pipe:
+            for key in keys:
+                pipe.set(key, leader_id, px=ttl)
+            pipe.execute()
+
+    def keep_alive():
+        while not stop.wait(CLAIM_TTL / 3):
+            try:
+                renew()
+            except redis.RedisError as e:
+                print(f"[WARN] Could not renew coalesced sampling claims: {e}")
+
+    if not keys:
+        yield
+        return
+    renew()
+    thread = threading.Thread(target=keep_alive, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(str(value))
+
+
+def write_sampling_config(config_path: Path, config: dict):
+    """ Writes a flat sampling config (top-level keys plus [parameters]) as TOML. """
+    lines = [f"{key} = {_toml_value(value)}" for key, value in config.items() if key != "parameters"]
+    lines.append("")
+    lines.append("[parameters]")
+    lines += [f"{key} = {_toml_value(value)}" for key, value in config.get("parameters", {}).items()]
+    with open(config_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _completed(result):
+    return {"args": list(result.args), "returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
+
+
+def _safe_run(runner, config_path, log_path):
+    # A runner error must reach every request in the batch, not just the leader
+    try:
+        return runner(config_path, log_path)
+    except Exception as e:
+        return subprocess.CompletedProcess(["reinvent", str(config_path)], 1, "", str(e))
+
+
+def _run_batch(batch, runner):
+    """
+    Runs one sampling pass for the combined num_smiles and splits the molecules back
+    into each request's output_file, in submission order. Returns {request_id: result}.
+    The combined run's folder is removed once split; it is kept when the run fails.
+    """
+    if len(batch) == 1:
+        request = batch[0]
+        return {request["id"]: _completed(_safe_run(runner, request["config_path"], request["log_path"]))}
+
+    import pandas as pd
+
+    configs = [read_config(request["config_path"]) for request in batch]
+    counts = [int(config["parameters"].get("num_smiles", 0)) for config in configs]
+
+    first = configs[0]
+    work_dir = Path(batch[0]["config_path"]).parent / f"coalesced_{uuid.uuid4().hex[:8]}"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    combined = {
+        "run_type": "sampling",
+        "device": first.get("device", "cpu"),
+        "json_out_config": str(work_dir / "sampling.json"),
+        "parameters": {
+            **first["parameters"],
+            "output_file": str(work_dir / "results.csv"),
+            "num_smiles": sum(counts),
+            # Disjoint slices of a unique sample keep every request unique
+            "unique_molecules": any(config["parameters"].get("unique_molecules", True) for config in configs),
+        },
+    }
+    combined_config = work_dir / "config.toml"
+    write_sampling_config(combined_config, combined)
+
+    print(f"[INFO] Coalesced {len(batch)} sampling requests ({sum(counts)} SMILES) into {work_dir}")
+    result = _safe_run(runner, combined_config, work_dir / "reinvent.log")
+    results = {}
+    if result.returncode != 0:
+        print(f"[ERROR] Coalesced sampling failed, keeping {work_dir} for inspection")
+        for request in batch:
+            results[request["id"]] = _completed(result)
+        return results
+
+    sampled = pd.read_csv(combined["parameters"]["output_file"])
+    try:
+        with open(work_dir / "reinvent.log") as f:
+            combined_log = f.read()
+    except OSError:
+        combined_log = ""
+    start = 0
+    for request, config, count in zip(batch, configs, counts):
+        part = sampled.iloc[start:start + count]
+        start += count
+        part.to_csv(config["parameters"]["output_file"], index=False)
+        if config.get("json_out_config"):
+            with open(config["json_out_config"], "w") as f:
+                json.dump({**config, "coalesced_requests": len(batch)}, f, indent=2)
+        # The combined folder is removed below, so each request keeps a copy of its log
+        with open(request["log_path"], "a") as log:
+            log.write(f"Sampled as part of a coalesced run of {len(batch)} requests "
+                      f"({len(part)} of {count} requested SMILES)\n")
+            log.write(combined_log)
+        results[request["id"]] = {
+            "args": list(result.args),
+            "returncode": 0,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        }
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def _budgeted(runner, queue: str):
+    """ The runner, holding the queue's CPU budget only while REINVENT actually runs. """
+    if queue is None:
+        return runner
+
+    def run(config_path, log_path):
+        with job_budget(queue):
+            return runner(config_path, log_path)
+    return run
+
+
+def run_sampling(config_path, log_path, runner=run_reinvent, queue: str = None):
+    """
+    Runs a sampling config, batching it with compatible requests that arrive within
+    COALESCE_WINDOW seconds. The first request of a window becomes the leader: it drains
+    the pending list from Redis, runs the combined job and hands results to the others.
+    Falls back to a plain run when Redis is unavailable or the window is 0, and runs alone
+    when the leader that took the request stops renewing its claim for CLAIM_TTL seconds.
+    With a queue, only the request that runs REINVENT takes that queue's CPU budget;
+    followers wait for the leader without holding a slot or cores.
+    """
+    config_path, log_path = str(config_path), str(log_path)
+    run = _budgeted(runner, queue)
+    # A shared pass can't reproduce a seeded request's own stream
+    if COALESCE_WINDOW <= 0 or read_config(config_path).get("seed") is not None:
+        return run(config_path, log_path)
+
+    try:
+        config = read_config(config_path)
+        group = _group_key(config, runner, queue)
+        client = _client()
+        request_id = uuid.uuid4().hex
+        request = {"id": request_id, "config_path": config_path, "log_path": log_path}
+        pending_key = f"coalesce:{group}:pending"
+        leader_key = f"coalesce:{group}:leader"
+        done_key = f"coalesce:done:{request_id}"
+        client.rpush(pending_key, json.dumps(request))
+    except (redis.RedisError, OSError, KeyError) as e:
+        print(f"[WARN] Sampling coalescing unavailable, running alone: {e}")
+        return run(config_path, log_path)
+
+    orphaned_since = None
+    try:
+        while orphaned_since is None or time.monotonic() - orphaned_since < CLAIM_TTL:
+            if client.set(leader_key, request_id, nx=True, px=int((COALESCE_WINDOW + 10) * 1000)):
+                time.sleep(COALESCE_WINDOW)
+                with client.pipeline() as pipe:
+                    pipe.lrange(pending_key, 0, -1)
+                    pipe.delete(pending_key)
+                    drained, _ = pipe.execute()
+                client.delete(leader_key)
+
+                batch = [json.loads(item) for item in drained]
+                if batch:
+                    with _claimed(client, batch, request_id):
+                        try:
+                            results = _run_batch(batch, run)
+                        except Exception as e:
+                            failed = {"args": ["reinvent"], "returncode": 1, "stdout": "", "stderr": f"Coalesced sampling failed: {e}"}
+                            results = {item["id"]: failed for item in batch}
+                    with client.pipeline() as pipe:
+                        for other_id, result in results.items():
+                            if other_id != request_id:
+                                pipe.rpush(f"coalesce:done:{other_id}", json.dumps(result))
+                                pipe.expire(f"coalesce:done:{other_id}", RESULT_TTL)
+                                pipe.delete(_claim_key(other_id))
+                        pipe.execute()
+                    if request_id in results:
+                        own = results[request_id]
+                        return subprocess.CompletedProcess(own["args"], own["returncode"], own["stdout"], own["stderr"])
+
+            reply = client.blpop(done_key, timeout=max(1, int(COALESCE_WINDOW)))
+            if reply:
+                own = json.loads(reply[1])
+                # The leader ran it, so this task's progress only learns the outcome
+                return report_result(subprocess.CompletedProcess(own["args"], own["returncode"], own["stdout"], own["stderr"]))
+
+            # A request is waiting in the list or claimed by a live leader; otherwise its leader died
+            with client.pipeline() as pipe:
+                pipe.lpos(pending_key, json.dumps(request))
+                pipe.exists(_claim_key(request_id))
+                position, claimed = pipe.execute()
+            if position is not None or claimed:
+                orphaned_since = None
+            elif orphaned_since is None:
+                orphaned_since = time.monotonic()
+
+        print(f"[WARN] Coalesced sampling leader for {config_path} stopped answering, running alone")
+        # A late answer would only go unread
+        client.delete(done_key)
+    except redis.RedisError as e:
+        print(f"[WARN] Sampling coalescing failed, running alone: {e}")
+
+    return run(config_path, log_path)
@@ -0,0 +1,271 @@
+#  ./executor/progress.py
+import collections
+import contextlib
+import contextvars
+import io
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import redis
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+# Minimum seconds between published updates for one task; state changes always go out
+PUBLISH_INTERVAL = float(os.environ.get("PROGRESS_PUBLISH_INTERVAL", "0.5"))
+# Last known state is kept this long after the task's final update
+STATE_TTL = int(os.environ.get("PROGRESS_STATE_TTL", "86400"))
+# Lines of stdout/stderr kept for error messages; the rest is streamed and dropped
+TAIL_LINES = int(os.environ.get("PROGRESS_TAIL_LINES", "200"))
+FOLLOW_INTERVAL = 0.5
+
+TERMINAL_STATES = {"completed", "failed"}
+
+_PATTERNS = [
+    ("epoch", re.compile(r"\bepoch\s*[:=]?\s*(\d+)\s*(?:/|of)\s*(\d+)", re.I)),
+    ("epoch", re.compile(r"\bepoch\s*[:=]?\s*(\d+)\b", re.I)),
+    ("step", re.compile(r"\bstep\s*[:=]?\s*(\d+)\s*(?:/|of)\s*(\d+)", re.I)),
+    ("step", re.compile(r"\bstep\s*[:=]?\s*(\d+)\b", re.I)),
+    ("sampled", re.compile(r"\b(\d+)\s+(?:smiles|molecules)\s+(?:sampled|generated)", re.I)),
+    ("sampled", re.compile(r"\b(?:sampled|generated)\s+(\d+)\s+(?:smiles|molecules)", re.I)),
+    ("validity", re.compile(r"\bvalid(?:ity)?\b\D{0,20}?(\d+(?:\.\d+)?)\s*%", re.I)),
+]
+
+_current = contextvars.ContextVar("progress_publisher", default=None)
+_redis = None
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def channel(task_id: str):
+    return f"progress:{task_id}"
+
+
+def state_key(task_id: str):
+    return f"progress:{task_id}:state"
+
+
+def parse_progress(line: str):
+    """ Picks epoch/step counters, sampled molecule counts and validity out of a REINVENT log line. """
+    update = {}
+    for name, pattern in _PATTERNS:
+        if name in update:
+            continue
+        match = pattern.search(line)
+        if not match:
+            continue
+        if name == "validity":
+            update[name] = float(match.group(1))
+        else:
+            update[name] = int(match.group(1))
+            if match.lastindex and match.lastindex > 1:
+                update[f"{name}s_total" if name != "sampled" else "requested"] = int(match.group(2))
+    return update
+
+
+class ProgressPublisher:
+    """
+    Publishes a task's progress on the Redis channel progress:<task_id> and keeps the
+    merged latest state at progress:<task_id>:state for clients that connect late.
+    Updates are throttled; Redis errors never fail the task.
+    """
+
+    def __init__(self, task_id: str, stage: str = None):
+        self.task_id = task_id
+        self.state = {"task_id": task_id, "status": "running", "stage": stage}
+        self._last_sent = 0.0
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def update(self, force: bool = False, **fields):
+        with self._lock:
+            changed_status = "status" in fields and fields["status"] != self.state.get("status")
+            self.state.update(fields)
+            self.state["updated_at"] = time.time()
+            now = time.monotonic()
+            if not (force or changed_status or now - self._last_sent >= PUBLISH_INTERVAL):
+                return
+            self._last_sent = now
+            payload = json.dumps(self.state)
+
+        try:
+            with _client().pipeline() as pipe:
+                pipe.set(state_key(self.task_id), payload, ex=STATE_TTL)
+                pipe.publish(channel(self.task_id), payload)
+                pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            if not self._warned:
+                print(f"[WARN] Progress publishing unavailable for {self.task_id}: {e}")
+                self._warned = True
+
+    def line(self, text: str):
+        update = parse_progress(text)
+        if update:
+            self.update(**update)
+
+
+def current_publisher():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def job_progress(task_id: str, stage: str = None):
+    """ Publishes progress for everything REINVENT runs inside the block, then the final state. """
+    if not task_id:
+        yield None
+        return
+    publisher = ProgressPublisher(task_id, stage)
+    publisher.update(force=True, status="running", started_at=time.time())
+    token = _current.set(publisher)
+    try:
+        yield publisher
+    except BaseException as e:
+        publisher.update(status="failed", error=str(e)[-2000:])
+        raise
+    finally:
+        _current.reset(token)
+    if publisher.state.get("status") not in TERMINAL_STATES:
+        publisher.update(status="completed")
+
+
+def set_stage(stage: str, **fields):
+    """ Moves the current task on to a new stage, e.g. from sampling to descriptors. """
+    publisher = _current.get()
+    if publisher is not None:
+        publisher.update(force=True, stage=stage, **fields)
+
+
+def fail(error: str):
+    """ Marks the current task failed, e.g. after REINVENT exits non-zero. """
+    publisher = _current.get()
+    if publisher is not None:
+        publisher.update(status="failed", error=str(error)[-2000:])
+
+
+def report_result(result):
+    """ Publishes a failed state for a non-zero REINVENT result and passes the result through. """
+    if result is not None and result.returncode != 0:
+        fail(result.stderr or f"REINVENT exited with code {result.returncode}")
+    return result
+
+
+def publish_line(text: str):
+    publisher = _current.get()
+    if publisher is not None:
+        publisher.line(text)
+
+
+class _LogFollower(threading.Thread):
+    """ Tails a log file from its current end and feeds new lines to the publisher. """
+
+    def __init__(self, path, publisher):
+        super().__init__(daemon=True)
+        self.path = str(path)
+        self.publisher = publisher
+        self.offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._done = threading.Event()
+
+    def poll(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # Leave a partial last line for the next poll
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        for raw in data[:end].splitlines():
+            self.publisher.line(raw.decode("utf-8", "replace"))
+
+    def run(self):
+        while not self._done.wait(FOLLOW_INTERVAL):
+            self.poll()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.poll()
+
+
+@contextlib.contextmanager
+def follow_log(log_path):
+    """ Publishes progress found in REINVENT's log file while the block runs. """
+    publisher = _current.get()
+    if publisher is None or log_path is None:
+        yield
+        return
+    follower = _LogFollower(log_path, publisher)
+    follower.start()
+    try:
+        yield
+    finally:
+        follower.stop()
+
+
+class TailBuffer(io.TextIOBase):
+    """ Text stream that keeps only the last `max_lines` lines written to it. """
+
+    def __init__(self, max_lines: int = TAIL_LINES):
+        self.lines = collections.deque(maxlen=max_lines)
+        self._partial = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._partial += text
+        *complete, partial = self._partial.split("\n")
+        self._partial = partial[-65536:]
+        for line in complete:
+            self.lines.append(line + "\n")
+            publish_line(line)
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self.lines) + self._partial
+
+
+def _pump(stream, tail: TailBuffer):
+    for line in iter(stream.readline, ""):
+        tail.write(line)
+    stream.close()
+
+
+def run_streaming(args, env=None):
+    """
+    Like subprocess.run(args, capture_output=True, text=True), but reads output line by line
+    as it is produced: each line is parsed for progress and only the last TAIL_LINES of each
+    stream are kept, so memory stays flat however long the process runs.
+    """
+    process = subprocess.Popen(
+        args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace", env=env,
+    )
+    stdout_tail, stderr_tail = TailBuffer(), TailBuffer()
+    # contextvars don't cross into new threads; hand the publisher over explicitly
+    context = contextvars.copy_context()
+    pumps = [
+        threading.Thread(target=context.copy().run, args=(_pump, process.stdout, stdout_tail), daemon=True),
+        threading.Thread(target=context.copy().run, args=(_pump, process.stderr, stderr_tail), daemon=True),
+    ]
+    for pump in pumps:
+        pump.start()
+    # wait4 also reports the child's own CPU time, which Popen.wait() discards
+    _, status, usage = os.wait4(process.pid, 0)
+    returncode = process.returncode = os.waitstatus_to_exitcode(status)
+    for pump in pumps:
+        pump.join()
+    result = subprocess.CompletedProcess(args, returncode, stdout_tail.getvalue(), stderr_tail.getvalue())
+    result.cpu_seconds = usage.ru_utime + usage.ru_stime
+    return result
+
+
+def read_state(task_id: str):
+    """ Latest published state for a task, or None if it never reported progress. """
+    raw = _client().get(state_key(task_id))
+    return json.loads(raw) if raw else None
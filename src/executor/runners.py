@@ -0,0 +1,188 @@
+#  ./executor/runners.py
+import copy
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+
+def read_config(config_path):
+    with open(config_path, "rb") as f:
+        return tomllib.load(f)
+
+
+class ModelCache:
+    """
+    LRU of loaded model objects keyed by (path, mtime), bounded by the on-disk size of the
+    models it holds. A model file that is rewritten gets a new key and is loaded again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, loader):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        value = loader()
+        self.misses += 1
+        with self._lock:
+            # Drop stale versions of the same file before accounting the new one
+            for stale in [k for k in self._entries if k[0] == key[0]]:
+                self._bytes -= self._entries.pop(stale)[1]
+            self._entries[key] = (value, stat.st_size)
+            self._bytes += stat.st_size
+            while len(self._entries) > 1 and self._bytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+        return value
+
+    def paths(self):
+        with self._lock:
+            return [path for path, _ in self._entries]
+
+
+class ReinventRunner:
+    """
+    Runs REINVENT in-process through its console-script entry point, so torch and REINVENT
+    are imported once per worker. torch.load is wrapped with the model cache, which keeps
+    priors and agents in memory between jobs.
+    """
+
+    def __init__(self, model_cache: ModelCache):
+        from importlib.metadata import entry_points
+        import torch
+
+        self.model_cache = model_cache
+        (entry_point,) = [ep for ep in entry_points(group="console_scripts") if ep.name == "reinvent"]
+        self._main = entry_point.load()
+
+        original_load = torch.load
+
+        def cached_load(f, *args, **kwargs):
+            if not isinstance(f, (str, os.PathLike)) or not os.path.exists(f):
+                return original_load(f, *args, **kwargs)
+            # REINVENT may mutate what it loads, so every job gets its own copy
+            return copy.deepcopy(model_cache.get(f, lambda: original_load(f, *args, **kwargs)))
+
+        torch.load = cached_load
+
+    def run(self, config_path, log_path):
+        argv = sys.argv
+        sys.argv = ["reinvent", "-l", str(log_path), str(config_path)]
+        try:
+            self._main()
+            return 0
+        except SystemExit as e:
+            if e.code is None:
+                return 0
+            return e.code if isinstance(e.code, int) else 1
+        finally:
+            sys.argv = argv
+
+
+STUB_FRAGMENTS = ["C", "CC", "CCO", "c1ccccc1", "C(=O)O", "N", "CN", "OC", "c1ccncc1", "C1CCCCC1", "F", "Cl"]
+
+
+class StubRunner:
+    """
+    Behaves like REINVENT for tests and benchmarks: writes the files a config asks for
+    after an optional delay (STUB_REINVENT_DELAY seconds, plus per-SMILES cost).
+    """
+
+    def __init__(self, model_cache: ModelCache = None):
+        self.model_cache = model_cache or ModelCache(0)
+        self.delay = float(os.environ.get("STUB_REINVENT_DELAY", "0"))
+        self.delay_per_smiles = float(os.environ.get("STUB_REINVENT_DELAY_PER_SMILES", "0"))
+        # Simulates a crash in transfer learning, e.g. to exercise checkpoint resume
+        self.fail_at_epoch = int(os.environ.get("STUB_REINVENT_FAIL_AT_EPOCH", "0"))
+
+    def run(self, config_path, log_path):
+        config = read_config(config_path)
+        parameters = config.get("parameters", {})
+        run_type = config.get("run_type")
+
+        model_file = parameters.get("model_file") or parameters.get("input_model_file")
+        if model_file and os.path.exists(model_file):
+            self.model_cache.get(model_file, lambda: open(model_file, "rb").read())
+
+        with open(log_path, "a") as log:
+            log.write(f"stub reinvent: {run_type} {config_path}\n")
+
+        if run_type == "sampling":
+            num_smiles = int(parameters.get("num_smiles", 100))
+            # Progress lines like REINVENT's, spread over the simulated sampling time
+            for step in range(1, 11):
+                time.sleep((self.delay + self.delay_per_smiles * num_smiles) / 10)
+                print(f"{num_smiles * step // 10} SMILES sampled", flush=True)
+            rng = random.Random(config.get("seed", parameters.get("seed")))
+            seen = set()
+            rows = []
+            for _ in range(num_smiles):
+                smiles = "".join(rng.choice(STUB_FRAGMENTS) for _ in range(rng.randint(2, 8)))
+                if parameters.get("unique_molecules", True) and smiles in seen:
+                    continue
+                seen.add(smiles)
+                rows.append(f"{smiles},{-rng.uniform(5, 60):.4f}")
+            with open(parameters["output_file"], "w") as f:
+                f.write("SMILES,NLL\n" + "".join(row + "\n" for row in rows))
+            if config.get("json_out_config"):
+                with open(config["json_out_config"], "w") as f:
+                    json.dump(config, f, indent=2)
+            return 0
+
+        if run_type == "transfer_learning":
+            num_epochs = int(parameters.get("num_epochs", 1))
+            save_every = int(parameters.get("save_every_n_epochs", 0))
+            for epoch in range(1, num_epochs + 1):
+                time.sleep(self.delay / max(num_epochs, 1))
+                if epoch == self.fail_at_epoch:
+                    print(f"stub reinvent: failing at epoch {epoch}", flush=True)
+                    return 1
+                print(f"Epoch {epoch}/{num_epochs}", flush=True)
+                if save_every and epoch % save_every == 0:
+                    with open(f"{parameters['output_model_file']}.{epoch}.chkpt", "wb") as f:
+                        f.write(b"stub-checkpoint")
+            with open(parameters["output_model_file"], "wb") as f:
+                f.write(b"stub-model")
+            return 0
+
+        time.sleep(self.delay)
+        return 0
+
+
+RUNNERS = {
+    "reinvent": ReinventRunner,
+    "stub": StubRunner,
+}
+
+
+def get_runner(name: str, model_cache: ModelCache):
+    return RUNNERS[name](model_cache)
+
+
+if __name__ == "__main__":
+    # `python -m src.executor.runners -l LOG CONFIG` mimics the reinvent CLI with the stub runner
+    args = sys.argv[1:]
+    log_file = os.devnull
+    if args[:1] == ["-l"]:
+        log_file, args = args[1], args[2:]
+    sys.exit(StubRunner().run(args[-1], log_file))
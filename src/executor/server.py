@@ -0,0 +1,176 @@
+#  ./executor/server.py
+import multiprocessing
+import os
+import signal
+import threading
+from multiprocessing.connection import Listener
+from src.executor.client import AUTHKEY, SOCKET_PATH
+from src.executor.runners import read_config
+from src.executor.worker import worker_main
+
+WORKERS = int(os.environ.get("EXECUTOR_WORKERS", "2"))
+RUNNER = os.environ.get("EXECUTOR_RUNNER", "reinvent")
+# Per worker; each worker keeps its own loaded models
+MODEL_CACHE_MB = int(os.environ.get("EXECUTOR_MODEL_CACHE_MB", "2048"))
+# A job running longer than this has its worker killed and replaced; 0 waits forever
+JOB_TIMEOUT = float(os.environ.get("EXECUTOR_JOB_TIMEOUT", "3600"))
+
+
+class WarmWorker:
+    """ One persistent REINVENT process and the pipe used to talk to it. """
+
+    def __init__(self, runner: str, cache_bytes: int):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, runner, cache_bytes), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.models = set()
+
+        try:
+            hello = self.conn.recv()
+        except EOFError:
+            hello = {"error": f"exit code {self.process.exitcode}"}
+        if not hello.get("ready"):
+            self.process.join()
+            raise RuntimeError(f"REINVENT worker failed to start:\n{hello.get('error')}")
+
+    def run(self, job, timeout: float = None):
+        self.conn.send(job)
+        if timeout and not self.conn.poll(timeout):
+            raise TimeoutError(f"timed out after {timeout:g}s")
+        reply = self.conn.recv()
+        self.models = set(reply.get("models", []))
+        return reply
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WarmExecutor:
+    """
+    Pool of warm REINVENT workers. Jobs prefer an idle worker that already holds the
+    job's model; a worker that dies or runs past the job timeout is replaced and the job
+    reports failure.
+    """
+
+    def __init__(self, workers: int = WORKERS, runner: str = RUNNER, cache_bytes: int = MODEL_CACHE_MB << 20,
+                 job_timeout: float = JOB_TIMEOUT):
+        self.runner = runner
+        self.cache_bytes = cache_bytes
+        self.job_timeout = job_timeout
+        self._idle = [WarmWorker(runner, cache_bytes) for _ in range(workers)]
+        self._all = list(self._idle)
+        self._available = threading.Condition()
+
+    def _acquire(self, model_file):
+        with self._available:
+            while not self._idle:
+                if not self._all:
+                    raise RuntimeError("No REINVENT workers are running")
+                self._available.wait()
+            for worker in self._idle:
+                if model_file and model_file in worker.models:
+                    self._idle.remove(worker)
+                    return worker
+            return self._idle.pop()
+
+    def _release(self, worker):
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _replace(self, worker):
+        """ Kills a broken worker and starts another in its place; returns None if that fails. """
+        worker.kill()
+        with self._available:
+            self._all.remove(worker)
+        try:
+            replacement = WarmWorker(self.runner, self.cache_bytes)
+        except Exception as e:
+            print(f"[ERROR] Could not replace REINVENT worker: {e}")
+            with self._available:
+                # Jobs waiting for a worker must not wait on one that will never come
+                self._available.notify_all()
+            return None
+        with self._available:
+            self._all.append(replacement)
+        return replacement
+
+    def submit(self, job):
+        try:
+            model_file = read_config(job["config"]).get("parameters", {}).get("model_file")
+            model_file = os.path.abspath(model_file) if model_file else None
+        except Exception:
+            model_file = None
+
+        worker = self._acquire(model_file)
+        try:
+            reply = worker.run(job, self.job_timeout)
+        except (EOFError, OSError, TimeoutError) as e:
+            reason = str(e) if isinstance(e, TimeoutError) else f"died: {e}"
+            reply = {"returncode": 1, "stdout": "", "stderr": f"REINVENT worker {reason}"}
+            broken, worker = worker, None
+            worker = self._replace(broken)
+        finally:
+            if worker is not None:
+                self._release(worker)
+        return reply
+
+    def shutdown(self):
+        with self._available:
+            workers = list(self._all)
+        for worker in workers:
+            worker.stop()
+
+
+def _handle(executor: WarmExecutor, conn):
+    with conn:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        conn.send(executor.submit(job))
+
+
+def serve(path: str = SOCKET_PATH, executor: WarmExecutor = None):
+    """ Accepts jobs on a Unix socket, one thread per client connection. """
+    executor = executor or WarmExecutor()
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = Listener(path, family="AF_UNIX", authkey=AUTHKEY)
+    print(f"[INFO] Warm REINVENT executor listening on {path} with {len(executor._all)} {executor.runner} workers")
+
+    def stop(*_):
+        listener.close()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, stop)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except multiprocessing.AuthenticationError:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=_handle, args=(executor, conn), daemon=True).start()
+    finally:
+        executor.shutdown()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,79 @@
+#  ./executor/worker.py
+import contextlib
+import logging
+import os
+import resource
+import sys
+import traceback
+from src.executor.progress import TailBuffer
+from src.executor.runners import ModelCache, get_runner
+
+
+def _apply_budget(job, default_cpus):
+    """ Pins this worker to the cores the submitting job holds, or back to all of them. """
+    cpus = job.get("cpus") or default_cpus
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError):
+        pass
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(job.get("threads") or len(cpus))
+
+
+def worker_main(conn, runner_name: str, cache_bytes: int):
+    """
+    Long-lived REINVENT worker: builds the runner once, then serves jobs from the pipe
+    until it is closed. Each reply carries the captured output and the cached models.
+    """
+    model_cache = ModelCache(cache_bytes)
+    try:
+        runner = get_runner(runner_name, model_cache)
+    except Exception:
+        conn.send({"ready": False, "error": traceback.format_exc()})
+        return
+    conn.send({"ready": True})
+
+    root_handlers = list(logging.getLogger().handlers)
+    try:
+        default_cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        default_cpus = list(range(os.cpu_count() or 1))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+
+        # Bounded, so a chatty training run can't grow the worker's memory
+        stdout, stderr = TailBuffer(), TailBuffer()
+        # The worker runs one job at a time, so its own CPU time is the job's
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        try:
+            _apply_budget(job, default_cpus)
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                returncode = runner.run(job["config"], job["log"])
+        except Exception:
+            stderr.write(traceback.format_exc())
+            returncode = 1
+        finally:
+            # REINVENT configures logging on every run; don't let handlers pile up
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                if handler not in root_handlers:
+                    root.removeHandler(handler)
+                    handler.close()
+
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        conn.send({
+            "returncode": returncode,
+            "cpu_seconds": (after.ru_utime + after.ru_stime) - (usage.ru_utime + usage.ru_stime),
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            "models": model_cache.paths(),
+            "cache_hits": model_cache.hits,
+            "cache_misses": model_cache.misses,
+        })
@@ -1,12 +1,97 @@
 # ./main.py
-from fastapi import FastAPI
-from src.routes import project, molecule, tasks
+import time
+import redis
+from fastapi import FastAPI, Request, Response
+from starlette.concurrency import run_in_threadpool
+from src.routes import project, molecule, tasks, profiles
+from src.services import metrics, profiling, task_queue
+import src.tasks.events  # noqa: F401  (stamps published tasks with their publish time for the queue-wait metric)
 
 app = FastAPI(title="REINVENT 4 Molecular Platform", version="2.0")
 app.include_router(project.router, prefix="/api/v1/projects", tags=["Project Management"])
 app.include_router(molecule.router, prefix="/api/v1/molecule", tags=["Molecule Design"])
 app.include_router(tasks.router, prefix="/api/v1/tasks", tags=["Task Management"])
+app.include_router(profiles.router, prefix="/api/v1/profiles", tags=["Profiling"])
+
+
+class RecordLatency:
+    """
+    Pure ASGI middleware observing each request's latency until its last body chunk is sent,
+    so streamed exports count in full, labelled by the matched route's template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router sets scope["route"] on a match; its path keeps ids as {name}
+            route = scope.get("route")
+            metrics.HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status),
+            ).observe(time.perf_counter() - started)
+
+
+app.add_middleware(RecordLatency)
+
+
+async def profile_request(request: Request, call_next):
+    """ Profiles requests sent with an X-Profile header or profile_request query flag, body streaming included. """
+    mode = profiling.requested_mode(
+        request.headers.get(profiling.HEADER) or request.query_params.get(profiling.QUERY), "sampling",
+    )
+    if mode is None:
+        return await call_next(request)
+
+    capture = profiling.Capture("request", f"{request.method} {request.url.path}", mode, query=request.url.query).start()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await run_in_threadpool(capture.finish, status=500)
+        raise
+
+    body = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await run_in_threadpool(capture.finish, status=response.status_code)
+
+    response.body_iterator = profiled_body()
+    response.headers["X-Profile-Id"] = capture.profile_id
+    return response
+
+
+# Registered only when enabled, so unprofiled deployments skip the BaseHTTPMiddleware wrapping
+if profiling.ENABLED:
+    app.middleware("http")(profile_request)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    try:
+        metrics.set_queue_depths(await task_queue.queue_depths(metrics.QUEUES))
+    except (redis.RedisError, OSError) as e:
+        print(f"[WARN] Could not read queue depths: {e}")
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
 
 @app.get("/")
 def root():
-    return {"message": "REINVENT API is live."}
\ No newline at end of file
+    return {"message": "REINVENT API is live."}
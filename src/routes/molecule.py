@@ -1,25 +1,30 @@
 #  ./routes/molecule.py
+import os
 import uuid
 import logging
-import os
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
+from src.services import profiling, task_queue
 from src.services.job_service import JobService
 from src.tasks.molecule_task import run_molecule_design
-from src.db.connection import SessionLocal
+from src.tasks.sharding import shard_progress
+from src.db.connection import get_async_session
+from src.services import result_stream
+from src.services.descriptor_service import get_descriptor_cache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+TASKS_DIR = Path(os.environ.get("REINVENT_TASKS_DIR", "./reinvent/tasks"))
+
 
 # ✅ Dependency function to provide JobService instance
-def get_job_service():
-    db: Session = SessionLocal()
-    try:
-        yield JobService(db)
-    finally:
-        db.close()
+async def get_job_service(db: AsyncSession = Depends(get_async_session)):
+    yield JobService(db)
 
 
 # ✅ Pydantic Model for API Input Validation
@@ -29,6 +34,11 @@ class MoleculeDesignRequest(BaseModel):
     num_smiles: int = 157
     unique_molecules: bool = True
     randomize_smiles: bool = True
+    # A seeded request is repeatable; an identical earlier one is reused unless force is set
+    seed: Optional[int] = None
+    force: bool = False
+    # Profiles the task; see /api/v1/profiles/{task_id}
+    profile: bool = False
 
 
 @router.post("/design")
@@ -42,12 +52,13 @@ async def submit_molecule_design(
 
     try:
         # Store task in DB
-        job_service.submit_job(task_id)
+        await job_service.submit_job(task_id)
 
         # Submit Celery task with parameters
         task_data = request.dict()
         task_data["task_id"] = task_id
-        task_result = run_molecule_design.delay(task_data)
+        options = profiling.task_options(task_data.pop("profile"))
+        task_result = await task_queue.enqueue(run_molecule_design, task_data, task_id=task_id, options=options)
 
     except Exception as e:
         logger.error(f"Failed to submit molecule design task {task_id}: {str(e)}")
@@ -58,15 +69,54 @@ async def submit_molecule_design(
 
 
 @router.get("/{task_id}/result")
-async def get_molecule_result(task_id: str, job_service: JobService = Depends(get_job_service)):
-    """ Retrieves the result of a molecule design task if available. """
+async def get_molecule_result(
+    task_id: str,
+    output_format: str = Query("csv", enum=["csv", "ndjson"]),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+):
+    """ Streams the result of a molecule design task, optionally one page of rows at a time. """
 
-    result_path = f"./reinvent/tasks/{task_id}/results.csv"
+    result_path = TASKS_DIR / task_id / "results.csv"
 
-    if not os.path.exists(result_path):
+    if not result_path.exists():
         raise HTTPException(status_code=404, detail="Result not found")
 
-    with open(result_path, "r") as file:
-        result_data = file.read()
+    try:
+        offset = result_stream.file_offset(result_path, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    end = result_stream.page_end_offset(result_path, offset, limit) if limit else None
+
+    headers = {"X-Task-Id": task_id}
+    if end is not None:
+        headers["X-Next-Cursor"] = result_stream.encode_cursor(end, result_stream.OFFSET_CURSOR)
+
+    return StreamingResponse(
+        result_stream.stream_csv_file(result_path, offset, end, output_format),
+        media_type=result_stream.MEDIA_TYPES[output_format],
+        headers=headers,
+    )
+
+
+@router.get("/{task_id}/shards")
+async def get_molecule_shards(task_id: str):
+    """ Reports per-shard progress while a large design task is being sampled in parallel. """
+
+    task_folder = TASKS_DIR / task_id
+    if not task_folder.exists():
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return {"task_id": task_id, "shards": shard_progress(task_folder)}
+
+
+@router.get("/descriptors/cache")
+def get_descriptor_cache_stats():
+    """ Reports the descriptor cache size and its hit/miss counters. """
+
+    cache = get_descriptor_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Descriptor cache is disabled")
 
-    return {"task_id": task_id, "status": "completed", "result": result_data}
+    return cache.stats()
@@ -0,0 +1,30 @@
+#  ./routes/profiles.py
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from src.services import profiling
+
+router = APIRouter()
+
+
+@router.get("/")
+def list_profiles(limit: int = Query(50, ge=1, le=1000)):
+    """ Stored profiles, newest first. """
+    return {"profiles": profiling.list_profiles(limit)}
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    """ A profile's metadata and its text summary; task profiles use the task id. """
+    record = profiling.load(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {**record, "summary": profiling.artifact_path(profile_id, "profile.txt").read_text()}
+
+
+@router.get("/{profile_id}/{artifact}")
+def download_profile_artifact(profile_id: str, artifact: str):
+    """ profile.prof (pstats, e.g. for snakeviz), profile.collapsed (flame graphs), profile.txt or memory.txt. """
+    path = profiling.artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, media_type=profiling.ARTIFACTS[artifact], filename=f"{profile_id}_{artifact}")
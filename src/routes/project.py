@@ -1,20 +1,23 @@
 #  routes/project.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
-from fastapi.responses import FileResponse
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 import uuid
 from pathlib import Path
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.services import embedding, profiling, result_stream, results_index, results_store, similarity, substructure, task_queue
+from src.services.descriptor_service import cpu_budget
+from src.services.job_service import JobService
 from src.services.project_service import create_project_dir, save_smiles_file
 from src.tasks.transfer_learning import run_transfer_learning_task
 from src.tasks.reinforcement_learning import run_reinforcement_learning_task
 from src.tasks.generation import run_sampling_from_agent
-from src.db.connection import SessionLocal
-from src.db.models import Job
-from typing import List
+from src.tasks.sharding import shard_progress
+from src.db.connection import get_async_session
+from typing import List, Optional
 
 router = APIRouter()
-PROJECT_ROOT = Path("/app/projects")
+PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
 
 @router.post("/")
 def create_project():
@@ -26,59 +29,222 @@ def create_project():
     return {"project_id": project_id, "message": "Project created."}
 
 @router.post("/{project_id}/upload")
-def upload_smiles_file(project_id: str, file: UploadFile = File(...)):
+async def upload_smiles_file(project_id: str, file: UploadFile = File(...)):
     if file.content_type != "text/csv":
         raise HTTPException(status_code=400, detail="Only CSV files are supported.")
     try:
-        save_smiles_file(project_id, file)
+        stats = await save_smiles_file(project_id, file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return {"project_id": project_id, "message": "SMILES file uploaded."}
+    return {"project_id": project_id, "message": "SMILES file uploaded.", "stats": stats}
+
+async def _submit(job_service: JobService, task, job_type: str, project_id: str, *args, run_id: str = "N/A",
+                  options: dict = None, **kwargs):
+    """
+    Inserts the job's row as queued, then publishes its task under the same id, so status
+    lookups find the job from the moment its id is returned.
+    """
+    task_id = str(uuid.uuid4())
+    await job_service.submit_job(task_id, job_type=job_type, project_id=project_id, run_id=run_id)
+    try:
+        await task_queue.enqueue(task, *args, task_id=task_id, options=options, **kwargs)
+    except Exception:
+        await job_service.fail_jobs([task_id], "Task submission failed")
+        raise
+    return task_id
 
 @router.post("/{project_id}/train")
-async def train_model(project_id: str):
+async def train_model(
+    project_id: str,
+    num_epochs: int = Query(10, ge=1),
+    batch_size: int = Query(128, ge=1),
+    force: bool = Query(False),
+    profile: bool = Query(False),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Unchanged data is skipped, appended rows fine-tune the current agent; force retrains from the prior.
+    With profile set the task is profiled; see /api/v1/profiles/{task_id}.
+    """
     try:
-        run_transfer_learning_task.delay(project_id)  # ✅ send to Celery
-        return {"project_id": project_id, "status": "training_queued"}
+        task_id = await _submit(
+            JobService(db), run_transfer_learning_task, "train", project_id, project_id,
+            num_epochs=num_epochs, batch_size=batch_size, force=force, options=profiling.task_options(profile),
+        )  # ✅ send to Celery
+        return {"project_id": project_id, "task_id": task_id, "status": "training_queued"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{project_id}/reinforce")
-def reinforce_model(project_id: str):
+async def reinforce_model(project_id: str, db: AsyncSession = Depends(get_async_session)):
+    run_id = f"run_{uuid.uuid4().hex}"
     try:
-        run_reinforcement_learning_task.delay(project_id)  # ✅ Use Celery queue
+        task_id = await _submit(
+            JobService(db), run_reinforcement_learning_task, "reinforce", project_id, project_id, run_id, run_id=run_id,
+        )  # ✅ Use Celery queue
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reinforcement learning failed: {str(e)}")
-    return {"project_id": project_id, "status": "reinforcement_queued"}
+    return {"project_id": project_id, "task_id": task_id, "run_id": run_id, "status": "reinforcement_queued"}
 
 
 
 @router.post("/{project_id}/generate")
-def generate_molecules(project_id: str):
+async def generate_molecules(
+    project_id: str,
+    num_smiles: int = Query(128, ge=1),
+    seed: Optional[int] = Query(None),
+    force: bool = Query(False),
+    profile: bool = Query(False),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Seeded runs are memoized: repeating one links the earlier artifacts unless force is set.
+    With profile set the task is profiled; see /api/v1/profiles/{task_id}.
+    """
+    run_id = f"run_{uuid.uuid4().hex}"
     try:
-        run_sampling_from_agent.delay(project_id)
+        task_id = await _submit(
+            JobService(db), run_sampling_from_agent, "generate", project_id, project_id, num_smiles, run_id, run_id=run_id,
+            seed=seed, force=force, options=profiling.task_options(profile),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
-    return {"project_id": project_id, "status": "generation_queued"}
+    return {"project_id": project_id, "task_id": task_id, "run_id": run_id, "status": "generation_queued"}
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
 
 
 @router.get("/{project_id}/runs")
-def list_project_runs(project_id: str):
-    db = SessionLocal()
+async def list_project_runs(
+    project_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """ Newest runs first, one page at a time; pass X-Next-Cursor back as `cursor` for the next page. """
     try:
-        jobs = db.query(Job).filter(Job.project_id == project_id).order_by(Job.created_at.desc()).all()
-        return [
-            {
-                "task_id": job.task_id,
-                "run_id": job.run_id,
-                "job_type": job.job_type,
-                "status": job.status,
-                "created_at": job.created_at.isoformat()
-            }
-            for job in jobs
-        ]
-    finally:
-        db.close()
+        jobs, next_cursor = await JobService(db).list_project_jobs(project_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    runs = [
+        {
+            "task_id": job.task_id,
+            "run_id": job.run_id,
+            "job_type": job.job_type,
+            "status": job.status,
+            "created_at": job.created_at.isoformat(),
+            "started_at": _isoformat(job.started_at),
+            "finished_at": _isoformat(job.finished_at),
+            "duration_seconds": job.duration_seconds,
+            "molecule_count": job.molecule_count,
+        }
+        for job in jobs
+    ]
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(runs, headers=headers)
+
+
+@router.get("/{project_id}/runs/{run_id}/shards")
+def get_run_shards(project_id: str, run_id: str):
+    run_path = PROJECT_ROOT / project_id / "runs" / run_id
+    if not run_path.exists():
+        raise HTTPException(status_code=404, detail="Run not found.")
+    return {"project_id": project_id, "run_id": run_id, "shards": shard_progress(run_path)}
+
+
+@router.get("/{project_id}/similar")
+def find_similar_molecules(
+    project_id: str,
+    smiles: str = Query(...),
+    k: int = Query(50, ge=1, le=similarity.MAX_K),
+    min_similarity: float = Query(0.0, ge=0.0, le=1.0),
+    workers: Optional[int] = Query(None, ge=1, le=64),
+):
+    """ The k molecules across the project's runs most similar to `smiles` (Morgan/Tanimoto), best first. """
+    project_path = PROJECT_ROOT / project_id
+    if not project_path.exists():
+        raise HTTPException(status_code=404, detail="Project not found.")
+    try:
+        # The search pool persists and only grows, so a request may not ask past this host's cores
+        return similarity.search(project_path, smiles, k, min_similarity, workers and min(workers, cpu_budget()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching molecules: {str(e)}")
+
+
+@router.get("/{project_id}/substructure")
+def search_substructure(
+    project_id: str,
+    smarts: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1),
+    workers: Optional[int] = Query(None, ge=1, le=64),
+    output_format: str = Query("ndjson", enum=["ndjson", "csv"]),
+):
+    """
+    Molecules across the project's runs that contain the SMARTS pattern, streamed as they are
+    matched. A pattern-fingerprint screen skips most rows; only the rest are matched.
+    """
+    project_path = PROJECT_ROOT / project_id
+    if not project_path.exists():
+        raise HTTPException(status_code=404, detail="Project not found.")
+    try:
+        search = substructure.Search(project_path, smarts, limit, workers and min(workers, cpu_budget()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching molecules: {str(e)}")
+
+    headers = {"X-Searched-Count": str(search.searched), "X-Cache": "hit" if search.cached is not None else "miss"}
+    if search.candidates is not None:
+        headers["X-Candidate-Count"] = str(len(search.candidates))
+    if output_format == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{project_id}_substructure.csv"'
+    return StreamingResponse(
+        result_stream.stream_run_matches(project_path / "runs", search, output_format),
+        media_type=result_stream.MEDIA_TYPES[output_format],
+        headers=headers,
+    )
+
+
+@router.get("/{project_id}/embedding")
+def get_chemical_space(
+    project_id: str,
+    max_points: int = Query(5000, ge=1, le=embedding.MAX_POINTS),
+    run_id: Optional[str] = Query(None),
+    seed: int = Query(0),
+):
+    """
+    A downsampled 2D PCA map of the project's molecules for plotting. The projection is fitted
+    once and cached; later runs are projected into it until it is refitted.
+    """
+    project_path = PROJECT_ROOT / project_id
+    if not project_path.exists():
+        raise HTTPException(status_code=404, detail="Project not found.")
+    try:
+        return embedding.points(project_path, max_points, run_id, seed)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error embedding molecules: {str(e)}")
+
+
+@router.post("/{project_id}/embedding/refit")
+def refit_chemical_space(project_id: str, seed: int = Query(0)):
+    """ Fits the chemical-space projection again over all of the project's runs; returns the new model. """
+    project_path = PROJECT_ROOT / project_id
+    if not project_path.exists():
+        raise HTTPException(status_code=404, detail="Project not found.")
+    try:
+        model = embedding.fit(project_path, seed)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fitting the chemical space: {str(e)}")
+    if model is None:
+        raise HTTPException(status_code=404, detail="No indexed molecules to fit.")
+    return {"project_id": project_id, "model": model.meta}
 
 
 @router.get("/{project_id}/results")
@@ -99,43 +265,58 @@ def get_project_results(
     max_donors: int = Query(10),
     min_acceptors: int = Query(0),
     max_acceptors: int = Query(10),
-    output_format: str = Query("csv", enum=["csv", "json"]),
-    preview: bool = Query(False)
+    output_format: str = Query("csv", enum=["csv", "json", "ndjson"]),
+    preview: bool = Query(False),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None)
 ):
-    import pandas as pd
+    run_path = PROJECT_ROOT / project_id / "runs" / run_id
 
-    result_path = PROJECT_ROOT / project_id / "runs" / run_id / "results.csv"
-    if not result_path.exists():
+    try:
+        parquet_path = results_store.ensure_columnar(run_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading results: {str(e)}")
+    if parquet_path is None:
         raise HTTPException(status_code=404, detail="Results not found.")
 
+    ranges = {
+        "QED": (min_qed, max_qed),
+        "MolecularWeight": (min_weight, max_weight),
+        "SlogP": (min_logp, max_logp),
+        "TPSA": (min_tpsa, max_tpsa),
+        "NumRotatableBonds": (min_rotatable, max_rotatable),
+        "NumHDonors": (min_donors, max_donors),
+        "NumHAcceptors": (min_acceptors, max_acceptors),
+    }
+
     try:
-        df = pd.read_csv(result_path)
-
-        # Apply all filters
-        if "QED" in df.columns:
-            df = df[(df["QED"] >= min_qed) & (df["QED"] <= max_qed)]
-        if "MolecularWeight" in df.columns:
-            df = df[(df["MolecularWeight"] >= min_weight) & (df["MolecularWeight"] <= max_weight)]
-        if "SlogP" in df.columns:
-            df = df[(df["SlogP"] >= min_logp) & (df["SlogP"] <= max_logp)]
-        if "TPSA" in df.columns:
-            df = df[(df["TPSA"] >= min_tpsa) & (df["TPSA"] <= max_tpsa)]
-        if "NumRotatableBonds" in df.columns:
-            df = df[(df["NumRotatableBonds"] >= min_rotatable) & (df["NumRotatableBonds"] <= max_rotatable)]
-        if "NumHDonors" in df.columns:
-            df = df[(df["NumHDonors"] >= min_donors) & (df["NumHDonors"] <= max_donors)]
-        if "NumHAcceptors" in df.columns:
-            df = df[(df["NumHAcceptors"] >= min_acceptors) & (df["NumHAcceptors"] <= max_acceptors)]
+        # Filtering runs against the per-run range index; full rows are read only for the survivors
+        available = set(results_store.column_names(parquet_path))
+        ranges = {name: bounds for name, bounds in ranges.items() if name in available}
+        row_ids = results_index.select_rows(parquet_path, ranges)
 
         if preview:
-            return JSONResponse(content=df.head(10).to_dict(orient="records"))
-
-        if output_format == "json":
+            df = results_store.read_rows(parquet_path, row_ids[:10])
             return JSONResponse(content=df.to_dict(orient="records"))
 
-        filtered_path = result_path.parent / f"filtered_results.csv"
-        df.to_csv(filtered_path, index=False)
-        return FileResponse(filtered_path, media_type="text/csv", filename=filtered_path.name)
+        try:
+            page, next_cursor = result_stream.paginate(row_ids, cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error filtering results: {str(e)}")
+
+    # Rows are streamed row group by row group; nothing is materialized on disk or in full
+    headers = {"X-Total-Count": str(len(row_ids))}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if output_format == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{run_id}_results.csv"'
+    return StreamingResponse(
+        result_stream.stream_rows(parquet_path, page, output_format),
+        media_type=result_stream.MEDIA_TYPES[output_format],
+        headers=headers,
+    )
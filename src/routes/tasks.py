@@ -1,23 +1,72 @@
 #  ./routes/tasks.py
+import json
+import os
 import uuid
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from celery.result import AsyncResult
-from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.services import profiling, status_cache, task_queue
 from src.services.job_service import JobService
 from src.tasks.molecule_task import run_molecule_design
-from src.db.connection import SessionLocal
+from src.tasks.generation import run_sampling_from_agent
+from src.tasks.transfer_learning import run_transfer_learning_task
+from src.tasks.reinforcement_learning import run_reinforcement_learning_task
+from src.routes.molecule import MoleculeDesignRequest
+from src.db.connection import get_async_session
+from src.executor import progress
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Comment lines keep proxies from closing quiet event streams
+SSE_HEARTBEAT_SECONDS = 15
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "5000"))
+
+
+class BatchJobSpec(BaseModel):
+    """ One job of a batch: a molecule design, or a project's generate/train/reinforce run. """
+    job_type: Literal["design", "generate", "train", "reinforce"]
+    project_id: str = None
+    num_smiles: int = Field(128, ge=1)  # generate
+    seed: Optional[int] = None  # generate
+    num_epochs: int = Field(10, ge=1)  # train
+    batch_size: int = Field(128, ge=1)  # train
+    force: bool = False  # generate: bypass the run cache; train: retrain from the prior
+    profile: bool = False  # any type; see /api/v1/profiles/{task_id}
+    design: MoleculeDesignRequest = None  # design
+
+
+def _batch_job(spec: BatchJobSpec):
+    """ Returns (job row values, task signature) for one batch entry. """
+    task_id = f"task_{uuid.uuid4().hex}" if spec.job_type == "design" else str(uuid.uuid4())
+    profile = spec.profile
+    if spec.job_type == "design":
+        task_data = (spec.design or MoleculeDesignRequest()).dict()
+        task_data["task_id"] = task_id
+        profile = task_data.pop("profile") or profile
+        row = {"project_id": spec.project_id or "N/A", "run_id": "N/A", "job_type": "design"}
+        signature = run_molecule_design.s(task_data)
+    elif spec.job_type == "generate":
+        run_id = f"run_{uuid.uuid4().hex}"
+        row = {"project_id": spec.project_id, "run_id": run_id, "job_type": "generate"}
+        signature = run_sampling_from_agent.s(spec.project_id, spec.num_smiles, run_id, seed=spec.seed, force=spec.force)
+    elif spec.job_type == "train":
+        row = {"project_id": spec.project_id, "run_id": "N/A", "job_type": "train"}
+        signature = run_transfer_learning_task.s(
+            spec.project_id, num_epochs=spec.num_epochs, batch_size=spec.batch_size, force=spec.force,
+        )
+    else:
+        run_id = f"run_{uuid.uuid4().hex}"
+        row = {"project_id": spec.project_id, "run_id": run_id, "job_type": "reinforce"}
+        signature = run_reinforcement_learning_task.s(spec.project_id, run_id)
+    return {"task_id": task_id, **row}, signature.set(task_id=task_id, **profiling.task_options(profile))
+
 # ✅ Dependency function to provide JobService instance
-def get_job_service():
-    db: Session = SessionLocal()
-    try:
-        yield JobService(db)
-    finally:
-        db.close()
+async def get_job_service(db: AsyncSession = Depends(get_async_session)):
+    yield JobService(db)
 
 @router.post("/submit")
 async def submit_task(job_service: JobService = Depends(get_job_service)):
@@ -28,45 +77,141 @@ async def submit_task(job_service: JobService = Depends(get_job_service)):
 
     try:
         # Store task in DB
-        job_service.submit_job(task_id)
+        await job_service.submit_job(task_id)
 
         # Submit Celery task
-        task_result = run_molecule_design.delay({"task_id": task_id})
+        task_result = await task_queue.enqueue(run_molecule_design, {"task_id": task_id}, task_id=task_id)
     except Exception as e:
         logger.error(f"Task submission failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Task submission failed")
 
     return {"task_id": task_id, "celery_task_id": task_result.id, "status": "queued"}
 
+@router.post("/batch")
+async def submit_batch(specs: List[BatchJobSpec] = Body(...), job_service: JobService = Depends(get_job_service)):
+    """
+    Submits many jobs at once: every Job row is inserted in one transaction and every task
+    is published over one broker connection. Returns the task ids in request order.
+    """
+    if not specs:
+        raise HTTPException(status_code=400, detail="No jobs given")
+    if len(specs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} jobs per batch")
+    missing = [i for i, spec in enumerate(specs) if spec.job_type != "design" and not spec.project_id]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"project_id is required for jobs {missing}")
+
+    rows, signatures = zip(*(_batch_job(spec) for spec in specs))
+    task_ids = [row["task_id"] for row in rows]
+    logger.info(f"Submitting batch of {len(task_ids)} tasks")
+
+    try:
+        await job_service.submit_jobs(rows)
+    except Exception as e:
+        logger.error(f"Batch insert failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Task submission failed")
+
+    try:
+        await task_queue.enqueue_many(signatures)
+    except Exception as e:
+        logger.error(f"Batch publish failed: {str(e)}")
+        await job_service.fail_jobs(task_ids, "Task submission failed")
+        raise HTTPException(status_code=500, detail="Task submission failed")
+
+    return {
+        "count": len(task_ids),
+        "jobs": [{"task_id": row["task_id"], "job_type": row["job_type"], "run_id": row["run_id"]} for row in rows],
+        "status": "queued",
+    }
+
+@router.get("/cache/stats")
+async def get_status_cache_stats():
+    """ Hit rate and lookup latency of the task status cache in this API process. """
+    return status_cache.cache.stats()
+
+def _status_loader(job_service: JobService):
+    async def load(task_id: str):
+        job = await job_service.get_job_by_id(task_id)
+        if not job:
+            return None
+        meta = await task_queue.fetch_task_meta(job.task_id)
+        return {"job_status": job.status, "celery_status": meta["status"], "result": meta["result"]}
+    return load
+
 @router.get("/{task_id}")
 async def get_task_status(task_id: str, job_service: JobService = Depends(get_job_service)):
     """ Retrieves the status of a submitted task from Celery & database. """
 
-    job = job_service.get_job_by_id(task_id)
+    status = await status_cache.get_status(task_id, _status_loader(job_service))
 
-    if not job:
+    if not status:
         logger.warning(f"Task ID {task_id} not found")
         raise HTTPException(status_code=404, detail="Task not found")
 
-    # Fetch Celery task status
-    celery_result = AsyncResult(job.task_id)
-    task_status = celery_result.status
-
-    return {"task_id": task_id, "status": job.status, "celery_status": task_status}
+    return {"task_id": task_id, "status": status["job_status"], "celery_status": status["celery_status"]}
 
 @router.get("/{task_id}/result")
 async def get_task_result(task_id: str, job_service: JobService = Depends(get_job_service)):
     """ Retrieves the result of a completed task if available. """
 
-    job = job_service.get_job_by_id(task_id)
+    status = await status_cache.get_status(task_id, _status_loader(job_service))
     
-    if not job:
+    if not status:
         logger.warning(f"Task ID {task_id} not found")
         raise HTTPException(status_code=404, detail="Task not found")
 
-    # Fetch Celery task result
-    celery_result = AsyncResult(job.task_id)
-    if not celery_result.ready():
-        return {"task_id": task_id, "status": job.status, "message": "Result not available yet"}
-
-    return {"task_id": task_id, "status": "completed", "result": celery_result.result}
+    if not task_queue.is_ready(status["celery_status"]):
+        return {"task_id": task_id, "status": status["job_status"], "message": "Result not available yet"}
+
+    return {"task_id": task_id, "status": "completed", "result": status["result"]}
+
+
+@router.get("/{task_id}/progress")
+async def get_task_progress(task_id: str):
+    """ Latest progress a running task published; served from Redis without touching the DB. """
+    raw = await task_queue.get_redis().get(progress.state_key(task_id))
+    if raw is None:
+        raise HTTPException(status_code=404, detail="No progress reported for this task")
+    return json.loads(raw)
+
+
+def _sse(payload: str):
+    return f"event: progress\ndata: {payload}\n\n"
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """
+    Server-sent events with the task's progress: the last known state first, then every
+    update as it is published. The stream ends once the task completes or fails.
+    """
+    client = task_queue.get_redis()
+    pubsub = client.pubsub()
+    # Subscribe before reading the state so no update falls between the two
+    await pubsub.subscribe(progress.channel(task_id))
+
+    async def events():
+        try:
+            last = await client.get(progress.state_key(task_id))
+            if last is not None:
+                yield _sse(last.decode())
+                if json.loads(last).get("status") in progress.TERMINAL_STATES:
+                    return
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = message["data"].decode()
+                yield _sse(payload)
+                if json.loads(payload).get("status") in progress.TERMINAL_STATES:
+                    return
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,204 @@
+#  ./services/data_prep.py
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from rdkit import Chem, rdBase
+from src.services import process_pool
+from src.services.descriptor_service import cpu_budget
+from src.services.run_cache import file_digest
+from src.services.smiles_stream import HEADER_NAMES, DigestSet, smiles_digest
+
+# Rows handed to a worker at a time
+CHUNK_ROWS = int(os.environ.get("PREP_CHUNK_ROWS", "20000"))
+VALIDATION_FRACTION = float(os.environ.get("PREP_VALIDATION_FRACTION", "0.1"))
+SPLIT_SEED = int(os.environ.get("PREP_SPLIT_SEED", "0"))
+# Prepared datasets kept per project; older ones are deleted
+KEEP_PREPARED = int(os.environ.get("PREP_KEEP", "2"))
+
+# Defaults follow the REINVENT prior's vocabulary
+DEFAULT_FILTERS = {
+    "elements": os.environ.get("PREP_ELEMENTS", "C,N,O,S,F,Cl,Br,I,P,H").split(","),
+    "min_heavy_atoms": int(os.environ.get("PREP_MIN_HEAVY_ATOMS", "5")),
+    "max_heavy_atoms": int(os.environ.get("PREP_MAX_HEAVY_ATOMS", "70")),
+    "max_abs_charge": int(os.environ.get("PREP_MAX_ABS_CHARGE", "1")),
+    "largest_fragment": os.environ.get("PREP_LARGEST_FRAGMENT", "true").lower() == "true",
+    "remove_isotopes": os.environ.get("PREP_REMOVE_ISOTOPES", "true").lower() == "true",
+}
+
+MANIFEST = "manifest.json"
+SPLITS = ("train", "validation")
+
+
+def settings(filters: dict = None, validation_fraction: float = VALIDATION_FRACTION, split_seed: int = SPLIT_SEED):
+    """ Everything besides the input that decides the prepared output. """
+    return {
+        "filters": {**DEFAULT_FILTERS, **(filters or {})},
+        "validation_fraction": validation_fraction,
+        "split_seed": split_seed,
+    }
+
+
+def _read_chunks(path: Path, chunk_rows: int):
+    """ Yields lists of SMILES (the first field of each line), skipping a header line. """
+    chunk = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f):
+            text = line.strip()
+            if not text:
+                continue
+            # SMILES never contain commas or whitespace
+            smiles = text.replace("\t", ",").replace(" ", ",").split(",", 1)[0].strip('"')
+            if number == 0 and smiles.lower() in HEADER_NAMES:
+                continue
+            chunk.append(smiles)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _clean_chunk(smiles_chunk, filters):
+    """ Canonicalizes and filters one chunk; returns (kept canonical SMILES, rejections by reason). """
+    elements = set(filters["elements"])
+    kept = []
+    rejected = Counter()
+    # Rejections are counted by reason, not logged
+    with rdBase.BlockLogs():
+        for smiles in smiles_chunk:
+            mol = Chem.MolFromSmiles(smiles)
+            if mol is None:
+                rejected["invalid"] += 1
+                continue
+            if filters["largest_fragment"] and "." in smiles:
+                mol = max(Chem.GetMolFrags(mol, asMols=True), key=lambda fragment: fragment.GetNumHeavyAtoms())
+            if filters["remove_isotopes"]:
+                for atom in mol.GetAtoms():
+                    atom.SetIsotope(0)
+            if any(atom.GetSymbol() not in elements for atom in mol.GetAtoms()):
+                rejected["elements"] += 1
+                continue
+            if not filters["min_heavy_atoms"] <= mol.GetNumHeavyAtoms() <= filters["max_heavy_atoms"]:
+                rejected["heavy_atoms"] += 1
+                continue
+            if abs(Chem.GetFormalCharge(mol)) > filters["max_abs_charge"]:
+                rejected["charge"] += 1
+                continue
+            kept.append(Chem.MolToSmiles(mol))
+    return kept, dict(rejected)
+
+
+def _clean_chunks(chunks, filters, workers):
+    """ Cleans chunks in parallel, in input order, with at most 2 * workers chunks in flight. """
+    return process_pool.imap(_clean_chunk, chunks, workers, "Data-prep", filters)
+
+
+class _SplitWriter:
+    """ Streams one split to <split>.smi; REINVENT takes one file per split. """
+
+    def __init__(self, root: Path, split: str):
+        self.name = f"{split}.smi"
+        self.rows = 0
+        self._file = open(root / self.name, "w")
+        self._file.write("SMILES\n")
+
+    def write(self, smiles_list):
+        for smiles in smiles_list:
+            self._file.write(smiles + "\n")
+        self.rows += len(smiles_list)
+
+    def close(self):
+        self._file.close()
+
+
+def _load_manifest(path: Path):
+    with open(path / MANIFEST) as f:
+        manifest = json.load(f)
+    for split in SPLITS:
+        manifest["files"][split] = str(path / manifest["files"][split])
+    manifest["path"] = str(path)
+    return manifest
+
+
+def _prune(output_root: Path, keep: Path):
+    prepared = sorted(
+        (path for path in output_root.iterdir() if (path / MANIFEST).exists() and path != keep),
+        key=lambda path: path.stat().st_mtime,
+    )
+    for path in prepared[:max(0, len(prepared) - (KEEP_PREPARED - 1))]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def prepare_dataset(input_file: Path, output_root: Path, filters: dict = None,
+                    validation_fraction: float = VALIDATION_FRACTION, split_seed: int = SPLIT_SEED, workers: int = None):
+    """
+    Canonicalizes, filters, de-duplicates and splits a SMILES file into train/validation files
+    under output_root/<key>, where the key hashes the input content and the settings. Chunks are
+    cleaned in parallel on all available cores and streamed to disk, so memory stays bounded by the
+    chunks in flight plus the de-duplication digests. An unchanged input returns the existing manifest.
+    """
+    output_root = Path(output_root)
+    prep_settings = settings(filters, validation_fraction, split_seed)
+    input_sha256 = file_digest(input_file)
+    key = hashlib.sha256(json.dumps({"input": input_sha256, **prep_settings}, sort_keys=True).encode()).hexdigest()[:16]
+    prepared_path = output_root / key
+    if (prepared_path / MANIFEST).exists():
+        print(f"[INFO] Dataset {input_file} already prepared at {prepared_path}")
+        os.utime(prepared_path)
+        return _load_manifest(prepared_path)
+
+    started = time.perf_counter()
+    tmp_path = output_root / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+    tmp_path.mkdir(parents=True)
+    try:
+        writers = {split: _SplitWriter(tmp_path, split) for split in SPLITS}
+        seen = DigestSet()
+        stats = Counter()
+        threshold = int(validation_fraction * 10000)
+        for kept, rejected in _clean_chunks(_read_chunks(input_file, CHUNK_ROWS), prep_settings["filters"], workers or cpu_budget()):
+            stats.update(rejected)
+            stats["rows"] += len(kept) + sum(rejected.values())
+            new = seen.add_many([smiles_digest(smiles) for smiles in kept])
+            stats["duplicates"] += int(len(kept) - new.sum())
+            # Hash-based split: a molecule stays on the same side however the file is ordered or grown
+            split_rows = {split: [] for split in SPLITS}
+            for smiles, is_new in zip(kept, new):
+                if is_new:
+                    in_validation = smiles_digest(f"{split_seed}:{smiles}") % 10000 < threshold
+                    split_rows["validation" if in_validation else "train"].append(smiles)
+            for split, rows in split_rows.items():
+                writers[split].write(rows)
+        for writer in writers.values():
+            writer.close()
+
+        manifest = {
+            "key": key,
+            "input": str(input_file),
+            "input_sha256": input_sha256,
+            **prep_settings,
+            "stats": {**stats, **{split: writer.rows for split, writer in writers.items()}},
+            "files": {split: writer.name for split, writer in writers.items()},
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        # manifest.json is written last; its presence marks a complete dataset
+        with open(tmp_path / MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, prepared_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not (prepared_path / MANIFEST).exists():
+            raise
+        # Another worker prepared the same dataset first
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    _prune(output_root, prepared_path)
+    manifest = _load_manifest(prepared_path)
+    print(f"[INFO] Prepared {input_file}: {manifest['stats']} in {manifest['seconds']}s")
+    return manifest
@@ -0,0 +1,133 @@
+#  ./services/descriptor_cache.py
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from src.services import metrics
+
+PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
+CACHE_PATH = os.environ.get("DESCRIPTOR_CACHE_PATH", str(PROJECT_ROOT / ".cache" / "descriptors.sqlite"))
+MAX_ENTRIES = int(os.environ.get("DESCRIPTOR_CACHE_MAX_ENTRIES", "5000000"))
+
+# SQLite's bound-parameter limit is 999 on older builds
+_BATCH = 900
+
+
+class DescriptorCache:
+    """
+    Persistent, size-bounded descriptor cache keyed by canonical SMILES.
+    Shared by every worker and project on the node through a single SQLite file;
+    the least recently used entries are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, path, columns, max_entries: int = MAX_ENTRIES):
+        self.path = str(path)
+        self.columns = list(columns)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        column_sql = ", ".join(f'"{name}" REAL' for name in self.columns)
+        with self._connect() as db:
+            db.execute(f"CREATE TABLE IF NOT EXISTS descriptors (smiles TEXT PRIMARY KEY, {column_sql}, last_used REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS ix_descriptors_last_used ON descriptors (last_used)")
+            db.execute("CREATE TABLE IF NOT EXISTS stats "
+                       "(id INTEGER PRIMARY KEY CHECK (id = 0), hits INTEGER, misses INTEGER, entries INTEGER)")
+            db.execute("INSERT OR IGNORE INTO stats (id, hits, misses) VALUES (0, 0, 0)")
+            # The row count is kept in stats by put_many; caches from before it are counted once here
+            if "entries" not in [row[1] for row in db.execute("PRAGMA table_info(stats)")]:
+                db.execute("ALTER TABLE stats ADD COLUMN entries INTEGER")
+            db.execute("UPDATE stats SET entries = (SELECT COUNT(*) FROM descriptors) WHERE id = 0 AND entries IS NULL")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None or getattr(self._local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get_many(self, smiles_list):
+        """ Returns {smiles: values_tuple} for the keys that are cached. Read-only. """
+        db = self._connect()
+        column_sql = ", ".join(f'"{name}"' for name in self.columns)
+        keys = list(dict.fromkeys(smiles_list))
+        found = {}
+        for start in range(0, len(keys), _BATCH):
+            batch = keys[start:start + _BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = db.execute(
+                f"SELECT smiles, {column_sql} FROM descriptors WHERE smiles IN ({placeholders})", batch
+            )
+            for row in rows:
+                found[row[0]] = row[1:]
+        return found
+
+    def put_many(self, items):
+        """
+        Stores (smiles, values_tuple) pairs and evicts down to max_entries, in one transaction.
+        The entry count lives in the stats row, so no write has to count the table.
+        """
+        items = list(items)
+        if not items:
+            return
+        now = time.time()
+        rows = [(smi, *values, now) for smi, values in items]
+        placeholders = ",".join("?" * (len(self.columns) + 2))
+        with self._connect() as db:
+            added = db.executemany(f"INSERT OR IGNORE INTO descriptors VALUES ({placeholders})", rows).rowcount
+            if added < len(rows):
+                # Some were stored meanwhile by another worker (or repeat); refresh them in place
+                db.executemany(f"INSERT OR REPLACE INTO descriptors VALUES ({placeholders})", rows)
+            db.execute("UPDATE stats SET entries = entries + ? WHERE id = 0", (added,))
+            (entries,) = db.execute("SELECT entries FROM stats WHERE id = 0").fetchone()
+            self._evict(db, entries)
+
+    def touch(self, smiles_list):
+        """ Marks entries as recently used so LRU eviction keeps them. """
+        keys = list(dict.fromkeys(smiles_list))
+        if not keys:
+            return
+        now = time.time()
+        with self._connect() as db:
+            db.executemany("UPDATE descriptors SET last_used = ? WHERE smiles = ?", [(now, smi) for smi in keys])
+
+    def record(self, hits: int, misses: int):
+        """ Adds to the process-local and persisted hit/miss counters. """
+        self.hits += hits
+        self.misses += misses
+        metrics.cache_lookup("descriptors", True, hits)
+        metrics.cache_lookup("descriptors", False, misses)
+        with self._connect() as db:
+            db.execute("UPDATE stats SET hits = hits + ?, misses = misses + ? WHERE id = 0", (hits, misses))
+
+    def _evict(self, db, entries: int):
+        excess = entries - self.max_entries
+        if excess > 0:
+            evicted = db.execute(
+                "DELETE FROM descriptors WHERE smiles IN "
+                "(SELECT smiles FROM descriptors ORDER BY last_used LIMIT ?)",
+                (excess,),
+            ).rowcount
+            db.execute("UPDATE stats SET entries = entries - ? WHERE id = 0", (evicted,))
+
+    def stats(self):
+        """ Entry count plus persisted (all processes) and local hit/miss counters. """
+        db = self._connect()
+        hits, misses, entries = db.execute("SELECT hits, misses, entries FROM stats WHERE id = 0").fetchone()
+        total = hits + misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+        }
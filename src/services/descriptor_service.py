@@ -0,0 +1,198 @@
+#  ./services/descriptor_service.py
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from rdkit import Chem, rdBase
+from rdkit.Chem import Descriptors, QED
+from src.services import process_pool
+from src.services.descriptor_cache import CACHE_PATH, DescriptorCache
+
+# Column name -> dtype, in the order they appear in results.csv
+DESCRIPTOR_COLUMNS = {
+    "QED": np.float64,
+    "MolecularWeight": np.float64,
+    "SlogP": np.float64,
+    "TPSA": np.float64,
+    "NumRotatableBonds": np.int32,
+    "NumHDonors": np.int32,
+    "NumHAcceptors": np.int32,
+}
+
+CHUNK_SIZE = int(os.environ.get("DESCRIPTOR_CHUNK_SIZE", "2000"))
+# Below this many SMILES the pool start-up costs more than it saves
+MIN_PARALLEL_SMILES = int(os.environ.get("DESCRIPTOR_MIN_PARALLEL", "5000"))
+
+_caches = {}
+
+
+def get_descriptor_cache(path=CACHE_PATH):
+    """ Returns the process-wide descriptor cache, or None when DESCRIPTOR_CACHE_PATH is empty. """
+    if not path:
+        return None
+    if path not in _caches:
+        cache = _cache_call("open", DescriptorCache, path, DESCRIPTOR_COLUMNS)
+        if cache is None:
+            return None
+        _caches[path] = cache
+    return _caches[path]
+
+
+def _cache_call(action: str, call, *args, default=None):
+    """ Runs a descriptor cache operation; a locked, full or corrupt cache file counts as a miss. """
+    try:
+        return call(*args)
+    except sqlite3.Error as e:
+        print(f"[WARN] Descriptor cache {action} failed, computing without it: {e}")
+        return default
+
+
+def cpu_budget():
+    """ Number of cores this process may use, honouring DESCRIPTOR_WORKERS and CPU affinity. """
+    configured = os.environ.get("DESCRIPTOR_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _descriptor_values(mol):
+    return (
+        QED.qed(mol),
+        Descriptors.MolWt(mol),
+        Descriptors.MolLogP(mol),
+        Descriptors.TPSA(mol),
+        Descriptors.NumRotatableBonds(mol),
+        Descriptors.NumHDonors(mol),
+        Descriptors.NumHAcceptors(mol),
+    )
+
+
+def _compute_chunk(smiles_chunk, cache_path=None):
+    """
+    Parses each SMILES once and fills typed column arrays; unparsable molecules are dropped.
+    Molecules whose canonical SMILES is already cached skip the RDKit descriptor calls.
+    Returns (kept, columns, canonical, computed) for the kept rows.
+    """
+    n = len(smiles_chunk)
+    with rdBase.BlockLogs():
+        mols = [Chem.MolFromSmiles(smi) for smi in smiles_chunk]
+    canonical = [Chem.MolToSmiles(mol) if mol is not None else None for mol in mols]
+
+    cache = get_descriptor_cache(cache_path) if cache_path else None
+    cached = _cache_call("read", cache.get_many, [c for c in canonical if c is not None], default={}) if cache else {}
+
+    kept = np.empty(n, dtype=np.int64)
+    computed = np.zeros(n, dtype=bool)
+    columns = {name: np.empty(n, dtype=dtype) for name, dtype in DESCRIPTOR_COLUMNS.items()}
+    arrays = list(columns.values())
+
+    count = 0
+    for i, mol in enumerate(mols):
+        if mol is None:
+            continue
+        values = cached.get(canonical[i])
+        if values is None:
+            try:
+                values = _descriptor_values(mol)
+            except Exception:
+                continue
+            # Duplicates later in the chunk reuse this result
+            cached[canonical[i]] = values
+            computed[count] = True
+        for array, value in zip(arrays, values):
+            array[count] = value
+        kept[count] = i
+        count += 1
+
+    kept_canonical = [canonical[i] for i in kept[:count]]
+    return kept[:count], {name: array[:count] for name, array in columns.items()}, kept_canonical, computed[:count]
+
+
+def _chunks(smiles_list, chunk_size):
+    for start in range(0, len(smiles_list), chunk_size):
+        yield smiles_list[start:start + chunk_size]
+
+
+def _run_chunks(chunks, workers, cache_path):
+    return list(process_pool.imap(_compute_chunk, chunks, workers, "Descriptor", cache_path))
+
+
+def compute_descriptor_columns(smiles_list, workers=None, chunk_size=CHUNK_SIZE, use_cache=True, return_canonical=False):
+    """
+    Computes the descriptor columns for a list of SMILES in parallel chunks.
+    Returns (kept_indices, columns) where kept_indices points into smiles_list,
+    plus the kept rows' canonical SMILES when return_canonical is set.
+    The descriptor cache is consulted first, by raw then canonical SMILES.
+    """
+    smiles_list = list(smiles_list)
+    n = len(smiles_list)
+    cache = get_descriptor_cache() if use_cache else None
+
+    ok = np.zeros(n, dtype=bool)
+    columns = {name: np.empty(n, dtype=dtype) for name, dtype in DESCRIPTOR_COLUMNS.items()}
+    canonical_smiles = np.empty(n, dtype=object)
+
+    # REINVENT usually emits canonical SMILES, so most hits need no parsing at all
+    raw_hits = _cache_call("read", cache.get_many, smiles_list, default={}) if cache else {}
+    raw_hit_count = 0
+    if raw_hits:
+        for i, smi in enumerate(smiles_list):
+            values = raw_hits.get(smi)
+            if values is not None:
+                for name, value in zip(DESCRIPTOR_COLUMNS, values):
+                    columns[name][i] = value
+                ok[i] = True
+                # Cache keys are canonical, so a raw hit is already canonical
+                canonical_smiles[i] = smi
+                raw_hit_count += 1
+
+    pending = np.flatnonzero(~ok)
+    pending_smiles = [smiles_list[i] for i in pending]
+    chunks = list(_chunks(pending_smiles, chunk_size))
+
+    if workers is None:
+        workers = cpu_budget() if len(pending_smiles) >= MIN_PARALLEL_SMILES else 1
+    workers = max(1, min(workers, len(chunks)))
+
+    results = _run_chunks(chunks, workers, cache.path if cache else None)
+
+    new_entries, canonical_hits, computed_count = [], [], 0
+    offset = 0
+    for chunk, (kept, chunk_columns, canonical, computed) in zip(chunks, results):
+        rows = pending[kept + offset]
+        for name in DESCRIPTOR_COLUMNS:
+            columns[name][rows] = chunk_columns[name]
+        ok[rows] = True
+        if return_canonical and len(rows):
+            canonical_smiles[rows] = canonical
+        offset += len(chunk)
+
+        computed_count += int(computed.sum())
+        if cache:
+            values = zip(*(chunk_columns[name].tolist() for name in DESCRIPTOR_COLUMNS))
+            for smi, is_new, row_values in zip(canonical, computed, values):
+                if is_new:
+                    new_entries.append((smi, row_values))
+                else:
+                    canonical_hits.append(smi)
+
+    if cache:
+        _cache_call("write", cache.put_many, new_entries)
+        _cache_call("write", cache.touch, list(raw_hits) + canonical_hits)
+        _cache_call("write", cache.record, raw_hit_count + len(canonical_hits), computed_count)
+
+    kept = np.flatnonzero(ok)
+    if return_canonical:
+        return kept, {name: array[kept] for name, array in columns.items()}, canonical_smiles[kept]
+    return kept, {name: array[kept] for name, array in columns.items()}
+
+
+def compute_descriptors(smiles_list, workers=None, chunk_size=CHUNK_SIZE, use_cache=True):
+    """ Returns a DataFrame of SMILES plus the RDKit descriptors, in input order. """
+    smiles_list = list(smiles_list)
+    kept, columns = compute_descriptor_columns(smiles_list, workers=workers, chunk_size=chunk_size, use_cache=use_cache)
+    smiles = np.asarray(smiles_list, dtype=object)[kept] if len(kept) else np.empty(0, dtype=object)
+    return pd.DataFrame({"SMILES": smiles, **columns})
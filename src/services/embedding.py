@@ -0,0 +1,219 @@
+#  ./services/embedding.py
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from src.services import fingerprint_index, fingerprints, metrics, results_store
+
+EMBEDDING_DIR = "embedding"
+MODEL_FILE = "model.npz"
+META = "meta.json"
+# Per-run coordinates, kept next to results.parquet
+RUN_FILE = "embedding.npz"
+# Morgan bits are OR-folded to this many before PCA, which keeps the covariance matrix small
+FOLD_BITS = int(os.environ.get("EMBEDDING_FOLD_BITS", "512"))
+# Rows sampled for a fit, evenly over the runs; more only sharpens the axes slightly
+FIT_ROWS = int(os.environ.get("EMBEDDING_FIT_ROWS", "500000"))
+BATCH_ROWS = int(os.environ.get("EMBEDDING_BATCH_ROWS", "65536"))
+MAX_POINTS = 50000
+COMPONENTS = 2
+
+_lock = threading.Lock()
+_models = {}
+
+
+def features(packed):
+    """ Packed Morgan rows -> (n, FOLD_BITS) float32 0/1 features, folding word groups together with OR. """
+    packed = np.asarray(packed)
+    fold_words = FOLD_BITS // 64
+    folded = np.bitwise_or.reduce(packed.reshape(len(packed), -1, fold_words), axis=1)
+    return np.unpackbits(np.ascontiguousarray(folded).view(np.uint8), axis=1, bitorder="little").astype(np.float32)
+
+
+class Model:
+    """ A fitted 2D PCA projection of a project's fingerprints. """
+
+    def __init__(self, mean, components, meta: dict):
+        self.mean = mean
+        self.components = components
+        self.meta = meta
+        self.model_id = meta["model_id"]
+
+    def transform(self, packed):
+        """ 2D coordinates of packed fingerprint rows, BATCH_ROWS at a time. """
+        coordinates = np.empty((len(packed), COMPONENTS), dtype=np.float32)
+        for start in range(0, len(packed), BATCH_ROWS):
+            stop = start + BATCH_ROWS
+            coordinates[start:stop] = (features(packed[start:stop]) - self.mean) @ self.components.T
+        return coordinates
+
+
+def _model_path(project_path: Path):
+    return Path(project_path) / EMBEDDING_DIR
+
+
+@contextlib.contextmanager
+def _locked(path: Path):
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def load_model(project_path: Path):
+    """ The project's projection, or None before the first fit. Cached per process until refitted. """
+    path = _model_path(project_path)
+    try:
+        with open(path / META) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        model = _models.get(str(path))
+    if model is not None and model.model_id == meta["model_id"]:
+        return model
+    with np.load(path / MODEL_FILE) as arrays:
+        if str(arrays["model_id"]) != meta["model_id"]:
+            # Caught between a refit's two writes; the next call sees the new model
+            return model
+        model = Model(arrays["mean"], arrays["components"], meta)
+    with _lock:
+        _models[str(path)] = model
+    return model
+
+
+def fit(project_path: Path, seed: int = 0):
+    """
+    Fits the projection over the project's indexed fingerprints. The covariance is summed
+    batch by batch over at most FIT_ROWS sampled rows, so memory stays at one batch plus a
+    FOLD_BITS x FOLD_BITS matrix whatever the project's size.
+    """
+    view = fingerprint_index.load_view(project_path, "morgan")
+    ranges = view.live_ranges()
+    if not view.live_rows:
+        return None
+    rng = np.random.default_rng(seed)
+    rate = min(1.0, FIT_ROWS / view.live_rows)
+
+    count = 0
+    sums = np.zeros(FOLD_BITS, dtype=np.float64)
+    products = np.zeros((FOLD_BITS, FOLD_BITS), dtype=np.float64)
+    for start, stop in ranges:
+        for block_start in range(start, stop, BATCH_ROWS):
+            block_stop = min(block_start + BATCH_ROWS, stop)
+            rows = block_start + np.flatnonzero(rng.random(block_stop - block_start) < rate) if rate < 1 else None
+            block = features(view.data[block_start:block_stop] if rows is None else view.data[rows])
+            count += len(block)
+            sums += block.sum(axis=0, dtype=np.float64)
+            products += block.T @ block
+
+    mean = sums / count
+    covariance = products / count - np.outer(mean, mean)
+    variances, vectors = np.linalg.eigh(covariance)
+    top = np.argsort(variances)[::-1][:COMPONENTS]
+    components = vectors[:, top].T
+    # Eigenvectors have no preferred sign; fix one so refits don't mirror the plot
+    components *= np.sign(components[np.arange(COMPONENTS), np.abs(components).argmax(axis=1)])[:, None]
+
+    meta = {
+        "model_id": uuid.uuid4().hex,
+        "fold_bits": FOLD_BITS,
+        "fitted_rows": count,
+        "runs": sorted({segment["run_id"] for segment in view.segments if segment["live"]}),
+        "explained_variance": [round(float(v), 6) for v in variances[top] / max(variances.sum(), 1e-12)],
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    path = _model_path(project_path)
+    with _locked(path):
+        tmp_path = path / f".{MODEL_FILE}.{uuid.uuid4().hex[:8]}.tmp.npz"
+        try:
+            np.savez(tmp_path, mean=mean.astype(np.float32), components=components.astype(np.float32),
+                     model_id=meta["model_id"])
+            os.replace(tmp_path, path / MODEL_FILE)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        # meta.json is written last; its model_id marks which model.npz is complete
+        tmp_meta = path / f".{META}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta, path / META)
+    print(f"[INFO] Fitted chemical-space projection of {project_path} on {count} rows")
+    return load_model(project_path)
+
+
+def run_coordinates(run_path: Path, model: Model):
+    """ The run's 2D coordinates in the model's space, projected once per model and cached in the run. """
+    run_path = Path(run_path)
+    target = run_path / RUN_FILE
+    if not fingerprints.is_current(run_path, "morgan"):
+        fingerprints.build_run_fingerprints(run_path, kinds=("morgan",))
+    fingerprint_file = fingerprints.run_file(run_path, "morgan")
+    try:
+        if target.stat().st_mtime_ns >= fingerprint_file.stat().st_mtime_ns:
+            with np.load(target) as arrays:
+                if str(arrays["model_id"]) == model.model_id:
+                    return arrays["coordinates"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    coordinates = model.transform(fingerprints.load_run_fingerprints(run_path, "morgan"))
+    tmp_path = run_path / f".{RUN_FILE}.{uuid.uuid4().hex[:8]}.tmp.npz"
+    try:
+        np.savez(tmp_path, coordinates=coordinates, model_id=model.model_id)
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return coordinates
+
+
+def embed_finished_run(run_path: Path):
+    """ Projects a new run into its project's existing space, if any; never refits. Failures only warn. """
+    try:
+        model = load_model(Path(run_path).parent.parent)
+        if model is not None:
+            with metrics.stage("embedding"):
+                run_coordinates(run_path, model)
+    except Exception as e:
+        print(f"[WARN] Could not project {run_path} into the chemical space: {e}")
+
+
+def points(project_path: Path, max_points: int = 5000, run_id: str = None, seed: int = 0):
+    """
+    A downsampled point set for plotting: up to max_points molecules drawn uniformly over the
+    project's runs (or one run), with their 2D coordinates and SMILES. The projection is fitted
+    on first use; runs added later are projected into it as they are. Raises LookupError when
+    run_id has no indexed results.
+    """
+    project_path = Path(project_path)
+    model = load_model(project_path) or fit(project_path, seed)
+    view = fingerprint_index.load_view(project_path, "morgan")
+    runs = [(segment["run_id"], segment["rows"]) for segment in view.segments
+            if segment["live"] and (run_id is None or segment["run_id"] == run_id)]
+    if run_id is not None and not runs:
+        raise LookupError(f"Run not found: {run_id}")
+    total = sum(rows for _, rows in runs)
+    result = {"model": model.meta if model else None, "total": total, "count": 0, "points": []}
+    if model is None or not total:
+        return result
+
+    rng = np.random.default_rng(seed)
+    # Each run gets its share of the sample, so dense runs look dense
+    quotas = rng.multivariate_hypergeometric([rows for _, rows in runs], min(max_points, total))
+    for (name, rows), quota in zip(runs, quotas):
+        if not quota:
+            continue
+        run_path = project_path / "runs" / name
+        coordinates = run_coordinates(run_path, model)
+        sample = np.sort(rng.choice(rows, size=quota, replace=False))
+        smiles = results_store.read_rows(run_path / results_store.RESULTS_PARQUET, sample, columns=["SMILES"])["SMILES"]
+        for row, (x, y), smi in zip(sample.tolist(), coordinates[sample].tolist(), smiles):
+            result["points"].append({"run_id": name, "row": row, "x": round(x, 4), "y": round(y, 4), "SMILES": smi})
+    result["count"] = len(result["points"])
+    return result
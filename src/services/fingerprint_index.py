@@ -0,0 +1,249 @@
+#  ./services/fingerprint_index.py
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+import numpy as np
+from src.services import fingerprints, metrics, results_store
+
+INDEX_DIR = "fingerprints.index"
+MANIFEST = "manifest.json"
+# Rewrite the data files once this share of rows belongs to replaced or deleted runs
+COMPACT_FRACTION = float(os.environ.get("FINGERPRINT_INDEX_COMPACT_FRACTION", "0.3"))
+
+
+def _stamp(path: Path):
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class FingerprintIndex:
+    """
+    Project-level, append-only store of one fingerprint kind over all runs. Each finished run
+    is appended as a segment: its packed rows go to the end of the data file, its popcounts
+    to the counts file, and the manifest (written last, atomically) commits them. A run whose
+    results change is appended again and its old segment marked dead; dead rows are dropped
+    by compact(). Readers only use the rows the manifest lists, so they never need the lock.
+    """
+
+    def __init__(self, project_path: Path, kind: str = "morgan"):
+        self.project_path = Path(project_path)
+        self.kind = kind
+        self.words = fingerprints.words(kind)
+        self.path = self.project_path / INDEX_DIR / kind
+
+    @contextlib.contextmanager
+    def _locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def manifest(self):
+        try:
+            with open(self.path / MANIFEST) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"kind": self.kind, "bits": fingerprints.BITS[self.kind], "rows": 0, "generation": 0, "segments": [],
+                    "data": None, "counts": None}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.path / f".{MANIFEST}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path / MANIFEST)
+
+    def _append(self, manifest, run_id: str, packed, stamp):
+        if manifest["data"] is None:
+            manifest["data"], manifest["counts"] = f"data.{manifest['generation']}.bin", f"counts.{manifest['generation']}.bin"
+        rows = manifest["rows"]
+        packed = np.ascontiguousarray(packed, dtype="<u8")
+        for name, array, row_bytes in ((manifest["data"], packed, self.words * 8),
+                                       (manifest["counts"], fingerprints.popcount(packed).astype("<u2"), 2)):
+            with open(self.path / name, "ab") as f:
+                # Drops the tail of an append that never reached the manifest
+                f.truncate(rows * row_bytes)
+                f.write(array.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        for segment in manifest["segments"]:
+            if segment["run_id"] == run_id:
+                segment["live"] = False
+        manifest["segments"].append({"run_id": run_id, "start": rows, "rows": len(packed), "source": stamp, "live": True})
+        manifest["rows"] = rows + len(packed)
+
+    def add_run(self, run_id: str, run_path: Path = None):
+        """ Appends a finished run, building its fingerprint file first if needed; a no-op when already current. """
+        run_path = Path(run_path or self.project_path / "runs" / run_id)
+        parquet_path = run_path / results_store.RESULTS_PARQUET
+        if not fingerprints.is_current(run_path, self.kind):
+            fingerprints.build_run_fingerprints(run_path, kinds=(self.kind,))
+        with self._locked():
+            manifest = self.manifest()
+            stamp = _stamp(parquet_path)
+            if any(s["live"] and s["run_id"] == run_id and s["source"] == stamp for s in manifest["segments"]):
+                return False
+            self._append(manifest, run_id, fingerprints.load_run_fingerprints(run_path, self.kind), stamp)
+            self._write_manifest(manifest)
+        return True
+
+    def sync(self):
+        """
+        Brings the index up to date with the project's runs: appends runs that are missing or
+        whose results changed, marks deleted runs dead, and compacts when enough rows are dead.
+        Returns the number of runs appended.
+        """
+        runs_path = self.project_path / "runs"
+        current = {}
+        if runs_path.exists():
+            for run_path in runs_path.iterdir():
+                try:
+                    # Older runs only have results.csv; they get converted once here
+                    parquet_path = results_store.ensure_columnar(run_path)
+                except Exception as e:
+                    print(f"[WARN] Could not read results of run {run_path.name}: {e}")
+                    continue
+                if parquet_path is not None:
+                    current[run_path.name] = _stamp(parquet_path)
+        live = {s["run_id"]: s["source"] for s in self.manifest()["segments"] if s["live"]}
+        stale = [run_id for run_id, stamp in current.items() if live.get(run_id) != stamp]
+        gone = set(live) - set(current)
+        if not stale and not gone:
+            return 0
+
+        appended = 0
+        for run_id in sorted(stale):
+            try:
+                appended += self.add_run(run_id)
+            except Exception as e:
+                print(f"[WARN] Could not index fingerprints of run {run_id}: {e}")
+        if gone:
+            with self._locked():
+                manifest = self.manifest()
+                for segment in manifest["segments"]:
+                    if segment["run_id"] in gone:
+                        segment["live"] = False
+                self._write_manifest(manifest)
+        self.compact()
+        return appended
+
+    def compact(self, force: bool = False):
+        """ Rewrites the data files without dead segments, under new names so open readers keep theirs. """
+        with self._locked():
+            manifest = self.manifest()
+            dead = sum(s["rows"] for s in manifest["segments"] if not s["live"])
+            if not dead or (not force and dead < COMPACT_FRACTION * manifest["rows"]):
+                return False
+            view = IndexView(self.path, manifest)
+            compacted = {**manifest, "rows": 0, "segments": [], "generation": manifest["generation"] + 1, "data": None,
+                         "counts": None}
+            for segment in manifest["segments"]:
+                if segment["live"]:
+                    start = segment["start"]
+                    self._append(compacted, segment["run_id"], view.data[start:start + segment["rows"]], segment["source"])
+            if compacted["data"] is None:
+                compacted["data"], compacted["counts"] = (f"data.{compacted['generation']}.bin",
+                                                          f"counts.{compacted['generation']}.bin")
+                for name in (compacted["data"], compacted["counts"]):
+                    open(self.path / name, "wb").close()
+            self._write_manifest(compacted)
+            for name in (manifest["data"], manifest["counts"]):
+                with contextlib.suppress(FileNotFoundError):
+                    (self.path / name).unlink()
+        print(f"[INFO] Compacted {self.path}: dropped {dead} dead rows")
+        return True
+
+    def view(self):
+        """ A read-only, memory-mapped snapshot of the committed rows. """
+        return IndexView(self.path, self.manifest())
+
+
+class IndexView:
+    """ Committed rows of a FingerprintIndex, memory-mapped, with the segment each row belongs to. """
+
+    def __init__(self, path: Path, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+        self.rows = manifest["rows"]
+        self.words = manifest["bits"] // 64
+        self.segments = manifest["segments"]
+        if self.rows:
+            self.data = np.memmap(path / manifest["data"], dtype="<u8", mode="r", shape=(self.rows, self.words))
+            self.counts = np.memmap(path / manifest["counts"], dtype="<u2", mode="r", shape=(self.rows,))
+        else:
+            self.data = np.zeros((0, self.words), dtype=np.uint64)
+            self.counts = np.zeros(0, dtype=np.uint16)
+        self._starts = np.array([s["start"] for s in self.segments], dtype=np.int64)
+        # Set by load_view; changes whenever the committed rows or segments do
+        self.stamp = None
+
+    def live_ranges(self):
+        """ (start, stop) row ranges of the live segments. """
+        return [(s["start"], s["start"] + s["rows"]) for s in self.segments if s["live"] and s["rows"]]
+
+    @property
+    def live_rows(self):
+        return sum(stop - start for start, stop in self.live_ranges())
+
+    def locate(self, rows):
+        """ Maps index rows to (run_id, row within the run's results.parquet). """
+        rows = np.asarray(rows, dtype=np.int64)
+        segment_ids = np.searchsorted(self._starts, rows, side="right") - 1
+        return [(self.segments[s]["run_id"], int(row - self.segments[s]["start"])) for s, row in zip(segment_ids, rows)]
+
+    def split_by_run(self, rows):
+        """ Splits sorted index rows into (run_id, index rows, rows within the run's results.parquet) per segment. """
+        rows = np.asarray(rows, dtype=np.int64)
+        segment_ids = np.searchsorted(self._starts, rows, side="right") - 1
+        segment_ids, first = np.unique(segment_ids, return_index=True)
+        bounds = np.append(first, len(rows))
+        for segment_id, start, stop in zip(segment_ids, bounds[:-1], bounds[1:]):
+            segment = self.segments[segment_id]
+            yield segment["run_id"], rows[start:stop], rows[start:stop] - segment["start"]
+
+
+_lock = threading.Lock()
+_views = {}
+
+
+def load_view(project_path: Path, kind: str = "morgan", sync: bool = True):
+    """
+    The project's index for one kind, synced with its runs first unless sync is off.
+    Views are cached per process and reopened only when the manifest changes.
+    """
+    index = FingerprintIndex(project_path, kind)
+    if sync:
+        index.sync()
+    manifest_path = index.path / MANIFEST
+    stamp = _stamp(manifest_path) if manifest_path.exists() else None
+    key = str(index.path)
+    with _lock:
+        cached = _views.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    view = index.view()
+    view.stamp = stamp
+    with _lock:
+        _views[key] = (stamp, view)
+    return view
+
+
+def index_run(run_path: Path, kinds=tuple(fingerprints.RUN_FILES)):
+    """ Fingerprints a finished project run and appends it to the project's indexes. """
+    run_path = Path(run_path)
+    for kind in kinds:
+        FingerprintIndex(run_path.parent.parent, kind).add_run(run_path.name, run_path)
+
+
+def index_finished_run(run_path: Path):
+    """ index_run for the pipeline: searches sync any run missed here, so failures only warn. """
+    try:
+        with metrics.stage("fingerprints"):
+            index_run(run_path)
+    except Exception as e:
+        print(f"[WARN] Could not index fingerprints of {run_path}: {e}")
@@ -0,0 +1,124 @@
+#  ./services/fingerprints.py
+import os
+import uuid
+from pathlib import Path
+import numpy as np
+from rdkit import Chem, rdBase
+from rdkit.Chem import rdFingerprintGenerator
+from src.services import process_pool, results_store
+from src.services.descriptor_service import MIN_PARALLEL_SMILES, cpu_budget
+
+# Morgan (ECFP-like) bits used for similarity; changing them needs the indexes rebuilt
+MORGAN_RADIUS = int(os.environ.get("FINGERPRINT_RADIUS", "2"))
+MORGAN_BITS = int(os.environ.get("FINGERPRINT_BITS", "2048"))
+# Substructure screen bits (RDKit pattern fingerprint); same caveat
+PATTERN_BITS = int(os.environ.get("PATTERN_FINGERPRINT_BITS", "2048"))
+CHUNK_SIZE = int(os.environ.get("FINGERPRINT_CHUNK_SIZE", "5000"))
+
+# Kind -> file kept next to results.parquet, one row of packed uint64 words per result row
+RUN_FILES = {"morgan": "fingerprints.morgan.npy", "pattern": "fingerprints.pattern.npy"}
+BITS = {"morgan": MORGAN_BITS, "pattern": PATTERN_BITS}
+
+_generators = {}
+
+
+def words(kind: str):
+    return BITS[kind] // 64
+
+
+def _morgan_generator():
+    # Generators aren't picklable; each process builds its own
+    if "morgan" not in _generators:
+        _generators["morgan"] = rdFingerprintGenerator.GetMorganGenerator(radius=MORGAN_RADIUS, fpSize=MORGAN_BITS)
+    return _generators["morgan"]
+
+
+def _bits(mol, kind: str):
+    """ One molecule's (or SMARTS query's, for "pattern") fingerprint as a 0/1 uint8 array of BITS[kind] entries. """
+    if kind == "pattern":
+        bits = np.zeros(PATTERN_BITS, dtype=np.uint8)
+        bits[list(Chem.PatternFingerprint(mol, fpSize=PATTERN_BITS).GetOnBits())] = 1
+        return bits
+    return _morgan_generator().GetFingerprintAsNumPy(mol).astype(np.uint8, copy=False)
+
+
+def pack(bits):
+    """ (n, n_bits) 0/1 array -> (n, n_bits // 64) uint64, bit i of a row in word i // 64. """
+    packed = np.packbits(np.asarray(bits, dtype=np.uint8), axis=1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8")
+
+
+def popcount(packed):
+    """ Set bits per row of a packed (n, words) array. """
+    return np.bitwise_count(packed).sum(axis=1, dtype=np.int32)
+
+
+def _fingerprint_chunk(smiles_chunk, kind: str):
+    """ Packed fingerprints for a chunk; unparsable SMILES get an all-zero row, which matches nothing. """
+    bits = np.zeros((len(smiles_chunk), BITS[kind]), dtype=np.uint8)
+    with rdBase.BlockLogs():
+        for i, smiles in enumerate(smiles_chunk):
+            mol = Chem.MolFromSmiles(smiles) if smiles else None
+            if mol is not None:
+                bits[i] = _bits(mol, kind)
+    return pack(bits)
+
+
+def compute(smiles_list, kind: str = "morgan", workers: int = None):
+    """ Packed fingerprints for a list of SMILES, in input order, in parallel chunks on large inputs. """
+    smiles_list = list(smiles_list)
+    if not smiles_list:
+        return np.zeros((0, words(kind)), dtype=np.uint64)
+    chunks = [smiles_list[start:start + CHUNK_SIZE] for start in range(0, len(smiles_list), CHUNK_SIZE)]
+    if workers is None:
+        workers = cpu_budget() if len(smiles_list) >= MIN_PARALLEL_SMILES else 1
+    workers = max(1, min(workers, len(chunks)))
+    return np.concatenate(list(process_pool.imap(_fingerprint_chunk, chunks, workers, "Fingerprint", kind)))
+
+
+def query_fingerprint(smiles: str, kind: str = "morgan"):
+    """ The packed fingerprint of one query molecule; raises ValueError for invalid SMILES. """
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise ValueError(f"Invalid SMILES: {smiles}")
+    return pack(_bits(mol, kind)[None, :])[0]
+
+
+def query_pattern(query_mol):
+    """
+    The packed pattern fingerprint of a SMARTS query. Every molecule containing the query
+    has at least these bits set, so rows missing any of them can be skipped unmatched.
+    """
+    return pack(_bits(query_mol, "pattern")[None, :])[0]
+
+
+def run_file(run_path: Path, kind: str):
+    return Path(run_path) / RUN_FILES[kind]
+
+
+def is_current(run_path: Path, kind: str):
+    """ True when the run's fingerprint file exists and is not older than its results. """
+    path = run_file(run_path, kind)
+    parquet_path = Path(run_path) / results_store.RESULTS_PARQUET
+    return path.exists() and parquet_path.exists() and path.stat().st_mtime_ns >= parquet_path.stat().st_mtime_ns
+
+
+def build_run_fingerprints(run_path: Path, kinds=tuple(RUN_FILES), workers: int = None):
+    """ Writes the fingerprint files of a finished run, aligned with the rows of results.parquet. """
+    run_path = Path(run_path)
+    smiles = results_store.read_columns(run_path / results_store.RESULTS_PARQUET, ["SMILES"])["SMILES"]
+    for kind in kinds:
+        packed = compute(smiles.tolist(), kind, workers)
+        target = run_file(run_path, kind)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp.npy")
+        try:
+            np.save(tmp_path, packed)
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    return {kind: run_file(run_path, kind) for kind in kinds}
+
+
+def load_run_fingerprints(run_path: Path, kind: str = "morgan"):
+    return np.load(run_file(run_path, kind), mmap_mode="r")
@@ -1,27 +1,80 @@
 #  ./services/job_service.py
-from sqlalchemy.orm import Session
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.db.models import Job  # Ensure Job model is correctly imported
 
+
+def encode_run_cursor(job: Job) -> str:
+    """ Opaque keyset cursor: (created_at, task_id) of the last job already returned. """
+    position = {"created_at": job.created_at.isoformat(), "task_id": job.task_id}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_run_cursor(cursor: str):
+    """ Inverse of encode_run_cursor; raises ValueError on anything it did not produce. """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(position["created_at"]), str(position["task_id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
 class JobService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def submit_job(self, task_id: str):
+    async def submit_job(self, task_id: str, job_type: str = "design", project_id: str = "N/A", run_id: str = "N/A"):
         """ Inserts a new job into the database. """
-        new_job = Job(task_id=task_id, status="queued")
+        new_job = Job(task_id=task_id, project_id=project_id, run_id=run_id, job_type=job_type, status="queued")
         self.db.add(new_job)
-        self.db.commit()
-        self.db.refresh(new_job)
+        await self.db.commit()
+        return new_job
+
+    async def submit_jobs(self, jobs):
+        """ Inserts many jobs in a single transaction. `jobs` are dicts of Job column values. """
+        new_jobs = [Job(status="queued", **job) for job in jobs]
+        self.db.add_all(new_jobs)
+        await self.db.commit()
+        return new_jobs
 
-    def get_job_by_id(self, task_id: str):
+    async def fail_jobs(self, task_ids, error: str):
+        """ Marks jobs failed, e.g. when their tasks could not be published. """
+        await self.db.execute(
+            update(Job).where(Job.task_id.in_(task_ids)).values(status="failed", error=error, finished_at=datetime.utcnow())
+        )
+        await self.db.commit()
+
+    async def get_job_by_id(self, task_id: str):
         """ Fetches a job record by its task_id. """
-        return self.db.query(Job).filter(Job.task_id == task_id).first()
+        result = await self.db.execute(select(Job).where(Job.task_id == task_id))
+        return result.scalars().first()
 
-    def update_job_status(self, task_id: str, status: str):
+    async def update_job_status(self, task_id: str, status: str):
         """ Updates the status of a job in the database. """
-        job = self.get_job_by_id(task_id)
+        job = await self.get_job_by_id(task_id)
         if job:
             job.status = status
-            self.db.commit()
+            await self.db.commit()
             return job
         return None
+
+    async def list_project_jobs(self, project_id: str, limit: int, cursor: str = None):
+        """
+        One page of a project's jobs, newest first, and the cursor for the next page.
+        Seeks on the (project_id, created_at, task_id) index, so each page costs O(limit).
+        """
+        query = select(Job).where(Job.project_id == project_id)
+        if cursor:
+            created_at, task_id = decode_run_cursor(cursor)
+            query = query.where(or_(
+                Job.created_at < created_at,
+                and_(Job.created_at == created_at, Job.task_id < task_id),
+            ))
+        query = query.order_by(Job.created_at.desc(), Job.task_id.desc()).limit(limit + 1)
+        jobs = list((await self.db.execute(query)).scalars())
+        next_cursor = encode_run_cursor(jobs[limit - 1]) if len(jobs) > limit else None
+        return jobs[:limit], next_cursor
@@ -0,0 +1,169 @@
+#  ./services/job_status.py
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import redis
+from sqlalchemy import bindparam, select, update
+from src.db.connection import SessionLocal
+from src.db.models import Job
+from src.services import metrics
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+# API processes listen here to drop cached task statuses
+STATUS_CHANNEL = "task-status"
+
+# Pending updates are written together every FLUSH_INTERVAL seconds, or sooner at BATCH_SIZE
+FLUSH_INTERVAL = float(os.environ.get("JOB_STATUS_FLUSH_INTERVAL", "1"))
+BATCH_SIZE = int(os.environ.get("JOB_STATUS_BATCH_SIZE", "100"))
+# A batch whose write fails is retried this many flushes before its updates are dropped
+MAX_ATTEMPTS = 30
+
+_redis = None
+
+
+def _client():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def publish_status(task_id: str, status: str):
+    """ Announces a task state change; failures are logged and never affect the task. """
+    if not task_id:
+        return
+    try:
+        _client().publish(STATUS_CHANNEL, json.dumps({"task_id": task_id, "status": status, "at": time.time()}))
+    except (redis.RedisError, OSError) as e:
+        print(f"[WARN] Could not publish status {status} for {task_id}: {e}")
+
+
+class JobStatusWriter:
+    """
+    Collects job field updates in memory and writes them in one transaction per flush,
+    so status transitions from busy workers cost one DB round-trip per batch instead of
+    one per change. Later updates to the same job are merged into the pending one.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._attempts = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Celery forks its pool after import; each child needs its own flusher
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def record(self, task_id: str, **fields):
+        if not task_id:
+            return
+        with self._lock:
+            self._pending.setdefault(task_id, {}).update(fields)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def fail(self, task_id: str, error: str = None):
+        """ Marks a job failed even if its Celery task goes on to return normally. """
+        if not task_id:
+            return
+        with self._lock:
+            self._failed.add(task_id)
+        self.record(task_id, status="failed", finished_at=datetime.utcnow(), error=(str(error)[-2000:] if error else None))
+
+    def pop_failed(self, task_id: str):
+        with self._lock:
+            if task_id in self._failed:
+                self._failed.discard(task_id)
+                return True
+            return False
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[WARN] Job status flush failed, will retry: {e}")
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        table = Job.__table__
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            existing = set(db.execute(select(table.c.task_id).where(table.c.task_id.in_(list(batch)))).scalars())
+            # executemany needs the same columns in every row, so group by field set
+            groups = {}
+            for task_id in existing:
+                fields = batch[task_id]
+                groups.setdefault(tuple(sorted(fields)), []).append(
+                    {"_task_id": task_id, **{f"_{column}": value for column, value in fields.items()}}
+                )
+            for columns, rows in groups.items():
+                statement = (
+                    update(table)
+                    .where(table.c.task_id == bindparam("_task_id"))
+                    .values({column: bindparam(f"_{column}") for column in columns})
+                )
+                db.execute(statement, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._requeue(batch)
+            raise
+        finally:
+            db.close()
+            # Flushes run on a background thread, outside any task
+            metrics.observe_stage("db_write", time.perf_counter() - started, job_type="job_status")
+
+        # Rows are inserted before their task is published, so a missing row means a task without
+        # a job of its own, such as a sampling shard; its updates are dropped rather than retried
+        with self._lock:
+            for task_id in batch:
+                self._attempts.pop(task_id, None)
+        for task_id in existing:
+            publish_status(task_id, batch[task_id].get("status", "updated"))
+        return len(existing)
+
+    def _requeue(self, batch):
+        with self._lock:
+            for task_id, fields in batch.items():
+                attempts = self._attempts.get(task_id, 0) + 1
+                if attempts > MAX_ATTEMPTS:
+                    self._attempts.pop(task_id, None)
+                    print(f"[WARN] Dropping status update for job {task_id} after {MAX_ATTEMPTS} failed writes: {fields}")
+                    continue
+                self._attempts[task_id] = attempts
+                # Newer updates recorded since the batch was taken win
+                self._pending[task_id] = {**fields, **self._pending.get(task_id, {})}
+
+
+def _flush_at_exit():
+    try:
+        writer.flush()
+    except Exception as e:
+        print(f"[WARN] Lost job status updates at exit: {e}")
+
+
+writer = JobStatusWriter()
+atexit.register(_flush_at_exit)
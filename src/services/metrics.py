@@ -0,0 +1,111 @@
+#  ./services/metrics.py
+import contextlib
+import contextvars
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+
+# Set for prefork workers or several API processes: each process writes its samples here
+# and the exporter sums them. Must be an empty directory at startup.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+# Port of the worker-side exporter; empty disables it
+WORKER_METRICS_PORT = os.environ.get("WORKER_METRICS_PORT", "9808")
+# Celery queues whose depth /metrics reports
+QUEUES = os.environ.get("METRICS_QUEUES", "celery,molecule,generation,tl,rl").split(",")
+
+# From small file writes up to long training runs
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "reinvent_stage_seconds", "Wall time of a pipeline stage",
+    ["job_type", "stage"], buckets=STAGE_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "reinvent_queue_wait_seconds", "Time from publishing a task to a worker starting it",
+    ["job_type"], buckets=STAGE_BUCKETS,
+)
+REINVENT_CPU_SECONDS = Histogram(
+    "reinvent_process_cpu_seconds", "User plus system CPU time of one REINVENT run",
+    ["job_type", "runner"], buckets=STAGE_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "reinvent_http_request_seconds", "API time until the response body is fully sent, by route template",
+    ["method", "route", "status"], buckets=HTTP_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "reinvent_cache_lookups", "Cache lookups by cache and outcome",
+    ["cache", "result"],
+)
+QUEUE_DEPTH = Gauge(
+    "reinvent_queue_depth", "Messages waiting in a Celery queue",
+    ["queue"], multiprocess_mode="livemax",
+)
+
+_job_type = contextvars.ContextVar("metrics_job_type", default="none")
+
+
+def set_job_type(job_type: str):
+    """ Labels the stages timed from here on in the current task. """
+    _job_type.set(job_type)
+
+
+def observe_stage(name: str, seconds: float, job_type: str = None):
+    STAGE_SECONDS.labels(job_type or _job_type.get(), name).observe(seconds)
+
+
+@contextlib.contextmanager
+def stage(name: str, job_type: str = None):
+    """ Times the block as one pipeline stage of the current task, failed or not. """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, job_type)
+
+
+def observe_queue_wait(seconds: float):
+    QUEUE_WAIT_SECONDS.labels(_job_type.get()).observe(max(0.0, seconds))
+
+
+def observe_reinvent_cpu(runner: str, seconds):
+    if seconds is not None:
+        REINVENT_CPU_SECONDS.labels(_job_type.get(), runner).observe(seconds)
+
+
+def cache_lookup(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
+
+
+def set_queue_depths(depths: dict):
+    for queue, depth in depths.items():
+        QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def _registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render():
+    """ The current samples in the Prometheus text format, with their content type. """
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int):
+    """ Serves /metrics on its own port from a background thread, e.g. in the Celery worker's main process. """
+    start_http_server(port, registry=_registry())
+    print(f"[INFO] Metrics exporter listening on :{port}")
+
+
+def mark_process_dead(pid: int):
+    """ Drops a finished process's live gauges from the multiprocess files. """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,71 @@
+#  ./services/process_pool.py
+from collections import deque
+from billiard import Pool
+from billiard.einfo import ExceptionWithTraceback
+from billiard.exceptions import WorkerLostError
+
+# Failures of the pool itself rather than of the work; the work then runs in-process
+POOL_ERRORS = (OSError, WorkerLostError)
+
+
+def _start(workers: int, label: str):
+    if workers <= 1:
+        return None
+    try:
+        # billiard, unlike multiprocessing, may fork from the daemonic children of Celery's prefork pool
+        return Pool(processes=workers)
+    except POOL_ERRORS as e:
+        unavailable(label, e)
+        return None
+
+
+def unavailable(label: str, error):
+    print(f"[WARN] {label} pool unavailable, working in-process: {error}")
+
+
+def imap(func, items, workers: int, label: str, *args):
+    """
+    Yields func(item, *args) for each item, in input order, computed on `workers` processes
+    with at most 2 * workers items in flight. Runs in-process when workers <= 1, and carries
+    on in-process from the first unfinished item if the pool cannot start or breaks.
+    """
+    pool = _start(workers, label)
+    pending = deque()
+
+    def finish():
+        nonlocal pool
+        item, result = pending.popleft()
+        if result is not None:
+            try:
+                return result.get()
+            except (*POOL_ERRORS, ExceptionWithTraceback) as e:
+                # A lost worker's job fails with its WorkerLostError wrapped in ExceptionWithTraceback
+                if isinstance(e, ExceptionWithTraceback):
+                    if not isinstance(e.exc, WorkerLostError):
+                        raise
+                    e = e.exc
+                unavailable(label, e)
+                pool.terminate()
+                pool.join()
+                pool = None
+                unfinished = [other for other, _ in pending]
+                pending.clear()
+                pending.extend((other, None) for other in unfinished)
+        return func(item, *args)
+
+    try:
+        for item in items:
+            pending.append((item, pool.apply_async(func, (item, *args)) if pool is not None else None))
+            while pending and (len(pending) >= 2 * workers or pool is None):
+                yield finish()
+        while pending:
+            yield finish()
+        if pool is not None:
+            # Idle workers exit on close; terminate can race with their start-up and hang the join
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,264 @@
+#  ./services/profiling.py
+import collections
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", str(PROJECT_ROOT / ".profiles")))
+# Lets clients switch profiling on; off by default, when the flags are ignored
+ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+# Profiles kept; older ones are deleted
+KEEP_PROFILES = int(os.environ.get("PROFILE_KEEP", "100"))
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Frames recorded per allocation; more frames cost more while tracing
+TRACEMALLOC_FRAMES = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", "10"))
+TOP_ENTRIES = 50
+
+HEADER = "X-Profile"
+QUERY = "profile_request"
+# Message header read by the worker, set through task_options()
+TASK_HEADER = "profile"
+MODES = ("sampling", "deterministic")
+META = "meta.json"
+# Served by the profiles endpoint: name -> media type
+ARTIFACTS = {
+    "profile.txt": "text/plain",
+    "profile.prof": "application/octet-stream",
+    "profile.collapsed": "text/plain",
+    "memory.txt": "text/plain",
+}
+
+# Leaf frames of threads that are only waiting; left out of the samples
+IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("connection.py", "wait")}
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def requested_mode(flag, default: str):
+    """
+    Profile mode asked for by a header, query or task flag: "sampling", "deterministic",
+    or any other true value for the default. None when not asked for or disabled.
+    """
+    if not ENABLED or flag in (None, False, "", "0", "false"):
+        return None
+    return flag if flag in MODES else default
+
+
+def task_options(profile: bool):
+    """ apply_async options that make the worker profile the task. """
+    return {"headers": {TASK_HEADER: True}} if profile else {}
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    """ Snapshot and peak while tracing; tracing stops with its last user. """
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return snapshot, peak
+
+
+class _Sampler(threading.Thread):
+    """
+    Records the Python stack of every other thread each interval, as collapsed stacks
+    (flamegraph.pl / speedscope input). Sync routes and streamed bodies hop between
+    threadpool threads, so all threads are sampled; concurrent requests show up too.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        """ Functions by samples spent in them (self) and under them (total). """
+        own, total = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms\n", f"{'self':>8}{'total':>8}  function"]
+        for frame, count in own.most_common(TOP_ENTRIES):
+            lines.append(f"{count:>8}{total[frame]:>8}  {frame}")
+        lines.append(f"\n{'total':>16}  function")
+        for frame, count in total.most_common(TOP_ENTRIES):
+            lines.append(f"{count:>16}  {frame}")
+        return "\n".join(lines) + "\n"
+
+
+class Capture:
+    """
+    One profile: a sampling or deterministic (cProfile) CPU profile plus a tracemalloc
+    snapshot, written to PROFILE_DIR/<profile_id> by finish(). cProfile only sees the
+    thread that started it, so it suits tasks and async routes; sampling covers every thread.
+    """
+
+    def __init__(self, kind: str, name: str, mode: str = "sampling", profile_id: str = None, **meta):
+        self.profile_id = profile_id or uuid.uuid4().hex
+        self.kind = kind
+        self.name = name
+        self.mode = mode
+        self.meta = meta
+        self._profiler = None
+        self._sampler = None
+
+    def start(self):
+        _start_tracemalloc()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        if self.mode == "deterministic":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(SAMPLE_INTERVAL)
+            self._sampler.start()
+        return self
+
+    def finish(self, **meta):
+        """ Stops profiling and stores the artifacts; failures are logged and never affect the caller. """
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        seconds = time.perf_counter() - self._started
+        cpu_seconds = time.process_time() - self._cpu_started
+        snapshot, peak = _stop_tracemalloc()
+        try:
+            return self._write(seconds, cpu_seconds, snapshot, peak, meta)
+        except Exception as e:
+            print(f"[WARN] Could not store profile {self.profile_id}: {e}")
+            return None
+
+    def _write(self, seconds, cpu_seconds, snapshot, peak, meta):
+        path = PROFILE_DIR / self.profile_id
+        tmp_path = PROFILE_DIR / f".{self.profile_id}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp_path.mkdir(parents=True)
+        try:
+            if self._profiler is not None:
+                self._profiler.dump_stats(tmp_path / "profile.prof")
+                text = io.StringIO()
+                pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(TOP_ENTRIES)
+                (tmp_path / "profile.txt").write_text(text.getvalue())
+            else:
+                with open(tmp_path / "profile.collapsed", "w") as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in self._sampler.stacks.most_common())
+                (tmp_path / "profile.txt").write_text(self._sampler.summary())
+
+            # Ignore the profiler's own allocations
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            stats = snapshot.statistics("lineno")
+            with open(tmp_path / "memory.txt", "w") as f:
+                f.write(f"Peak traced memory: {peak / 2 ** 20:.1f} MB (whole process while tracing)\n")
+                f.write(f"Still allocated at the end: {sum(stat.size for stat in stats) / 2 ** 20:.1f} MB\n\n")
+                f.writelines(f"{stat}\n" for stat in stats[:TOP_ENTRIES])
+
+            record = {
+                "profile_id": self.profile_id,
+                "kind": self.kind,
+                "name": self.name,
+                "mode": self.mode,
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "seconds": round(seconds, 6),
+                "cpu_seconds": round(cpu_seconds, 6),
+                "peak_traced_mb": round(peak / 2 ** 20, 3),
+                "artifacts": sorted(name for name in ARTIFACTS if (tmp_path / name).exists()),
+                **self.meta,
+                **meta,
+            }
+            # meta.json is written last; its presence marks a complete profile
+            with open(tmp_path / META, "w") as f:
+                json.dump(record, f, indent=2, default=str)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        print(f"[INFO] Profile of {self.kind} {self.name} stored at {path} ({seconds:.3f}s)")
+        _prune(path)
+        return record
+
+
+def _prune(keep: Path):
+    profiles = sorted(
+        (path for path in PROFILE_DIR.iterdir() if (path / META).exists() and path != keep),
+        key=lambda path: path.stat().st_mtime,
+    )
+    for path in profiles[:max(0, len(profiles) - (KEEP_PROFILES - 1))]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load(profile_id: str):
+    """ A stored profile's metadata, or None. """
+    path = PROFILE_DIR / profile_id
+    # Ids are hex or task ids; anything else could escape the store
+    if path.parent != PROFILE_DIR or profile_id.startswith("."):
+        return None
+    try:
+        with open(path / META) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_path(profile_id: str, name: str):
+    record = load(profile_id)
+    if record is None or name not in record["artifacts"]:
+        return None
+    return PROFILE_DIR / profile_id / name
+
+
+def list_profiles(limit: int = 50):
+    """ Newest first. """
+    if not PROFILE_DIR.exists():
+        return []
+    paths = sorted(
+        (path for path in PROFILE_DIR.iterdir() if (path / META).exists()),
+        key=lambda path: path.stat().st_mtime, reverse=True,
+    )
+    return [record for record in (load(path.name) for path in paths[:limit]) if record is not None]
@@ -1,7 +1,10 @@
 import os
 from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from src.services.smiles_stream import SmilesStreamWriter
 
-BASE_PATH = Path("/app/projects")
+BASE_PATH = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1 << 20)))
 
 def create_project_dir(project_id: str):
     project_path = BASE_PATH / project_id
@@ -9,8 +12,22 @@ def create_project_dir(project_id: str):
     (project_path / "models").mkdir(parents=True, exist_ok=True)
     (project_path / "runs").mkdir(parents=True, exist_ok=True)
 
-def save_smiles_file(project_id: str, file):
+async def save_smiles_file(project_id: str, file):
+    """
+    Streams an uploaded SMILES file to disk in fixed-size chunks. Lines are validated,
+    canonicalized and de-duplicated on the fly, so input/train.csv is ready for training.
+    """
     input_dir = BASE_PATH / project_id / "input"
     file_path = input_dir / "train.csv"
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    writer = SmilesStreamWriter(file_path)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            # RDKit parsing is CPU-bound; keep it off the event loop
+            await run_in_threadpool(writer.feed, chunk)
+        return await run_in_threadpool(writer.close)
+    except BaseException:
+        writer.abort()
+        raise
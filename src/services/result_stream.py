@@ -0,0 +1,182 @@
+#  ./services/result_stream.py
+import base64
+import csv
+import io
+import json
+from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from src.services import results_store
+
+FILE_CHUNK_SIZE = 1 << 16
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# Row-id cursors page filtered results and offset cursors page a raw CSV file;
+# each kind is only accepted by the endpoint that issued it
+ROW_CURSOR = "row"
+OFFSET_CURSOR = "offset"
+
+
+def encode_cursor(position: int, kind: str = ROW_CURSOR) -> str:
+    """ Opaque keyset cursor: the last row id already returned, or the byte offset to resume at. """
+    return base64.urlsafe_b64encode(json.dumps({"kind": kind, "after": position}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str = ROW_CURSOR) -> int:
+    """ Inverse of encode_cursor; raises ValueError on anything it did not produce for `kind`. """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        document = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = document["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if document.get("kind") != kind or not isinstance(position, int) or position < (-1 if kind == ROW_CURSOR else 0):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def paginate(row_ids, cursor=None, limit=None):
+    """ Returns (page_row_ids, next_cursor) for a sorted row-id array. """
+    after = decode_cursor(cursor) if cursor else -1
+    start = int(np.searchsorted(row_ids, after, side="right"))
+    stop = len(row_ids) if limit is None else min(start + limit, len(row_ids))
+    page = row_ids[start:stop]
+    next_cursor = encode_cursor(int(page[-1])) if stop < len(row_ids) and len(page) else None
+    return page, next_cursor
+
+
+def stream_rows(parquet_path: Path, row_ids, output_format: str):
+    """ Yields the selected rows as CSV, NDJSON or a JSON array, one row group at a time. """
+    tables = results_store.iter_rows(parquet_path, row_ids)
+
+    if output_format == "csv":
+        header = True
+        for table in tables:
+            buffer = io.BytesIO()
+            pa_csv.write_csv(table, buffer, write_options=pa_csv.WriteOptions(include_header=header))
+            header = False
+            yield buffer.getvalue()
+        if header:
+            # No matching rows: still emit the header line
+            yield (",".join(results_store.column_names(parquet_path)) + "\n").encode()
+        return
+
+    if output_format == "ndjson":
+        for table in tables:
+            yield "".join(json.dumps(row) + "\n" for row in table.to_pylist()).encode()
+        return
+
+    separator = "["
+    for table in tables:
+        rows = table.to_pylist()
+        if rows:
+            yield (separator + ",".join(json.dumps(row) for row in rows)).encode()
+            separator = ","
+    yield b"[]" if separator == "[" else b"]"
+
+
+def stream_run_matches(runs_path: Path, matches, output_format: str):
+    """
+    Streams (run_id, row_ids) pairs from several runs as CSV or NDJSON, each row led by its
+    run_id and row, as the pairs arrive.
+    """
+    header = True
+    for run_id, row_ids in matches:
+        position = 0
+        # iter_rows returns consecutive slices of row_ids, one table per row group
+        for table in results_store.iter_rows(Path(runs_path) / run_id / results_store.RESULTS_PARQUET, row_ids):
+            rows = row_ids[position:position + table.num_rows]
+            position += table.num_rows
+            table = table.add_column(0, "row", pa.array(rows, type=pa.int64()))
+            table = table.add_column(0, "run_id", pa.array([run_id] * table.num_rows, type=pa.string()))
+            if output_format == "csv":
+                buffer = io.BytesIO()
+                pa_csv.write_csv(table, buffer, write_options=pa_csv.WriteOptions(include_header=header))
+                header = False
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(row) + "\n" for row in table.to_pylist()).encode()
+    if header and output_format == "csv":
+        yield b'"run_id","row","SMILES"\n'
+
+
+def page_end_offset(csv_path: Path, offset: int, limit: int):
+    """ Byte offset just past `limit` data lines starting at `offset`, or None at end of file. """
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        for _ in range(limit):
+            if not f.readline():
+                return None
+        end = f.tell()
+        return end if f.readline() else None
+
+
+def header_end_offset(csv_path: Path) -> int:
+    with open(csv_path, "rb") as f:
+        f.readline()
+        return f.tell()
+
+
+def file_offset(csv_path: Path, cursor: str = None) -> int:
+    """
+    The byte offset an offset cursor resumes csv_path at, or the first data line without one.
+    Raises ValueError unless the offset is the start of a data line or the end of the file.
+    """
+    start = header_end_offset(csv_path)
+    if not cursor:
+        return start
+    offset = decode_cursor(cursor, OFFSET_CURSOR)
+    with open(csv_path, "rb") as f:
+        size = f.seek(0, 2)
+        if not start <= offset <= size:
+            raise ValueError("Invalid cursor")
+        if offset > start:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                raise ValueError("Invalid cursor")
+    return offset
+
+
+def stream_csv_file(csv_path: Path, offset: int, end=None, output_format: str = "csv"):
+    """ Streams a CSV file's header plus the data lines in [offset, end) as CSV or NDJSON. """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        remaining = None if end is None else end - offset
+
+        if output_format == "csv":
+            yield header
+            while remaining is None or remaining > 0:
+                chunk = f.read(FILE_CHUNK_SIZE if remaining is None else min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+            return
+
+        fields = next(csv.reader([header.decode()]))
+        lines = []
+        while remaining is None or remaining > 0:
+            line = f.readline()
+            if not line:
+                break
+            if remaining is not None:
+                remaining -= len(line)
+            lines.append(line.decode())
+            if len(lines) >= 1024:
+                yield _ndjson_lines(fields, lines)
+                lines = []
+        if lines:
+            yield _ndjson_lines(fields, lines)
+
+
+def _ndjson_lines(fields, lines):
+    return "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in csv.reader(lines)).encode()
@@ -0,0 +1,214 @@
+#  ./services/results_index.py
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from src.services import metrics, results_store
+
+INDEX_DIR = "results.index"
+INDEX_COLUMNS = [
+    "QED",
+    "MolecularWeight",
+    "SlogP",
+    "TPSA",
+    "NumRotatableBonds",
+    "NumHDonors",
+    "NumHAcceptors",
+]
+
+META = "meta.json"
+LOCK_FILE = ".lock"
+
+# Open indexes kept per process; each holds two memory maps per column
+INDEX_CACHE_ENTRIES = int(os.environ.get("RESULTS_INDEX_CACHE_ENTRIES", "64"))
+QUERY_CACHE_ENTRIES = int(os.environ.get("RESULTS_QUERY_CACHE_ENTRIES", "256"))
+QUERY_CACHE_BYTES = int(os.environ.get("RESULTS_QUERY_CACHE_MB", "256")) << 20
+
+
+def _source_stamp(parquet_path: Path):
+    stat = parquet_path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+@contextlib.contextmanager
+def _locked(index_path: Path):
+    with open(index_path / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _read_meta(index_path: Path):
+    try:
+        with open(index_path / META) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_index(parquet_path: Path):
+    """
+    Writes results.index/ next to the Parquet file: for every descriptor column a stable
+    sort permutation and the sorted values, so a range filter becomes two binary searches.
+    Each build goes to its own version directory and meta.json is switched to it last, so
+    readers never see a half-replaced index; the previous version stays for readers still loading it.
+    """
+    parquet_path = Path(parquet_path)
+    index_path = parquet_path.parent / INDEX_DIR
+    columns = [name for name in INDEX_COLUMNS if name in results_store.column_names(parquet_path)]
+    values = results_store.read_columns(parquet_path, columns)
+    n_rows = results_store.num_rows(parquet_path)
+    order_dtype = np.int32 if n_rows < 2**31 else np.int64
+
+    index_path.mkdir(exist_ok=True)
+    version = uuid.uuid4().hex[:12]
+    tmp_path = index_path / f".{version}.tmp"
+    tmp_path.mkdir()
+    try:
+        for name in columns:
+            order = np.argsort(values[name], kind="stable").astype(order_dtype)
+            np.save(tmp_path / f"{name}.order.npy", order)
+            np.save(tmp_path / f"{name}.sorted.npy", values[name][order])
+        meta = {"rows": n_rows, "columns": columns, "source": _source_stamp(parquet_path), "version": version}
+        tmp_meta = index_path / f".{META}.{version}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+
+        with _locked(index_path):
+            previous = (_read_meta(index_path) or {}).get("version")
+            os.replace(tmp_path, index_path / version)
+            os.replace(tmp_meta, index_path / META)
+            # Everything but the two newest versions goes, including a pre-versioning flat index
+            for entry in index_path.iterdir():
+                if entry.name in (META, LOCK_FILE, version, previous) or entry.name.endswith(".tmp"):
+                    continue
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink(missing_ok=True)
+    finally:
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_meta = index_path / f".{META}.{version}.tmp"
+        if tmp_meta.exists():
+            tmp_meta.unlink()
+    return index_path
+
+
+class RangeIndex:
+    """ Memory-mapped per-run range index over the descriptor columns. """
+
+    def __init__(self, index_path: Path):
+        with open(index_path / META) as f:
+            meta = json.load(f)
+        self.path = index_path
+        self.rows = meta["rows"]
+        self.columns = meta["columns"]
+        self.source = meta["source"]
+        # Indexes built before versioning keep their arrays next to meta.json
+        data_path = index_path / meta["version"] if meta.get("version") else index_path
+        self._order = {name: np.load(data_path / f"{name}.order.npy", mmap_mode="r") for name in self.columns}
+        self._sorted = {name: np.load(data_path / f"{name}.sorted.npy", mmap_mode="r") for name in self.columns}
+
+    def select(self, ranges):
+        """
+        Returns the sorted row ids whose values fall inside every (low, high) range.
+        Ranges that cover a whole column are skipped; the narrowest range seeds the result
+        and the others are intersected through a single bitmap each.
+        """
+        spans = []
+        for name, (low, high) in ranges.items():
+            if name not in self._sorted:
+                continue
+            sorted_values = self._sorted[name]
+            start = int(np.searchsorted(sorted_values, low, side="left"))
+            stop = int(np.searchsorted(sorted_values, high, side="right"))
+            if start == 0 and stop == self.rows:
+                continue
+            spans.append((stop - start, name, start, stop))
+
+        if not spans:
+            return np.arange(self.rows, dtype=np.int64)
+
+        spans.sort()
+        _, name, start, stop = spans[0]
+        row_ids = np.array(self._order[name][start:stop], dtype=np.int64)
+        if len(spans) > 1 and len(row_ids):
+            keep = np.ones(len(row_ids), dtype=bool)
+            bitmap = np.zeros(self.rows, dtype=bool)
+            for _, name, start, stop in spans[1:]:
+                members = self._order[name][start:stop]
+                bitmap[members] = True
+                keep &= bitmap[row_ids]
+                bitmap[members] = False
+            row_ids = row_ids[keep]
+        row_ids.sort()
+        return row_ids
+
+
+_lock = threading.Lock()
+_indexes = OrderedDict()
+_query_cache = OrderedDict()
+_query_cache_bytes = 0
+
+
+def load_index(parquet_path: Path):
+    """ Returns the run's RangeIndex, (re)building it when missing or stale. """
+    parquet_path = Path(parquet_path)
+    index_path = parquet_path.parent / INDEX_DIR
+    stamp = _source_stamp(parquet_path)
+
+    with _lock:
+        index = _indexes.get(str(index_path))
+        if index is not None:
+            _indexes.move_to_end(str(index_path))
+    if index is not None and index.source == stamp:
+        return index
+
+    try:
+        index = RangeIndex(index_path)
+    except (OSError, ValueError, KeyError):
+        # Missing, or pruned by two rebuilds while it was being opened
+        index = None
+    if index is None or index.source != stamp:
+        index = RangeIndex(build_index(parquet_path))
+
+    with _lock:
+        _indexes[str(index_path)] = index
+        _indexes.move_to_end(str(index_path))
+        while len(_indexes) > INDEX_CACHE_ENTRIES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def select_rows(parquet_path: Path, ranges):
+    """ Row ids matching all descriptor ranges, served from a small LRU of recent queries. """
+    global _query_cache_bytes
+
+    index = load_index(parquet_path)
+    key = (str(index.path), tuple(index.source), tuple(sorted((name, tuple(bounds)) for name, bounds in ranges.items())))
+
+    with _lock:
+        row_ids = _query_cache.get(key)
+        if row_ids is not None:
+            _query_cache.move_to_end(key)
+    metrics.cache_lookup("results_query", row_ids is not None)
+    if row_ids is not None:
+        return row_ids
+
+    row_ids = index.select(ranges)
+    row_ids.setflags(write=False)
+
+    with _lock:
+        if key not in _query_cache:
+            _query_cache[key] = row_ids
+            _query_cache_bytes += row_ids.nbytes
+        while _query_cache and (len(_query_cache) > QUERY_CACHE_ENTRIES or _query_cache_bytes > QUERY_CACHE_BYTES):
+            _, evicted = _query_cache.popitem(last=False)
+            _query_cache_bytes -= evicted.nbytes
+    return row_ids
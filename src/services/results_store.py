@@ -0,0 +1,104 @@
+#  ./services/results_store.py
+import os
+import uuid
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+RESULTS_CSV = "results.csv"
+RESULTS_PARQUET = "results.parquet"
+
+# Row groups are the unit of partial reads; keep them small enough that a preview stays cheap
+ROW_GROUP_SIZE = int(os.environ.get("RESULTS_ROW_GROUP_SIZE", "65536"))
+COMPRESSION = os.environ.get("RESULTS_COMPRESSION", "zstd")
+# Column types are inferred from the first block of a legacy CSV, so make it a generous one
+CSV_BLOCK_SIZE = 16 << 20
+
+
+def _atomic_write_table(table: pa.Table, target: Path):
+    tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression=COMPRESSION)
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_results(run_path: Path, df: pd.DataFrame):
+    """ Writes results.csv for compatibility plus the typed, compressed results.parquet. """
+    run_path = Path(run_path)
+    df.to_csv(run_path / RESULTS_CSV, index=False)
+    _atomic_write_table(pa.Table.from_pandas(df, preserve_index=False), run_path / RESULTS_PARQUET)
+    return run_path / RESULTS_PARQUET
+
+
+def ensure_columnar(run_path: Path):
+    """
+    Returns the run's results.parquet, converting a legacy results.csv on first access.
+    Returns None when the run has no results at all.
+    """
+    run_path = Path(run_path)
+    parquet_path = run_path / RESULTS_PARQUET
+    csv_path = run_path / RESULTS_CSV
+
+    if parquet_path.exists() and (not csv_path.exists() or parquet_path.stat().st_mtime >= csv_path.stat().st_mtime):
+        return parquet_path
+    if not csv_path.exists():
+        return None
+
+    # Stream the CSV through in blocks so large legacy runs convert in bounded memory
+    reader = pa_csv.open_csv(csv_path, read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE))
+    tmp_path = parquet_path.with_name(f".{parquet_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with pq.ParquetWriter(tmp_path, reader.schema, compression=COMPRESSION) as writer:
+            for batch in reader:
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, parquet_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return parquet_path
+
+
+def column_names(parquet_path: Path):
+    return pq.ParquetFile(parquet_path).schema_arrow.names
+
+
+def num_rows(parquet_path: Path):
+    return pq.ParquetFile(parquet_path).metadata.num_rows
+
+
+def read_columns(parquet_path: Path, columns):
+    """ Reads only the requested columns as NumPy arrays. """
+    table = pq.read_table(parquet_path, columns=list(columns))
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def iter_rows(parquet_path: Path, row_ids, columns=None):
+    """ Yields the given (sorted) row ids as Arrow tables, one per row group that contains any of them. """
+    parquet_file = pq.ParquetFile(parquet_path)
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    metadata = parquet_file.metadata
+
+    group_starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    group_of_row = np.searchsorted(group_starts, row_ids, side="right") - 1
+    # Row ids are sorted, so each group's rows form one contiguous slice
+    groups, first = np.unique(group_of_row, return_index=True)
+    bounds = np.append(first, len(row_ids))
+
+    for group, start, stop in zip(groups, bounds[:-1], bounds[1:]):
+        table = parquet_file.read_row_group(int(group), columns=columns)
+        yield table.take(pa.array(row_ids[start:stop] - group_starts[group]))
+
+
+def read_rows(parquet_path: Path, row_ids, columns=None):
+    """ Reads the given (sorted) row ids into a DataFrame, decoding only the row groups that contain them. """
+    tables = list(iter_rows(parquet_path, row_ids, columns))
+    if not tables:
+        schema = pq.ParquetFile(parquet_path).schema_arrow
+        return schema.empty_table().select(columns or schema.names).to_pandas()
+    return pa.concat_tables(tables).to_pandas()
@@ -0,0 +1,135 @@
+#  ./services/run_cache.py
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from src.executor.runners import read_config
+
+PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
+# Empty disables memoization
+RUN_CACHE_DIR = os.environ.get("RUN_CACHE_DIR", str(PROJECT_ROOT / ".cache" / "runs"))
+
+# Where a run writes, not what it computes; left out of the key
+OUTPUT_KEYS = {"output_file", "json_out_config", "output_model_file"}
+MODEL_KEYS = ("model_file", "input_model_file", "agent_file", "prior_file")
+
+_digests = {}
+
+
+def file_digest(path) -> str:
+    """ sha256 of a file's content, remembered per (path, mtime, size) so models are hashed once. """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(stamp)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = _digests[stamp] = sha.hexdigest()
+    return digest
+
+
+def _strip_outputs(value):
+    if isinstance(value, dict):
+        return {key: _strip_outputs(item) for key, item in value.items() if key not in OUTPUT_KEYS}
+    return value
+
+
+def run_key(config_path, **extra):
+    """
+    Content address of a run: the resolved config minus its output paths, plus the sha256
+    of every model file it reads and any `extra` settings that change the artifacts.
+    Returns None when the config has no seed, since unseeded sampling isn't repeatable.
+    """
+    config = read_config(config_path)
+    parameters = config.get("parameters", {})
+    if config.get("seed", parameters.get("seed")) is None:
+        return None
+
+    models = {}
+    for name in MODEL_KEYS:
+        model_file = parameters.get(name)
+        if model_file:
+            models[name] = file_digest(model_file) if os.path.exists(model_file) else None
+    if None in models.values():
+        return None
+
+    document = {"config": _strip_outputs(config), "models": models, "extra": extra}
+    return hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _link(source: Path, target: Path):
+    """ Hard link, or a symlink when source and target are on different filesystems. """
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(os.path.realpath(source), target)
+
+
+def _link_tree(source: Path, target: Path):
+    if source.is_dir():
+        target.mkdir(parents=True, exist_ok=True)
+        for child in source.iterdir():
+            _link_tree(child, target / child.name)
+    else:
+        _link(source, target)
+
+
+class RunCache:
+    """
+    Content-addressed store of finished runs. Each entry is a directory of hard links to a
+    run's artifacts, so storing and restoring a run costs a few link() calls, not copies.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def lookup(self, key: str):
+        """ The cached entry directory for key, or None. """
+        if not key:
+            return None
+        entry = self.root / key[:2] / key
+        return entry if (entry / "manifest.json").exists() else None
+
+    def store(self, key: str, run_path: Path, artifacts, **meta):
+        """ Links the named artifacts of a finished run into the cache under key; `meta` goes in the manifest. """
+        if not key or self.lookup(key):
+            return
+        entry = self.root / key[:2] / key
+        tmp_entry = entry.with_name(f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp_entry.mkdir(parents=True)
+        stored = []
+        try:
+            for name in artifacts:
+                source = Path(run_path) / name
+                if source.exists():
+                    _link_tree(source, tmp_entry / name)
+                    stored.append(name)
+            # manifest.json is written last; its presence marks a complete entry
+            with open(tmp_entry / "manifest.json", "w") as f:
+                json.dump({"key": key, "source": str(run_path), "artifacts": stored, **meta}, f)
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def restore(self, entry: Path, run_path: Path):
+        """ Links a cached entry's artifacts into run_path; returns the manifest. """
+        with open(entry / "manifest.json") as f:
+            manifest = json.load(f)
+        run_path = Path(run_path)
+        run_path.mkdir(parents=True, exist_ok=True)
+        for name in manifest["artifacts"]:
+            _link_tree(entry / name, run_path / name)
+        return manifest
+
+
+def get_run_cache(root=RUN_CACHE_DIR):
+    """ The run cache rooted at `root`, or None when memoization is disabled. """
+    return RunCache(root) if root else None
@@ -0,0 +1,31 @@
+#  ./services/search_pool.py
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Shared by the API-side searches; started on first use and kept for later requests
+_lock = threading.Lock()
+_pool = None
+_pool_workers = 0
+
+
+def get(workers: int):
+    """ The process pool, grown to at least `workers` processes. """
+    global _pool, _pool_workers
+    with _lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Spawned, not forked: the API process has threads and open connections
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def reset():
+    """ Drops a broken pool; the next get() starts a new one. """
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
@@ -0,0 +1,126 @@
+#  ./services/similarity.py
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import numpy as np
+from src.services import fingerprint_index, fingerprints, results_store, search_pool
+
+# Rows scored per step; bounds the temporaries to a few tens of MB at 2048 bits
+SCAN_BLOCK = int(os.environ.get("SIMILARITY_SCAN_BLOCK", "65536"))
+# Default scan processes; 1 scans in the calling thread
+WORKERS = int(os.environ.get("SIMILARITY_WORKERS", "1"))
+# Smaller indexes are always scanned in-process; the pool round trip costs more than it saves
+MIN_PARALLEL_ROWS = int(os.environ.get("SIMILARITY_MIN_PARALLEL_ROWS", "500000"))
+MAX_K = 1000
+
+
+def _merge_top_k(scores, rows, k: int):
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[keep], rows[keep]
+    return scores, rows
+
+
+def _scan(data, counts, ranges, query, query_count: int, k: int, min_similarity: float):
+    """ Tanimoto top-k of the query over the given row ranges, unordered: (scores, rows). """
+    best_scores, best_rows = np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+    for start, stop in ranges:
+        for block_start in range(start, stop, SCAN_BLOCK):
+            block_stop = min(block_start + SCAN_BLOCK, stop)
+            common = np.bitwise_count(data[block_start:block_stop] & query).sum(axis=1, dtype=np.int32)
+            union = counts[block_start:block_stop].astype(np.int32) + query_count - common
+            scores = (common / np.maximum(union, 1)).astype(np.float32)
+            rows = np.arange(block_start, block_stop, dtype=np.int64)
+            if min_similarity > 0:
+                keep = scores >= min_similarity
+                scores, rows = scores[keep], rows[keep]
+            best_scores, best_rows = _merge_top_k(
+                np.concatenate([best_scores, scores]), np.concatenate([best_rows, rows]), k,
+            )
+    return best_scores, best_rows
+
+
+def _scan_files(data_path: str, counts_path: str, rows: int, words: int, ranges, query, query_count, k, min_similarity):
+    """ _scan in a pool process, which maps the index files itself instead of receiving them. """
+    data = np.memmap(data_path, dtype="<u8", mode="r", shape=(rows, words))
+    counts = np.memmap(counts_path, dtype="<u2", mode="r", shape=(rows,))
+    return _scan(data, counts, ranges, query, query_count, k, min_similarity)
+
+
+def _partition(ranges, parts: int):
+    """ Splits row ranges into at most `parts` lists covering about the same number of rows. """
+    total = sum(stop - start for start, stop in ranges)
+    share = -(-total // parts)
+    partitions, current, size = [], [], 0
+    for start, stop in ranges:
+        while start < stop:
+            take = min(stop - start, share - size)
+            current.append((start, start + take))
+            size += take
+            start += take
+            if size == share:
+                partitions.append(current)
+                current, size = [], 0
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+def scan(view, query, k: int, min_similarity: float = 0.0, workers: int = None):
+    """ Top-k (row, score) pairs of an index view, best first. """
+    ranges = view.live_ranges()
+    query = np.ascontiguousarray(query, dtype="<u8")
+    query_count = int(np.bitwise_count(query).sum())
+    workers = max(1, workers or WORKERS)
+    if workers > 1 and view.live_rows >= MIN_PARALLEL_ROWS:
+        partitions = _partition(ranges, workers)
+        try:
+            pool = search_pool.get(workers)
+            futures = [
+                pool.submit(_scan_files, str(view.path / view.manifest["data"]), str(view.path / view.manifest["counts"]),
+                            view.rows, view.words, part, query, query_count, k, min_similarity)
+                for part in partitions
+            ]
+            parts = [future.result() for future in futures]
+            scores, rows = _merge_top_k(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]), k)
+        except (OSError, BrokenProcessPool) as e:
+            print(f"[WARN] Similarity pool unavailable, scanning in-process: {e}")
+            search_pool.reset()
+            scores, rows = _scan(view.data, view.counts, ranges, query, query_count, k, min_similarity)
+    else:
+        scores, rows = _scan(view.data, view.counts, ranges, query, query_count, k, min_similarity)
+    # Best first; ties by index row so results are stable
+    order = np.lexsort((rows, -scores))
+    return rows[order], scores[order]
+
+
+def search(project_path: Path, smiles: str, k: int = 50, min_similarity: float = 0.0, workers: int = None,
+           kind: str = "morgan"):
+    """
+    The k molecules of a project's runs most similar to `smiles` (Tanimoto on Morgan bits),
+    with their stored result columns. Raises ValueError for invalid SMILES.
+    """
+    started = time.perf_counter()
+    query = fingerprints.query_fingerprint(smiles, kind)
+    view = fingerprint_index.load_view(project_path, kind)
+    rows, scores = scan(view, query, min(k, MAX_K), min_similarity, workers)
+
+    # Full rows are read only for the hits, one run at a time
+    results = [None] * len(rows)
+    by_run = {}
+    for rank, ((run_id, row), score) in enumerate(zip(view.locate(rows), scores)):
+        by_run.setdefault(run_id, []).append((row, rank, float(score)))
+    for run_id, hits in by_run.items():
+        hits.sort()
+        df = results_store.read_rows(Path(project_path) / "runs" / run_id / results_store.RESULTS_PARQUET,
+                                     [row for row, _, _ in hits])
+        for record, (row, rank, score) in zip(df.to_dict(orient="records"), hits):
+            results[rank] = {"run_id": run_id, "row": row, "similarity": round(score, 4), **record}
+    return {
+        "query": smiles,
+        "count": len(results),
+        "searched": view.live_rows,
+        "seconds": round(time.perf_counter() - started, 4),
+        "results": results,
+    }
@@ -0,0 +1,130 @@
+#  ./services/smiles_stream.py
+import hashlib
+import os
+import uuid
+from pathlib import Path
+import numpy as np
+from rdkit import Chem, rdBase
+
+HEADER_NAMES = {"smiles", "smi", "canonical_smiles"}
+
+
+def smiles_digest(smiles: str) -> int:
+    """ 64-bit content hash of a (canonical) SMILES string. """
+    return int.from_bytes(hashlib.blake2b(smiles.encode(), digest_size=8).digest(), "little")
+
+
+class DigestSet:
+    """
+    Compact set of 64-bit digests: a sorted uint64 array plus a small Python set of
+    recent inserts that is merged in once it grows. About 8 bytes per member.
+    """
+
+    def __init__(self, merge_threshold: int = 1 << 18):
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._recent = set()
+        self._merge_threshold = merge_threshold
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def _in_sorted(self, digests):
+        if not len(self._sorted):
+            return np.zeros(len(digests), dtype=bool)
+        positions = np.searchsorted(self._sorted, digests)
+        positions[positions == len(self._sorted)] = 0
+        return self._sorted[positions] == digests
+
+    def add_many(self, digests):
+        """ Inserts the digests and returns a mask of the ones that were not seen before. """
+        digests = np.asarray(digests, dtype=np.uint64)
+        new = ~self._in_sorted(digests)
+        for i in np.flatnonzero(new):
+            digest = int(digests[i])
+            if digest in self._recent:
+                new[i] = False
+            else:
+                self._recent.add(digest)
+
+        if len(self._recent) >= self._merge_threshold:
+            merged = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))
+            self._sorted = np.union1d(self._sorted, merged)
+            self._recent = set()
+        return new
+
+
+def canonicalize(smiles: str):
+    """ Canonical SMILES, or None if RDKit cannot parse it. """
+    mol = Chem.MolFromSmiles(smiles)
+    return Chem.MolToSmiles(mol) if mol is not None else None
+
+
+class SmilesStreamWriter:
+    """
+    Incrementally cleans a SMILES upload: bytes are fed in arbitrary chunks, complete lines
+    are validated, canonicalized and de-duplicated, and the survivors are written straight
+    to disk. Memory stays bounded by the chunk size plus the digest set.
+    """
+
+    def __init__(self, output_path: Path):
+        self.output_path = Path(output_path)
+        self._tmp_path = self.output_path.with_name(f".{self.output_path.name}.{uuid.uuid4().hex}.tmp")
+        self._out = open(self._tmp_path, "w")
+        self._out.write("SMILES\n")
+        self._pending = b""
+        self._first_line = True
+        self._seen = DigestSet()
+        self.stats = {"bytes": 0, "rows": 0, "valid": 0, "invalid": 0, "duplicates": 0}
+
+    def feed(self, chunk: bytes):
+        self.stats["bytes"] += len(chunk)
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        self._process(lines)
+
+    def _process(self, lines):
+        candidates = []
+        for line in lines:
+            text = line.decode("utf-8", errors="replace").strip()
+            if not text:
+                continue
+            # First field of a CSV/SMI line; SMILES never contain commas or whitespace
+            smiles = text.replace("\t", ",").replace(" ", ",").split(",", 1)[0].strip('"')
+            if self._first_line:
+                self._first_line = False
+                if smiles.lower() in HEADER_NAMES:
+                    continue
+            candidates.append(smiles)
+
+        if not candidates:
+            return
+        self.stats["rows"] += len(candidates)
+
+        # Unparsable SMILES are counted, not logged
+        with rdBase.BlockLogs():
+            canonical = [canonicalize(smiles) for smiles in candidates]
+
+        valid = [smiles for smiles in canonical if smiles is not None]
+        self.stats["invalid"] += len(canonical) - len(valid)
+
+        new = self._seen.add_many([smiles_digest(smiles) for smiles in valid])
+        self.stats["duplicates"] += int(len(valid) - new.sum())
+
+        unique = [smiles for smiles, is_new in zip(valid, new) if is_new]
+        self.stats["valid"] += len(unique)
+        if unique:
+            self._out.write("\n".join(unique) + "\n")
+
+    def close(self):
+        """ Flushes the last partial line and atomically replaces the output file. """
+        if self._pending:
+            self._process([self._pending])
+            self._pending = b""
+        self._out.close()
+        os.replace(self._tmp_path, self.output_path)
+        return self.stats
+
+    def abort(self):
+        self._out.close()
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
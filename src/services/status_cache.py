@@ -0,0 +1,130 @@
+#  ./services/status_cache.py
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+import redis
+from celery import states
+from src.services import metrics, task_queue
+from src.services.job_status import STATUS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Seconds an in-flight status is served from cache; finished tasks never expire
+INFLIGHT_TTL = float(os.environ.get("STATUS_CACHE_TTL", "2"))
+MAX_ENTRIES = int(os.environ.get("STATUS_CACHE_MAX_ENTRIES", "100000"))
+RECONNECT_DELAY = 5
+
+
+class StatusCache:
+    """
+    Per-process LRU of task status payloads. Entries for finished tasks (Celery ready
+    states) are kept until evicted; everything else expires after INFLIGHT_TTL, or
+    sooner when a task-status event for that id arrives from the workers.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, inflight_ttl: float = INFLIGHT_TTL):
+        self.max_entries = max_entries
+        self.inflight_ttl = inflight_ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def get(self, task_id: str):
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[task_id]
+            return None
+        self._entries.move_to_end(task_id)
+        return payload
+
+    def put(self, task_id: str, payload: dict):
+        terminal = payload.get("celery_status") in states.READY_STATES
+        expires_at = None if terminal else time.monotonic() + self.inflight_ttl
+        self._entries[task_id] = (expires_at, payload)
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, task_id: str):
+        if self._entries.pop(task_id, None) is not None:
+            self.invalidations += 1
+
+    def record(self, hit: bool, seconds: float):
+        metrics.cache_lookup("task_status", hit)
+        if hit:
+            self.hits += 1
+            self.hit_seconds += seconds
+        else:
+            self.misses += 1
+            self.miss_seconds += seconds
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "avg_hit_ms": 1000 * self.hit_seconds / self.hits if self.hits else 0.0,
+            "avg_miss_ms": 1000 * self.miss_seconds / self.misses if self.misses else 0.0,
+            "listening": _listener is not None and not _listener.done(),
+        }
+
+
+cache = StatusCache()
+_listener = None
+
+
+async def _listen():
+    """ Drops cache entries as workers announce state changes; reconnects if Redis goes away. """
+    while True:
+        pubsub = task_queue.get_redis().pubsub()
+        try:
+            await pubsub.subscribe(STATUS_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    cache.invalidate(json.loads(message["data"])["task_id"])
+                except (ValueError, KeyError):
+                    continue
+        except (redis.RedisError, OSError) as e:
+            logger.warning(f"Task status listener disconnected: {e}")
+        finally:
+            await pubsub.aclose()
+        await asyncio.sleep(RECONNECT_DELAY)
+
+
+def ensure_listener():
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(_listen())
+
+
+async def get_status(task_id: str, loader):
+    """
+    Cached status payload for task_id. On a miss `loader(task_id)` is awaited; it returns
+    {"job_status", "celery_status", "result"} or None for unknown tasks (not cached).
+    """
+    ensure_listener()
+    started = time.perf_counter()
+    payload = cache.get(task_id)
+    if payload is not None:
+        cache.record(True, time.perf_counter() - started)
+        return payload
+
+    payload = await loader(task_id)
+    if payload is not None:
+        cache.put(task_id, payload)
+    cache.record(False, time.perf_counter() - started)
+    return payload
@@ -0,0 +1,181 @@
+#  ./services/substructure.py
+import functools
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import numpy as np
+from rdkit import Chem, rdBase
+from src.services import fingerprint_index, fingerprints, metrics, results_store, search_pool
+from src.services.descriptor_service import MIN_PARALLEL_SMILES, cpu_budget
+
+# Rows screened per step
+SCREEN_BLOCK = int(os.environ.get("SUBSTRUCTURE_SCREEN_BLOCK", "65536"))
+# Candidates per SMARTS matching job
+MATCH_CHUNK = int(os.environ.get("SUBSTRUCTURE_MATCH_CHUNK", "2000"))
+# Matching processes; 0 uses every core this process may use
+WORKERS = int(os.environ.get("SUBSTRUCTURE_WORKERS", "0"))
+QUERY_CACHE_ENTRIES = int(os.environ.get("SUBSTRUCTURE_CACHE_ENTRIES", "128"))
+QUERY_CACHE_BYTES = int(os.environ.get("SUBSTRUCTURE_CACHE_MB", "64")) << 20
+
+_lock = threading.Lock()
+_query_cache = OrderedDict()
+_query_cache_bytes = 0
+
+
+def parse_query(smarts: str):
+    """ The query molecule for a SMARTS pattern; raises ValueError when it does not parse. """
+    query = Chem.MolFromSmarts(smarts) if smarts else None
+    if query is None or query.GetNumAtoms() == 0:
+        raise ValueError(f"Invalid SMARTS: {smarts}")
+    return query
+
+
+def screen(view, query_bits):
+    """ Live index rows whose pattern fingerprint has every bit of the query's, in index order. """
+    # Only the words the query sets can rule a row out
+    words = np.flatnonzero(query_bits)
+    query_words = query_bits[words]
+    candidates = []
+    for start, stop in view.live_ranges():
+        if not len(words):
+            candidates.append(np.arange(start, stop, dtype=np.int64))
+            continue
+        for block_start in range(start, stop, SCREEN_BLOCK):
+            block = view.data[block_start:min(block_start + SCREEN_BLOCK, stop)][:, words]
+            keep = ((block & query_words) == query_words).all(axis=1)
+            candidates.append(np.flatnonzero(keep) + block_start)
+    return np.concatenate(candidates) if candidates else np.zeros(0, dtype=np.int64)
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_ENTRIES)
+def _parsed_query(smarts: str):
+    """ parse_query, memoized per process (pool processes included) for the most recent patterns. """
+    return parse_query(smarts)
+
+
+def _match_chunk(smarts: str, smiles_chunk):
+    """ Which SMILES of a chunk contain the query; runs in the pool processes too. """
+    query = _parsed_query(smarts)
+    matched = np.zeros(len(smiles_chunk), dtype=bool)
+    # Unparsable rows are skipped without a log line each
+    with rdBase.BlockLogs():
+        for i, smiles in enumerate(smiles_chunk):
+            mol = Chem.MolFromSmiles(smiles) if smiles else None
+            matched[i] = mol is not None and mol.HasSubstructMatch(query)
+    return matched
+
+
+class Search:
+    """
+    One substructure query over a project's runs. The pattern-fingerprint screen runs up
+    front; the survivors are SMARTS-matched chunk by chunk, in parallel, while the search is
+    iterated, so the first rows can be sent before the whole project is matched. Iterating
+    yields (run_id, rows within the run's results.parquet). Complete match sets are cached
+    per query and index state, so repeated scaffolds skip both steps.
+    """
+
+    def __init__(self, project_path: Path, smarts: str, limit: int = None, workers: int = None):
+        query = parse_query(smarts)
+        self.project_path = Path(project_path)
+        # Canonical SMARTS, so spellings of one pattern share a cache entry
+        self.smarts = Chem.MolToSmarts(query)
+        self.limit = limit
+        self.workers = max(1, workers or WORKERS or cpu_budget())
+        self.view = fingerprint_index.load_view(project_path, "pattern")
+        self.searched = self.view.live_rows
+        self._key = (str(self.view.path), tuple(self.view.stamp or ()), self.smarts)
+
+        with _lock:
+            self.cached = _query_cache.get(self._key)
+            if self.cached is not None:
+                _query_cache.move_to_end(self._key)
+        metrics.cache_lookup("substructure", self.cached is not None)
+        self.candidates = None if self.cached is not None else screen(self.view, fingerprints.query_pattern(query))
+
+    def _chunks(self):
+        """ (run_id, index rows, parquet rows, SMILES) of the candidates, MATCH_CHUNK at a time. """
+        for run_id, index_rows, rows in self.view.split_by_run(self.candidates):
+            parquet_path = self.project_path / "runs" / run_id / results_store.RESULTS_PARQUET
+            position = 0
+            for table in results_store.iter_rows(parquet_path, rows, columns=["SMILES"]):
+                smiles = table.column("SMILES").to_pylist()
+                for start in range(0, len(smiles), MATCH_CHUNK):
+                    stop = min(start + MATCH_CHUNK, len(smiles))
+                    yield (run_id, index_rows[position + start:position + stop], rows[position + start:position + stop],
+                           smiles[start:stop])
+                position += len(smiles)
+
+    def _matched_chunks(self):
+        """ _chunks() reduced to their matches, in order, with a bounded number of chunks in flight. """
+        pool = None
+        if self.workers > 1 and len(self.candidates) >= MIN_PARALLEL_SMILES:
+            pool = search_pool.get(self.workers)
+        pending = deque()
+
+        def finish():
+            nonlocal pool
+            chunk, future = pending.popleft()
+            matched = None
+            if future is not None:
+                try:
+                    matched = future.result()
+                except (OSError, BrokenProcessPool) as e:
+                    print(f"[WARN] Substructure pool unavailable, matching in-process: {e}")
+                    search_pool.reset()
+                    pool = None
+            if matched is None:
+                matched = _match_chunk(self.smarts, chunk[3])
+            return chunk[0], chunk[1][matched], chunk[2][matched]
+
+        try:
+            for chunk in self._chunks():
+                future = None
+                if pool is not None:
+                    try:
+                        future = pool.submit(_match_chunk, self.smarts, chunk[3])
+                    except (RuntimeError, BrokenProcessPool):
+                        search_pool.reset()
+                        pool = None
+                pending.append((chunk, future))
+                while pending and (len(pending) >= 2 * self.workers or pending[0][1] is None):
+                    yield finish()
+            while pending:
+                yield finish()
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def __iter__(self):
+        global _query_cache_bytes
+
+        if self.cached is not None:
+            rows = self.cached if self.limit is None else self.cached[:self.limit]
+            for run_id, _, run_rows in self.view.split_by_run(rows):
+                yield run_id, run_rows
+            return
+
+        matched = []
+        remaining = self.limit
+        for run_id, index_rows, rows in self._matched_chunks():
+            if remaining is not None:
+                index_rows, rows = index_rows[:remaining], rows[:remaining]
+                remaining -= len(rows)
+            matched.append(index_rows)
+            if len(rows):
+                yield run_id, rows
+            if remaining == 0:
+                # Cut short, so not a complete answer to cache
+                return
+
+        matched = np.concatenate(matched) if matched else np.zeros(0, dtype=np.int64)
+        matched.setflags(write=False)
+        with _lock:
+            if self._key not in _query_cache:
+                _query_cache[self._key] = matched
+                _query_cache_bytes += matched.nbytes
+            while _query_cache and (len(_query_cache) > QUERY_CACHE_ENTRIES or _query_cache_bytes > QUERY_CACHE_BYTES):
+                _, evicted = _query_cache.popitem(last=False)
+                _query_cache_bytes -= evicted.nbytes
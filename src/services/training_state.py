@@ -0,0 +1,107 @@
+#  ./services/training_state.py
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+from src.services.run_cache import file_digest
+
+STATE_FILE = "training.json"
+CHECKPOINT_DIR = "checkpoints"
+LOCK_FILE = ".training.lock"
+# Only the newest checkpoints are kept; a resume needs just the last one
+KEEP_CHECKPOINTS = int(os.environ.get("TL_KEEP_CHECKPOINTS", "3"))
+
+# REINVENT names checkpoints after the output model with the epoch before ".chkpt"
+_CHECKPOINT_EPOCH = re.compile(r"(\d+)\.chkpt$")
+
+
+@contextlib.contextmanager
+def locked(model_path: Path):
+    """ Holds the project's training lock, shared by every worker on the node, until the block exits. """
+    model_path = Path(model_path)
+    model_path.mkdir(parents=True, exist_ok=True)
+    with open(model_path / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def load_state(model_path: Path):
+    """ The project's training manifest, or {} before the first training run. """
+    try:
+        with open(Path(model_path) / STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(model_path: Path, state: dict):
+    target = Path(model_path) / STATE_FILE
+    tmp_path = target.with_name(f".{STATE_FILE}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, target)
+
+
+def dataset_fingerprint(path: Path):
+    return {"sha256": file_digest(path), "bytes": os.path.getsize(path)}
+
+
+def appended_rows(path: Path, previous: dict):
+    """
+    The bytes added to `path` since it had the `previous` fingerprint, or None when the
+    file was changed in any other way than appending (or not changed at all).
+    """
+    if not previous or os.path.getsize(path) <= previous["bytes"]:
+        return None
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = previous["bytes"]
+        while remaining:
+            block = f.read(min(remaining, 1 << 20))
+            if not block:
+                return None
+            sha.update(block)
+            remaining -= len(block)
+        if sha.hexdigest() != previous["sha256"]:
+            return None
+        return f.read()
+
+
+def checkpoints(model_path: Path):
+    """ [(epoch, path)] of the project's kept checkpoints, oldest first. """
+    checkpoint_path = Path(model_path) / CHECKPOINT_DIR
+    found = []
+    for path in checkpoint_path.glob("epoch_*.chkpt"):
+        match = _CHECKPOINT_EPOCH.search(path.name)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def collect_checkpoints(attempt_path: Path, model_path: Path, offset: int):
+    """
+    Moves the checkpoints REINVENT wrote into attempt_path to models/checkpoints, numbered
+    from the epoch the attempt started at, and prunes old ones. Returns the last epoch saved.
+    """
+    checkpoint_path = Path(model_path) / CHECKPOINT_DIR
+    checkpoint_path.mkdir(parents=True, exist_ok=True)
+    last = offset
+    for path in Path(attempt_path).glob("*.chkpt"):
+        match = _CHECKPOINT_EPOCH.search(path.name)
+        if not match:
+            continue
+        epoch = offset + int(match.group(1))
+        os.replace(path, checkpoint_path / f"epoch_{epoch:04d}.chkpt")
+        last = max(last, epoch)
+    for _, path in checkpoints(model_path)[:-KEEP_CHECKPOINTS or None]:
+        path.unlink()
+    return last
+
+
+def clear_checkpoints(model_path: Path):
+    shutil.rmtree(Path(model_path) / CHECKPOINT_DIR, ignore_errors=True)
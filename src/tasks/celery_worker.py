@@ -1,4 +1,5 @@
 from celery import Celery
+import src.tasks.events  # noqa: F401  (publishes task state changes for the API's status cache)
 
 celery_app = Celery(
     "reinvent_backend",
@@ -6,9 +7,13 @@ celery_app = Celery(
     backend="redis://redis:6379/0"
 )
 
+# Long REINVENT jobs: take one task at a time so a busy process doesn't hold queued work
+celery_app.conf.update(worker_prefetch_multiplier=1)
+
 celery_app.autodiscover_tasks([
     "src.tasks.molecule_task",
     "src.tasks.transfer_learning",
     "src.tasks.reinforcement_learning",
-    "src.tasks.generation"
+    "src.tasks.generation",
+    "src.tasks.sharding"
 ])
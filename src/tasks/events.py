@@ -0,0 +1,112 @@
+#  ./tasks/events.py
+import os
+import time
+from datetime import datetime
+from celery import signals, states
+from src.services import metrics, profiling
+from src.services.job_status import publish_status, writer
+
+# Result dicts some tasks return instead of raising
+FAILED_RESULTS = {"failed", "error"}
+
+_started = {}
+_profiles = {}
+
+
+@signals.before_task_publish.connect
+def _on_publish(headers=None, **kwargs):
+    # Read back by the worker for the queue-wait metric
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+def _queue_wait(request):
+    """ Seconds the task waited for a worker, not counting a retry countdown or ETA. """
+    published_at = request.get("published_at")
+    if not published_at:
+        return None
+    eta = request.eta
+    if eta:
+        try:
+            eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+            published_at = max(published_at, eta.timestamp())
+        except (TypeError, ValueError):
+            pass
+    return time.time() - published_at
+
+
+@signals.task_prerun.connect
+def _on_prerun(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.monotonic()
+    if task is not None:
+        mode = profiling.requested_mode(task.request.get(profiling.TASK_HEADER), "deterministic")
+        if mode:
+            _profiles[task_id] = profiling.Capture("task", task.name, mode, profile_id=task_id).start()
+        metrics.set_job_type(task.name.rsplit(".", 1)[-1])
+        wait = _queue_wait(task.request)
+        if wait is not None:
+            metrics.observe_queue_wait(wait)
+    writer.record(task_id, status="running", started_at=datetime.utcnow())
+    publish_status(task_id, states.STARTED)
+
+
+@signals.task_postrun.connect
+def _on_postrun(task_id=None, retval=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    metrics.set_job_type("none")
+    capture = _profiles.pop(task_id, None)
+    if capture is not None:
+        capture.finish(state=state)
+    failed = writer.pop_failed(task_id)
+    if state not in (states.SUCCESS, states.FAILURE):
+        # Replaced (sharded) and retried tasks finish under a later run of the same id
+        return
+
+    if isinstance(retval, dict) and retval.get("status") in FAILED_RESULTS:
+        failed = True
+    fields = {"status": "failed" if failed or state == states.FAILURE else "completed", "finished_at": datetime.utcnow()}
+    if started is not None:
+        fields["duration_seconds"] = time.monotonic() - started
+    if state == states.FAILURE and isinstance(retval, BaseException):
+        fields["error"] = str(retval)[-2000:]
+    writer.record(task_id, **fields)
+
+
+# Sent after the result is stored, so a listener that refetches sees the final state
+@signals.task_success.connect
+def _on_success(sender=None, **kwargs):
+    publish_status(sender.request.id, states.SUCCESS)
+
+
+@signals.task_failure.connect
+def _on_failure(task_id=None, **kwargs):
+    publish_status(task_id, states.FAILURE)
+
+
+@signals.task_retry.connect
+def _on_retry(request=None, **kwargs):
+    publish_status(getattr(request, "id", None), states.RETRY)
+
+
+@signals.task_revoked.connect
+def _on_revoked(request=None, **kwargs):
+    task_id = getattr(request, "id", None)
+    writer.record(task_id, status="revoked", finished_at=datetime.utcnow())
+    publish_status(task_id, states.REVOKED)
+
+
+@signals.worker_process_shutdown.connect
+def _on_shutdown(pid=None, **kwargs):
+    writer.flush()
+    metrics.mark_process_dead(pid or os.getpid())
+
+
+# Only the `celery worker` command sends this, in the main process before the pool starts
+@signals.celeryd_init.connect
+def _on_worker_init(**kwargs):
+    if not metrics.WORKER_METRICS_PORT:
+        return
+    try:
+        metrics.start_exporter(int(metrics.WORKER_METRICS_PORT))
+    except OSError as e:
+        print(f"[WARN] Metrics exporter not started: {e}")
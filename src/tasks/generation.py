@@ -1,13 +1,18 @@
 from celery import Celery
-import subprocess
+import json
 import os
 from pathlib import Path
 import uuid
 import pandas as pd
-from rdkit import Chem
-from rdkit.Chem import Descriptors, QED
-from src.db.connection import SessionLocal
-from src.db.models import Job
+from src.executor.budget import job_budget
+from src.executor.coalesce import run_sampling
+from src.executor import progress
+from src.executor.runners import read_config
+from src.services.descriptor_service import compute_descriptors, get_descriptor_cache
+from src.services import embedding, fingerprint_index, fingerprints, metrics, results_index, results_store
+from src.services.run_cache import get_run_cache, run_key
+from src.services.job_status import writer as job_status
+from src.tasks.sharding import SHARD_SIZE, build_sharded_sampling
 
 # Setup Celery
 celery_app = Celery(
@@ -21,32 +26,17 @@ celery_app.conf.update(
 
 PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
 DEVICE = os.environ.get("DEVICE", "cpu")
-
-def compute_descriptors(smiles_list):
-    results = []
-    for smi in smiles_list:
-        mol = Chem.MolFromSmiles(smi)
-        if mol:
-            try:
-                results.append({
-                    "SMILES": smi,
-                    "QED": QED.qed(mol),
-                    "MolecularWeight": Descriptors.MolWt(mol),
-                    "SlogP": Descriptors.MolLogP(mol),
-                    "TPSA": Descriptors.TPSA(mol),
-                    "NumRotatableBonds": Descriptors.NumRotatableBonds(mol),
-                    "NumHDonors": Descriptors.NumHDonors(mol),
-                    "NumHAcceptors": Descriptors.NumHAcceptors(mol)
-                })
-            except:
-                continue
-    return pd.DataFrame(results)
+# What a sampling run leaves behind, and what a memoized run links back in
+SAMPLING_ARTIFACTS = (
+    "raw_results.csv", results_store.RESULTS_CSV, results_store.RESULTS_PARQUET, results_index.INDEX_DIR,
+    *fingerprints.RUN_FILES.values(),
+)
 
 @celery_app.task(name="src.tasks.generation.run_sampling_from_agent", bind=True)
-def run_sampling_from_agent(self,project_id: str):
+def run_sampling_from_agent(self,project_id: str, num_smiles: int = 128, run_id: str = None, seed: int = None, force: bool = False):
     print(f"[TASK STARTED] Generating molecules for project {project_id}")
 
-    run_id = f"run_{uuid.uuid4().hex}"
+    run_id = run_id or f"run_{uuid.uuid4().hex}"
     run_path = PROJECT_ROOT / project_id / "runs" / run_id
     run_path.mkdir(parents=True, exist_ok=True)
 
@@ -55,65 +45,92 @@ def run_sampling_from_agent(self,project_id: str):
     json_output = run_path / "sampling.json"
     config_path = run_path / "config.toml"
     log_path = run_path / "sample.log"
+    seed_line = f"seed = {int(seed)}" if seed is not None else ""
 
     toml_content = f"""
 run_type = "sampling"
 device = "{DEVICE}"
 json_out_config = "{json_output}"
+{seed_line}
 
 [parameters]
 model_file = "{model_file}"
 output_file = "{raw_output}"
-num_smiles = 128
+num_smiles = {num_smiles}
 unique_molecules = true
 randomize_smiles = true
 """
 
     try:
-        with open(config_path, "w") as f:
+        with metrics.stage("toml_write"), open(config_path, "w") as f:
             f.write(toml_content)
         print(f"[INFO] TOML config written at: {config_path}")
     except Exception as e:
         print(f"[ERROR] Failed to write TOML: {e}")
         return
 
-    # Log job to database
-    try:
-        db = SessionLocal()
-        task_id = self.request.id  # ✅ correct way
-
-        job = Job(task_id=task_id, project_id=project_id, run_id=run_id, job_type="generate")
-        db.add(job)
-        db.commit()
-        db.close()
-    except Exception as e:
-        print(f"[ERROR] Failed to log job to DB: {e}")
-
-    try:
-        result = subprocess.run([
-            "reinvent",
-            "-l", str(log_path),
-            str(config_path)
-        ], capture_output=True, text=True)
-
-        print("[STDOUT]", result.stdout)
-        print("[STDERR]", result.stderr)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"REINVENT failed: {result.stderr}")
-
-    except Exception as e:
-        print(f"[ERROR] REINVENT generation failed: {e}")
+    # A seeded config always samples the same molecules; reuse an identical earlier run
+    run_cache = get_run_cache()
+    cache_key = run_key(config_path) if run_cache else None
+    entry = run_cache.lookup(cache_key) if cache_key and not force else None
+    if cache_key and not force:
+        metrics.cache_lookup("run", entry is not None)
+    if entry:
+        with progress.job_progress(self.request.id, "cached"):
+            manifest = run_cache.restore(entry, run_path)
+            with open(json_output, "w") as f:
+                json.dump({**read_config(config_path), "cached_from": manifest["source"]}, f, indent=2)
+            fingerprint_index.index_finished_run(run_path)
+            embedding.embed_finished_run(run_path)
+        job_status.record(self.request.id, molecule_count=manifest.get("molecule_count"))
+        print(f"[INFO] Reused sampling run {manifest['source']} for {run_path}")
         return
 
-    try:
-        df = pd.read_csv(raw_output)
-        df = compute_descriptors(df["SMILES"].tolist())
-        scored_output = run_path / "results.csv"
-        df.to_csv(scored_output, index=False)
-        print(f"[INFO] Scored results saved to: {scored_output}")
-    except Exception as e:
-        error_log = run_path / "error.log"
-        with open(error_log, "w") as err:
-            err.write(str(e))
-        print(f"[ERROR] Failed to compute descriptors: {e}")
+    # Large requests fan out across the generation workers and merge back into this run
+    if num_smiles > SHARD_SIZE:
+        cache = {"key": cache_key, "artifacts": SAMPLING_ARTIFACTS} if cache_key else None
+        raise self.replace(build_sharded_sampling(read_config(config_path), run_path, queue="generation", descriptors=True, cache=cache))
+
+    # Sampling takes the queue's budget only while REINVENT runs; descriptor scoring takes it again
+    with progress.job_progress(self.request.id, "sampling"):
+        try:
+            result = run_sampling(config_path, log_path, queue="generation")
+
+            print("[STDOUT]", result.stdout)
+            print("[STDERR]", result.stderr)
+
+            if result.returncode != 0:
+                raise RuntimeError(f"REINVENT failed: {result.stderr}")
+
+        except Exception as e:
+            print(f"[ERROR] REINVENT generation failed: {e}")
+            job_status.fail(self.request.id, e)
+            return
+
+        try:
+            with job_budget("generation"):
+                with metrics.stage("csv_read"):
+                    df = pd.read_csv(raw_output)
+                progress.set_stage("descriptors", sampled=len(df))
+                with metrics.stage("descriptors"):
+                    df = compute_descriptors(df["SMILES"].tolist())
+                with metrics.stage("results_write"):
+                    scored_output = results_store.write_results(run_path, df)
+                    job_status.record(self.request.id, molecule_count=len(df))
+                    results_index.build_index(scored_output)
+                progress.set_stage("fingerprints")
+                fingerprint_index.index_finished_run(run_path)
+                embedding.embed_finished_run(run_path)
+                if cache_key:
+                    run_cache.store(cache_key, run_path, SAMPLING_ARTIFACTS, molecule_count=len(df))
+                print(f"[INFO] Scored results saved to: {scored_output}")
+                cache = get_descriptor_cache()
+                if cache:
+                    print(f"[INFO] Descriptor cache: {cache.hits} hits / {cache.misses} misses in this worker")
+        except Exception as e:
+            error_log = run_path / "error.log"
+            with open(error_log, "w") as err:
+                err.write(str(e))
+            progress.fail(e)
+            job_status.fail(self.request.id, e)
+            print(f"[ERROR] Failed to compute descriptors: {e}")
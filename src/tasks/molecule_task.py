@@ -1,8 +1,16 @@
 #  ./tasks/molecule_task.py
+import json
 import os
-import subprocess
 import uuid
 from celery import Celery
+from src.executor import run_reinvent_container
+from src.executor.coalesce import run_sampling
+from src.executor.progress import job_progress
+from src.executor.runners import read_config
+from src.services import metrics
+from src.services.job_status import writer as job_status
+from src.services.run_cache import get_run_cache, run_key
+from src.tasks.sharding import SHARD_SIZE, build_sharded_sampling
 
 celery_app = Celery(
     "molecule_task",
@@ -10,12 +18,16 @@ celery_app = Celery(
     backend="redis://redis:6379/0"
 )
 
+TASKS_DIR = os.environ.get("REINVENT_TASKS_DIR", "/app/reinvent/tasks")
+# What a design run leaves behind, and what a memoized run links back in
+DESIGN_ARTIFACTS = ("results.csv",)
+
 celery_app.conf.update(
     task_routes={"src.tasks.molecule_task.run_molecule_design": {"queue": "molecule"}}
 )
 
-@celery_app.task(name="src.tasks.molecule_task.run_molecule_design")
-def run_molecule_design(task_data: dict):
+@celery_app.task(name="src.tasks.molecule_task.run_molecule_design", bind=True)
+def run_molecule_design(self, task_data: dict):
     """Runs the molecule design pipeline using REINVENT inside a managed folder"""
 
     task_id = task_data.get("task_id", f"task_{uuid.uuid4().hex}")
@@ -24,11 +36,14 @@ def run_molecule_design(task_data: dict):
     num_smiles = task_data.get("num_smiles", 157)
     unique_molecules = task_data.get("unique_molecules", True)
     randomize_smiles = task_data.get("randomize_smiles", True)
+    seed = task_data.get("seed")
+    force = task_data.get("force", False)
+    seed_line = f"seed = {int(seed)}" if seed is not None else ""
 
     print(f"[DEBUG] Task ID: {task_id}")
 
     # Define task-specific folder
-    task_folder = f"/app/reinvent/tasks/{task_id}"
+    task_folder = f"{TASKS_DIR}/{task_id}"
     os.makedirs(task_folder, exist_ok=True)
 
     # Define paths inside the task-specific folder
@@ -44,6 +59,7 @@ def run_molecule_design(task_data: dict):
 run_type = "sampling"
 device = "{device}"
 json_out_config = "{json_out_path}"  # ✅ Ensures _sampling.json is inside task folder
+{seed_line}
 
 [parameters]
 model_file = "{model_file}"
@@ -56,7 +72,7 @@ randomize_smiles = {str(randomize_smiles).lower()}
 
     # Ensure directories exist and write the TOML file
     try:
-        with open(reinvent_config_path, "w") as f:
+        with metrics.stage("toml_write"), open(reinvent_config_path, "w") as f:
             f.write(toml_content)
         os.chmod(reinvent_config_path, 0o777)  # Set permissions for accessibility
 
@@ -64,47 +80,53 @@ randomize_smiles = {str(randomize_smiles).lower()}
     except Exception as e:
         print(f"[ERROR] Failed to write TOML file: {e}")
         return {"task_id": task_id, "status": "error", "error": str(e)}
-    try:
-        result11 = subprocess.run(
-            ["docker", "ps", "--filter", "name=centella-reinvent-backend-reinvent", "--format", "{{.Names}}"],
-            capture_output=True,
-            text=True
-        )
-        reinvent_container = result11.stdout.strip()
-
-        if not reinvent_container:
-            print("[ERROR] REINVENT container is not running.")
-            return {"task_id": task_id, "status": "error", "error": "REINVENT container not running"}
 
-        print(f"[DEBUG] Using REINVENT container: {reinvent_container}")
-
-    except Exception as e:
-        print(f"[ERROR] Failed to find REINVENT container: {e}")
-        return {"task_id": task_id, "status": "error", "error": "Failed to get REINVENT container"}
+    completed = {
+        "task_id": task_id,
+        "status": "completed",
+        "output_file": result_path,
+        "json_output": json_out_path,  # ✅ Returning JSON output path
+    }
+
+    # A seeded config always samples the same molecules; reuse an identical earlier run
+    run_cache = get_run_cache()
+    cache_key = run_key(reinvent_config_path) if run_cache else None
+    entry = run_cache.lookup(cache_key) if cache_key and not force else None
+    if cache_key and not force:
+        metrics.cache_lookup("run", entry is not None)
+    if entry:
+        with job_progress(task_id, "cached"):
+            manifest = run_cache.restore(entry, task_folder)
+            with open(json_out_path, "w") as f:
+                json.dump({**read_config(reinvent_config_path), "cached_from": manifest["source"]}, f, indent=2)
+        job_status.record(self.request.id, molecule_count=manifest.get("molecule_count"))
+        print(f"[DEBUG] Reused molecule design run {manifest['source']}")
+        return completed
+
+    # Large requests fan out across the molecule workers and merge back into this folder
+    if num_smiles > SHARD_SIZE:
+        raise self.replace(build_sharded_sampling(
+            read_config(reinvent_config_path), task_folder, queue="molecule",
+            descriptors=False, runner="container", result=completed,
+            cache={"key": cache_key, "artifacts": DESIGN_ARTIFACTS} if cache_key else None,
+        ))
 
-    # Run REINVENT inside the running container
     try:
-        print("[DEBUG] Running REINVENT inside a new Docker container...")
-        result = subprocess.run(
-            [
-                "docker", "exec", reinvent_container,
-                "reinvent", "-l", log_path, reinvent_config_path
-            ],
-            capture_output=True,
-            text=True
-        )
+        # Compatible requests arriving together share one sampling pass
+        with job_progress(task_id, "sampling"):
+            result = run_sampling(reinvent_config_path, log_path, runner=run_reinvent_container, queue="molecule")
 
         print("[DEBUG] REINVENT Execution Completed.")
 
         # Check if REINVENT ran successfully
         if result.returncode == 0:
             print(f"[DEBUG] Results file created at: {result_path}")
-            return {
-                "task_id": task_id,
-                "status": "completed",
-                "output_file": result_path,
-                "json_output": json_out_path,  # ✅ Returning JSON output path
-            }
+            with metrics.stage("csv_read"), open(result_path) as f:
+                molecule_count = max(0, sum(1 for _ in f) - 1)
+            job_status.record(self.request.id, molecule_count=molecule_count)
+            if cache_key:
+                run_cache.store(cache_key, task_folder, DESIGN_ARTIFACTS, molecule_count=molecule_count)
+            return completed
         else:
             print(f"[ERROR] REINVENT Failed: {result.stderr}")
             return {"task_id": task_id, "status": "failed", "error": result.stderr}
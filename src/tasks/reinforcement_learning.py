@@ -1,10 +1,11 @@
 from celery import Celery
-import subprocess
 import os
 from pathlib import Path
 import uuid
-from src.db.connection import SessionLocal
-from src.db.models import Job
+from src.executor import run_reinvent
+from src.executor.budget import job_budget
+from src.executor.progress import job_progress
+from src.services import metrics
 
 # Setup Celery
 celery_app = Celery(
@@ -19,10 +20,10 @@ celery_app.conf.update(
 PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
 
 @celery_app.task(name="src.tasks.reinforcement_learning.run_reinforcement_learning_task", bind=True)
-def run_reinforcement_learning_task(self, project_id: str):
+def run_reinforcement_learning_task(self, project_id: str, run_id: str = None):
     print(f"[TASK STARTED] Reinforcing project {project_id}")
 
-    run_id = f"run_{uuid.uuid4().hex}"
+    run_id = run_id or f"run_{uuid.uuid4().hex}"
     run_path = PROJECT_ROOT / project_id / "runs" / run_id
     run_path.mkdir(parents=True, exist_ok=True)
 
@@ -47,30 +48,16 @@ randomize_smiles = true
 """
 
     try:
-        with open(config_path, "w") as f:
+        with metrics.stage("toml_write"), open(config_path, "w") as f:
             f.write(toml_content)
         print(f"[INFO] TOML config written at: {config_path}")
     except Exception as e:
         print(f"[ERROR] Failed to write TOML: {e}")
         return
 
-    # Log job to database
     try:
-        db = SessionLocal()
-        task_id = self.request.id  # ✅ correct way
-        job = Job(task_id=task_id, project_id=project_id, run_id=run_id, job_type="reinforce")
-        db.add(job)
-        db.commit()
-        db.close()
-    except Exception as e:
-        print(f"[ERROR] Failed to log job to DB: {e}")
-
-    try:
-        result = subprocess.run([
-            "reinvent",
-            "-l", str(log_path),
-            str(config_path)
-        ], capture_output=True, text=True)
+        with job_budget("rl"), job_progress(self.request.id, "reinforcement"):
+            result = run_reinvent(config_path, log_path)
 
         print("[STDOUT]", result.stdout)
         print("[STDERR]", result.stderr)
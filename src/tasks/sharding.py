@@ -0,0 +1,188 @@
+from celery import Celery, chord
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.executor import run_reinvent, run_reinvent_container
+from src.executor.budget import job_budget
+from src.executor.progress import job_progress
+from src.executor.coalesce import write_sampling_config
+from src.services import embedding, fingerprint_index, metrics, results_index, results_store
+from src.services.job_status import writer as job_status
+from src.services.run_cache import get_run_cache
+from src.services.descriptor_service import DESCRIPTOR_COLUMNS, compute_descriptor_columns
+from src.services.smiles_stream import DigestSet, canonicalize, smiles_digest
+
+# Setup Celery
+celery_app = Celery(
+    "sharding",
+    broker="redis://redis:6379/0",
+    backend="redis://redis:6379/0"
+)
+
+# Requests above this many SMILES are split into shards of this size
+SHARD_SIZE = int(os.environ.get("SAMPLING_SHARD_SIZE", "50000"))
+
+RUNNERS = {
+    "local": run_reinvent,
+    "container": run_reinvent_container,
+}
+
+
+def plan_shards(num_smiles: int, shard_size: int = SHARD_SIZE):
+    """ Splits num_smiles into near-equal shard sizes no larger than shard_size. """
+    count = max(1, -(-num_smiles // shard_size))
+    base, extra = divmod(num_smiles, count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def shard_progress(run_path: Path):
+    """ Per-shard status of a sharded run, or an empty list once it has been merged. """
+    shards_path = Path(run_path) / "shards"
+    progress = []
+    for status_file in sorted(shards_path.glob("shard_*/status.json")):
+        with open(status_file) as f:
+            progress.append(json.load(f))
+    return progress
+
+
+def _write_status(shard_path: Path, **status):
+    tmp_path = shard_path / "status.json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, shard_path / "status.json")
+
+
+def build_sharded_sampling(config: dict, run_path: Path, queue: str, descriptors: bool, runner: str = "local", result=None, cache=None):
+    """
+    Returns a chord that samples config's num_smiles as parallel shards on `queue`
+    and merges them into run_path so it looks like a single sampling run.
+    `result` is returned by the merge as the overall task result; `cache`
+    ({"key", "artifacts"}) stores the merged run in the run cache.
+    """
+    counts = plan_shards(int(config["parameters"]["num_smiles"]))
+    shards = []
+    for index, count in enumerate(counts):
+        spec = {"index": index, "count": count, "config": config, "run_path": str(run_path),
+                "descriptors": descriptors, "runner": runner, "queue": queue}
+        shards.append(run_sampling_shard.s(spec).set(queue=queue))
+        shard_path = Path(run_path) / "shards" / f"shard_{index:04d}"
+        shard_path.mkdir(parents=True, exist_ok=True)
+        _write_status(shard_path, index=index, status="queued", requested=count)
+
+    merge_spec = {"config": config, "run_path": str(run_path), "descriptors": descriptors, "result": result, "cache": cache}
+    print(f"[INFO] Sampling {sum(counts)} SMILES as {len(counts)} shards on queue {queue}")
+    return chord(shards, merge_sampling_shards.s(merge_spec).set(queue=queue))
+
+
+@celery_app.task(name="src.tasks.sharding.run_sampling_shard", bind=True)
+def run_sampling_shard(self, spec: dict):
+    index = spec["index"]
+    shard_path = Path(spec["run_path"]) / "shards" / f"shard_{index:04d}"
+    shard_path.mkdir(parents=True, exist_ok=True)
+    print(f"[TASK STARTED] Sampling shard {index} ({spec['count']} SMILES) for {spec['run_path']}")
+
+    config = dict(spec["config"])
+    config["json_out_config"] = str(shard_path / "sampling.json")
+    config["parameters"] = {
+        **config["parameters"],
+        "output_file": str(shard_path / "raw_results.csv"),
+        "num_smiles": spec["count"],
+    }
+    # Each shard needs its own stream, derived from the run's seed so the merge stays repeatable
+    if config.get("seed") is not None:
+        config["seed"] = int(config["seed"]) + index
+    config_path = shard_path / "config.toml"
+    with metrics.stage("toml_write"):
+        write_sampling_config(config_path, config)
+
+    _write_status(shard_path, index=index, status="running", requested=spec["count"])
+    if self.request.id:
+        self.update_state(state="PROGRESS", meta={"shard": index, "status": "running"})
+
+    with job_budget(spec.get("queue", "generation")), job_progress(self.request.id, f"shard {index}"):
+        result = RUNNERS[spec["runner"]](config_path, shard_path / "sample.log")
+        if result.returncode != 0:
+            _write_status(shard_path, index=index, status="failed", requested=spec["count"], error=result.stderr[-2000:])
+            raise RuntimeError(f"REINVENT failed for shard {index}: {result.stderr}")
+
+        with metrics.stage("csv_read"):
+            df = pd.read_csv(shard_path / "raw_results.csv")
+        smiles = df["SMILES"].astype(str).tolist()
+
+        # Canonical SMILES drive the global uniqueness pass at merge time
+        canonical = np.full(len(df), None, dtype=object)
+        if spec["descriptors"]:
+            with metrics.stage("descriptors"):
+                kept, columns, kept_canonical = compute_descriptor_columns(smiles, return_canonical=True)
+            canonical[kept] = kept_canonical
+            for name, dtype in DESCRIPTOR_COLUMNS.items():
+                values = np.full(len(df), np.nan)
+                values[kept] = columns[name]
+                df[name] = values
+        else:
+            canonical[:] = [canonicalize(smi) for smi in smiles]
+        df["_canonical"] = canonical
+
+    shard_output = shard_path / "shard.parquet"
+    df.to_parquet(shard_output, index=False)
+
+    _write_status(shard_path, index=index, status="completed", requested=spec["count"], sampled=len(df),
+                  valid=int(pd.notna(canonical).sum()))
+    return {"index": index, "path": str(shard_output), "rows": len(df)}
+
+
+@celery_app.task(name="src.tasks.sharding.merge_sampling_shards", bind=True)
+def merge_sampling_shards(self, shard_results, spec: dict):
+    """ Concatenates shards in order, de-duplicates across them and writes the normal run files. """
+    config = spec["config"]
+    parameters = config["parameters"]
+    run_path = Path(spec["run_path"])
+    unique = parameters.get("unique_molecules", True)
+    num_smiles = int(parameters["num_smiles"])
+    print(f"[TASK STARTED] Merging {len(shard_results)} shards into {run_path}")
+
+    seen = DigestSet()
+    frames = []
+    total = 0
+    for shard in sorted(shard_results, key=lambda item: item["index"]):
+        df = pd.read_parquet(shard["path"])
+        if unique:
+            valid = df["_canonical"].notna().to_numpy()
+            keep = np.ones(len(df), dtype=bool)
+            digests = [smiles_digest(smi) for smi in df.loc[valid, "_canonical"]]
+            keep[valid] = seen.add_many(digests)
+            df = df[keep]
+        df = df.iloc[:max(0, num_smiles - total)]
+        total += len(df)
+        frames.append(df)
+    merged = pd.concat(frames, ignore_index=True)
+
+    descriptor_names = [name for name in DESCRIPTOR_COLUMNS if name in merged.columns]
+    raw_columns = [name for name in merged.columns if name not in descriptor_names and name != "_canonical"]
+    merged[raw_columns].to_csv(parameters["output_file"], index=False)
+
+    if spec["descriptors"]:
+        scored = merged[merged["_canonical"].notna()][["SMILES", *descriptor_names]]
+        scored = scored.astype({name: dtype for name, dtype in DESCRIPTOR_COLUMNS.items() if name in scored})
+        with metrics.stage("results_write"):
+            scored_output = results_store.write_results(run_path, scored.reset_index(drop=True))
+            results_index.build_index(scored_output)
+        fingerprint_index.index_finished_run(run_path)
+        embedding.embed_finished_run(run_path)
+
+    if config.get("json_out_config"):
+        with open(config["json_out_config"], "w") as f:
+            json.dump(config, f, indent=2)
+
+    shutil.rmtree(run_path / "shards", ignore_errors=True)
+    cache = spec.get("cache")
+    run_cache = get_run_cache()
+    if cache and run_cache:
+        run_cache.store(cache["key"], run_path, cache["artifacts"], molecule_count=total)
+    # The merge runs under the id of the task that was replaced by the chord
+    job_status.record(self.request.id, molecule_count=total)
+    print(f"[INFO] Merged {total} SMILES from {len(shard_results)} shards into {run_path}")
+    return spec.get("result")
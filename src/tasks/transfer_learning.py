@@ -1,10 +1,13 @@
 from celery import Celery
-import subprocess
 import os
+import shutil
 from pathlib import Path
 import uuid
-from src.db.connection import SessionLocal
-from src.db.models import Job
+from src.executor import run_reinvent
+from src.executor.budget import job_budget
+from src.executor.progress import job_progress
+from src.services import data_prep, metrics, training_state
+from src.services.run_cache import file_digest
 
 # Setup Celery
 celery_app = Celery(
@@ -18,73 +21,148 @@ celery_app.conf.update(
 
 PROJECT_ROOT = Path(os.environ.get("PROJECT_DIR", "/app/projects"))
 DEVICE = os.environ.get("DEVICE", "cpu")  # <-- Dynamic device toggle
+PRIOR_MODEL = "reinvent/priors/reinvent.prior"
+# A crashed run is retried this many times, each resuming from its last checkpoint
+MAX_RETRIES = int(os.environ.get("TL_MAX_RETRIES", "2"))
+RETRY_DELAY = int(os.environ.get("TL_RETRY_DELAY", "30"))
 
 @celery_app.task(name="src.tasks.transfer_learning.run_transfer_learning_task",bind=True)
-def run_transfer_learning_task(self,project_id: str):
+def run_transfer_learning_task(self,project_id: str, num_epochs: int = 10, batch_size: int = 128, force: bool = False):
+    """
+    Trains models/agent.pt on input/train.csv. Skips when neither the dataset nor the
+    parameters changed, fine-tunes the existing agent on rows appended since its last run,
+    and resumes an interrupted run from its last epoch checkpoint. `force` retrains from the prior.
+    """
     print(f"[TASK STARTED] Training project {project_id}")
 
     project_path = PROJECT_ROOT / project_id
     input_path = project_path / "input"
     model_path = project_path / "models"
-    config_path = project_path / "config.toml"
-
-    model_in = "reinvent/priors/reinvent.prior"
-    model_out = model_path / "agent.pt"
-    train_file = input_path / "train.csv"
 
     # Ensure necessary directories exist
     input_path.mkdir(parents=True, exist_ok=True)
     model_path.mkdir(parents=True, exist_ok=True)
 
-    # Build TOML content
-    toml_content = f"""
+    # One training run per project at a time: choosing skip, resume or restart and clearing the
+    # scratch checkpoints must not race a duplicate request's run of the same project
+    with training_state.locked(model_path):
+        return _train(self, project_id, num_epochs, batch_size, force)
+
+
+def _train(self, project_id: str, num_epochs: int, batch_size: int, force: bool):
+    """ The body of run_transfer_learning_task, run under the project's training lock. """
+    project_path = PROJECT_ROOT / project_id
+    input_path = project_path / "input"
+    model_path = project_path / "models"
+    config_path = project_path / "config.toml"
+    attempt_path = model_path / training_state.CHECKPOINT_DIR / "current"
+
+    model_out = model_path / "agent.pt"
+    train_file = input_path / "train.csv"
+
+    params = {"num_epochs": num_epochs, "batch_size": batch_size, "device": DEVICE, "prep": data_prep.settings()}
+    dataset = training_state.dataset_fingerprint(train_file)
+    state = training_state.load_state(model_path)
+    same_run = not force and state.get("dataset") == dataset and state.get("params") == params
+
+    if same_run and state.get("status") == "completed" and model_out.exists():
+        print(f"[INFO] Dataset and parameters unchanged since the last training run, keeping {model_out}")
+        return {"project_id": project_id, "status": "skipped", "model": str(model_out)}
+
+    if same_run and state.get("status") == "running":
+        # Pick up where the interrupted run stopped
+        completed_epochs, checkpoint = (training_state.checkpoints(model_path) or [(0, None)])[-1]
+        base_model = str(checkpoint or state["base_model"])
+        smiles_file, validation_file = state["smiles_file"], state.get("validation_file")
+        print(f"[INFO] Resuming training at epoch {completed_epochs + 1}/{num_epochs} from {base_model}")
+    else:
+        training_state.clear_checkpoints(model_path)
+        completed_epochs = 0
+        base_model, raw_file = PRIOR_MODEL, train_file
+        appended = None
+        if not force and state.get("status") == "completed" and state.get("params") == params and model_out.exists():
+            appended = training_state.appended_rows(train_file, state.get("dataset"))
+        if appended:
+            # Warm start: fine-tune the current agent on the new rows only
+            with open(train_file) as f:
+                first_line = f.readline()
+            raw_file = input_path / "train.delta.csv"
+            with open(raw_file, "wb") as f:
+                if "smiles" in first_line.lower():
+                    f.write(first_line.encode())
+                f.write(appended)
+            base_model = str(model_out)
+            print(f"[INFO] Fine-tuning {model_out} on {len(appended)} appended bytes of {train_file}")
+
+        # Clean, de-duplicate and split before REINVENT sees the data, on the queue's cores
+        with job_budget("tl"), metrics.stage("data_prep"):
+            prepared = data_prep.prepare_dataset(raw_file, input_path / "prepared")
+        if not prepared["stats"]["train"]:
+            raise ValueError(f"No SMILES in {raw_file} passed data preparation: {prepared['stats']}")
+        smiles_file = prepared["files"]["train"]
+        validation_file = prepared["files"]["validation"] if prepared["stats"]["validation"] else None
+        training_state.save_state(model_path, {
+            "status": "running", "dataset": dataset, "params": params,
+            "base_model": base_model, "smiles_file": smiles_file, "validation_file": validation_file,
+        })
+
+    if completed_epochs < num_epochs:
+        # Checkpoints are written into a scratch folder, so agent.pt is only replaced by a finished model
+        shutil.rmtree(attempt_path, ignore_errors=True)
+        attempt_path.mkdir(parents=True)
+
+        # Build TOML content
+        validation_line = f'validation_smiles_file = "{validation_file}"' if validation_file else ""
+        toml_content = f"""
 run_type = "transfer_learning"
 device = "{DEVICE}"
 
 [parameters]
-input_model_file = "{model_in}"
-output_model_file = "{model_out}"
-smiles_file = "{train_file}"
-num_epochs = 10
-batch_size = 128
+input_model_file = "{base_model}"
+output_model_file = "{attempt_path / "agent.pt"}"
+smiles_file = "{smiles_file}"
+{validation_line}
+num_epochs = {num_epochs - completed_epochs}
+batch_size = {batch_size}
+save_every_n_epochs = 1
 """
 
-    try:
-        with open(config_path, "w") as f:
-            f.write(toml_content)
-        print(f"[INFO] TOML config written at: {config_path}")
-    except Exception as e:
-        print(f"[ERROR] Failed to write TOML: {e}")
-        return
-
-    # Log job to database
-    try:
-        db = SessionLocal()
-        task_id = self.request.id  # ✅ correct way
-
-        job = Job(task_id=task_id, project_id=project_id, run_id="N/A", job_type="train", status="queued")
-        db.add(job)
-        db.commit()
-        db.close()
-        print(f"[INFO] Job logged to DB with task_id: {task_id}")
-
-    except Exception as e:
-        print(f"[ERROR] Failed to log job to DB: {e}")
-
-    # Run REINVENT
-    try:
-        result = subprocess.run([
-            "reinvent",
-            "-l", str(project_path / "train.log"),
-            str(config_path)
-        ], capture_output=True, text=True)
-
-        print("[STDOUT]", result.stdout)
-        print("[STDERR]", result.stderr)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"REINVENT failed: {result.stderr}")
-
-    except Exception as e:
-        print(f"[ERROR] REINVENT training failed: {e}")
-        raise
+        try:
+            with metrics.stage("toml_write"), open(config_path, "w") as f:
+                f.write(toml_content)
+            print(f"[INFO] TOML config written at: {config_path}")
+        except Exception as e:
+            print(f"[ERROR] Failed to write TOML: {e}")
+            return
+
+        # Run REINVENT
+        try:
+            with job_budget("tl"), job_progress(self.request.id, "training"):
+                result = run_reinvent(config_path, project_path / "train.log")
+
+            print("[STDOUT]", result.stdout)
+            print("[STDERR]", result.stderr)
+
+            if result.returncode != 0:
+                raise RuntimeError(f"REINVENT failed: {result.stderr}")
+
+        except Exception as e:
+            saved = training_state.collect_checkpoints(attempt_path, model_path, completed_epochs)
+            print(f"[ERROR] REINVENT training failed after epoch {saved}/{num_epochs}: {e}")
+            if self.request.id and self.request.retries < MAX_RETRIES:
+                raise self.retry(exc=e, countdown=RETRY_DELAY, max_retries=MAX_RETRIES)
+            raise
+
+        training_state.collect_checkpoints(attempt_path, model_path, completed_epochs)
+        os.replace(attempt_path / "agent.pt", model_out)
+    else:
+        # Every epoch finished before the interruption; the last checkpoint is the model
+        shutil.copyfile(base_model, model_out)
+
+    training_state.clear_checkpoints(model_path)
+    training_state.save_state(model_path, {
+        "status": "completed", "dataset": dataset, "params": params,
+        "agent_sha256": file_digest(model_out),
+    })
+    print(f"[INFO] Trained model saved to: {model_out}")
+    return {"project_id": project_id, "status": "completed", "model": str(model_out)}
@@ -0,0 +1,35 @@
+#  ./tests/conftest.py
+import os
+import tempfile
+from pathlib import Path
+import pytest
+
+# Services read their paths from the environment at import, so point them at a scratch dir first
+_SCRATCH = Path(tempfile.mkdtemp(prefix="reinvent-tests-"))
+os.environ.setdefault("PROJECT_DIR", str(_SCRATCH / "projects"))
+os.environ.setdefault("DESCRIPTOR_CACHE_PATH", str(_SCRATCH / "descriptors.sqlite"))
+os.environ.setdefault("RUN_CACHE_DIR", str(_SCRATCH / "run_cache"))
+os.environ.setdefault("CPU_SLOTS_DIR", str(_SCRATCH / "cpu_slots"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_SCRATCH / 'jobs.sqlite'}")
+# Keep RDKit work in-process; pools are exercised by test_process_pool
+os.environ.setdefault("DESCRIPTOR_WORKERS", "1")
+
+from tests import datasets  # noqa: E402
+
+
+@pytest.fixture
+def project_path(tmp_path):
+    """ An empty project folder. """
+    path = tmp_path / "project"
+    (path / "runs").mkdir(parents=True)
+    return path
+
+
+@pytest.fixture
+def add_run(project_path):
+    """ Writes a finished run of `rows` synthetic results; returns its folder. """
+    def add(run_id: str, rows: int, seed: int = 0):
+        run_path = project_path / "runs" / run_id
+        datasets.write_results_run(run_path, rows, seed)
+        return run_path
+    return add
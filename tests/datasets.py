@@ -0,0 +1,55 @@
+#  ./tests/datasets.py
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.services import results_index, results_store
+
+# Chain links bond on both ends and caps on one, so every generated SMILES parses
+LINKS = ["C", "CC", "CCO", "c1ccccc1", "C(=O)N", "N", "OC", "c1ccncc1", "C1CCCCC1", "C(C)", "S", "c1ccc2ccccc2c1"]
+CAPS = ["F", "Cl", "O", "N", "C(=O)O", "C#N", "C(F)(F)F"]
+
+
+def synthetic_smiles(rows: int, seed: int = 0):
+    """ `rows` valid, drug-like-sized SMILES; deterministic for a given seed, with some repeats. """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(2, 9, size=rows)
+    links = rng.integers(0, len(LINKS), size=int(lengths.sum()))
+    caps = rng.integers(0, len(CAPS), size=rows)
+    smiles = []
+    position = 0
+    for row in range(rows):
+        chain = "".join(LINKS[i] for i in links[position:position + lengths[row]])
+        position += lengths[row]
+        smiles.append(chain + CAPS[caps[row]])
+    return smiles
+
+
+def write_smiles_file(path: Path, rows: int, seed: int = 0, header: bool = True):
+    with open(path, "w") as f:
+        if header:
+            f.write("SMILES\n")
+        f.write("\n".join(synthetic_smiles(rows, seed)) + "\n")
+    return path
+
+
+def synthetic_results(rows: int, seed: int = 0):
+    """ A scored results frame with plausible descriptor distributions, without running RDKit. """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "SMILES": synthetic_smiles(rows, seed),
+        "QED": rng.beta(4, 3, rows),
+        "MolecularWeight": rng.normal(380, 90, rows).clip(60, 1200),
+        "SlogP": rng.normal(2.8, 1.6, rows),
+        "TPSA": rng.gamma(4, 20, rows),
+        "NumRotatableBonds": rng.poisson(5, rows).astype(np.int32),
+        "NumHDonors": rng.poisson(1.5, rows).astype(np.int32),
+        "NumHAcceptors": rng.poisson(4, rows).astype(np.int32),
+    })
+
+
+def write_results_run(run_path: Path, rows: int, seed: int = 0):
+    """ A run folder as generation leaves it: results.csv, results.parquet and the range index. """
+    run_path.mkdir(parents=True, exist_ok=True)
+    parquet_path = results_store.write_results(run_path, synthetic_results(rows, seed))
+    results_index.build_index(parquet_path)
+    return parquet_path
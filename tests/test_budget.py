@@ -0,0 +1,72 @@
+#  ./tests/test_budget.py
+import os
+import threading
+import time
+import pytest
+from src.executor import budget
+
+
+@pytest.fixture(autouse=True)
+def slots_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget, "SLOTS_DIR", tmp_path / "slots")
+    monkeypatch.setattr(budget, "POLL_INTERVAL", 0.01)
+    return tmp_path / "slots"
+
+
+def test_parse_budgets_overrides_defaults():
+    budgets = budget._parse_budgets("tl=8:1, generation=2:4,custom=3", cpus=4)
+    # Threads never exceed the node
+    assert budgets["tl"] == (4, 1)
+    assert budgets["generation"] == (2, 4)
+    assert budgets["custom"] == (3, 1)
+    assert budgets["molecule"] == budget._default_budgets(4)["molecule"]
+
+
+def test_job_budget_pins_and_releases():
+    assert budget.current_budget() is None
+    with budget.job_budget("generation") as held:
+        assert budget.current_budget() is held
+        assert held.cpus and set(held.cpus) <= set(budget.NODE_CPUS)
+        assert os.sched_getaffinity(0) == set(held.cpus)
+        assert held.environ({})["OMP_NUM_THREADS"] == str(held.threads)
+        assert budget.budget_status()["busy_cpus"] == held.cpus
+        # A nested job reuses what the outer one holds
+        with budget.job_budget("molecule") as nested:
+            assert nested is held
+    assert budget.current_budget() is None
+    assert budget.budget_status()["busy_cpus"] == []
+    assert os.sched_getaffinity(0) == set(budget.NODE_CPUS)
+
+
+def test_queue_slots_limit_concurrent_jobs(monkeypatch):
+    monkeypatch.setitem(budget.QUEUE_BUDGETS, "tl", (1, 1))
+    first_running, second_running, release = threading.Event(), threading.Event(), threading.Event()
+
+    def job(running):
+        with budget.job_budget("tl"):
+            running.set()
+            release.wait(5)
+
+    first = threading.Thread(target=job, args=(first_running,))
+    first.start()
+    assert first_running.wait(5)
+    assert budget.budget_status()["queues"]["tl"]["running"] == 1
+    second = threading.Thread(target=job, args=(second_running,))
+    second.start()
+    # The queue allows one tl job, so the second waits for the first to finish
+    assert not second_running.wait(0.3)
+    release.set()
+    assert second_running.wait(5)
+    first.join(5)
+    second.join(5)
+    assert budget.budget_status()["queues"]["tl"]["running"] == 0
+
+
+def test_partial_cores_after_the_wait(monkeypatch):
+    monkeypatch.setattr(budget, "NODE_CPUS", budget.NODE_CPUS[:1])
+    monkeypatch.setitem(budget.QUEUE_BUDGETS, "generation", (4, 1))
+    monkeypatch.setattr(budget, "BUDGET_WAIT", 0.05)
+    started = time.monotonic()
+    with budget.job_budget("generation") as held:
+        assert held.threads == 1
+    assert time.monotonic() - started >= 0.05
@@ -0,0 +1,172 @@
+#  ./tests/test_coalesce.py
+import json
+import subprocess
+import threading
+import time
+import pandas as pd
+import pytest
+import redis
+from src.executor import coalesce
+from src.executor.runners import StubRunner
+
+fakeredis = pytest.importorskip("fakeredis")
+
+CONFIG = """
+run_type = "sampling"
+device = "cpu"
+{seed}
+json_out_config = "{folder}/sampling.json"
+
+[parameters]
+model_file = "{model}"
+output_file = "{folder}/results.csv"
+num_smiles = {num_smiles}
+unique_molecules = false
+"""
+
+
+class CountingRunner:
+    """ Runs the stub runner and records the configs it was given. """
+
+    def __init__(self):
+        self.configs = []
+        self._lock = threading.Lock()
+
+    def __call__(self, config_path, log_path):
+        with self._lock:
+            self.configs.append(str(config_path))
+        returncode = StubRunner().run(config_path, log_path)
+        return subprocess.CompletedProcess(["reinvent", str(config_path)], returncode, "", "")
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(coalesce, "_redis", client)
+    return client
+
+
+@pytest.fixture
+def write_config(tmp_path):
+    model = tmp_path / "agent.pt"
+    model.write_bytes(b"weights")
+
+    def write(name, num_smiles=20, seed=None, model_path=model):
+        folder = tmp_path / name
+        folder.mkdir()
+        path = folder / "config.toml"
+        seed_line = f"seed = {seed}" if seed is not None else ""
+        path.write_text(CONFIG.format(seed=seed_line, folder=folder, model=model_path, num_smiles=num_smiles))
+        return path
+    return write
+
+
+def _run_together(configs, runner):
+    results = {}
+
+    def run(config_path):
+        results[config_path] = coalesce.run_sampling(config_path, config_path.parent / "reinvent.log", runner=runner)
+
+    threads = [threading.Thread(target=run, args=(config_path,)) for config_path in configs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return results
+
+
+def test_concurrent_requests_share_one_pass(write_config):
+    configs = [write_config(f"run_{i}", num_smiles=10 * (i + 1)) for i in range(3)]
+    runner = CountingRunner()
+    results = _run_together(configs, runner)
+
+    assert len(runner.configs) == 1 and "coalesced_" in runner.configs[0]
+    assert all(result.returncode == 0 for result in results.values())
+    parts = [pd.read_csv(config.parent / "results.csv") for config in configs]
+    assert [len(part) for part in parts] == [10, 20, 30]
+    for config in configs:
+        assert "coalesced run of 3 requests" in (config.parent / "reinvent.log").read_text()
+    # The combined folder goes once the molecules are split out
+    assert not list(configs[0].parent.parent.glob("*/coalesced_*"))
+
+
+def test_different_models_are_not_batched(write_config, tmp_path):
+    other = tmp_path / "other.pt"
+    other.write_bytes(b"other weights")
+    configs = [write_config("run_a"), write_config("run_b", model_path=other)]
+    runner = CountingRunner()
+    _run_together(configs, runner)
+    assert sorted(runner.configs) == sorted(str(config) for config in configs)
+
+
+def test_seeded_requests_run_alone(write_config, fake_redis):
+    runner = CountingRunner()
+    config = write_config("run_a", seed=3)
+    assert coalesce.run_sampling(config, config.parent / "reinvent.log", runner=runner).returncode == 0
+    assert runner.configs == [str(config)] and not fake_redis.keys()
+
+
+def test_failed_pass_reaches_every_request(write_config):
+    def failing(config_path, log_path):
+        raise RuntimeError("model exploded")
+
+    results = _run_together([write_config("run_a"), write_config("run_b")], failing)
+    assert [result.returncode for result in results.values()] == [1, 1]
+    assert all("model exploded" in result.stderr for result in results.values())
+
+
+def test_runs_alone_without_redis(write_config, monkeypatch):
+    class Unavailable:
+        def rpush(self, *args):
+            raise redis.ConnectionError("no redis")
+
+    monkeypatch.setattr(coalesce, "_redis", Unavailable())
+    runner = CountingRunner()
+    config = write_config("run_a")
+    assert coalesce.run_sampling(config, config.parent / "reinvent.log", runner=runner).returncode == 0
+    assert runner.configs == [str(config)]
+
+
+def test_group_key_separates_runners_and_queues(write_config):
+    config = coalesce.read_config(write_config("run_a"))
+
+    def other_runner(config_path, log_path):
+        pass
+
+    key = coalesce._group_key(config, coalesce.run_reinvent, "generation")
+    assert key == coalesce._group_key(config, coalesce.run_reinvent, "generation")
+    assert key != coalesce._group_key(config, other_runner, "generation")
+    assert key != coalesce._group_key(config, coalesce.run_reinvent, "molecule")
+
+
+def test_slow_leader_keeps_its_followers(write_config, monkeypatch):
+    monkeypatch.setattr(coalesce, "CLAIM_TTL", 0.3)
+    runner = CountingRunner()
+
+    def slow(config_path, log_path):
+        time.sleep(1.5)
+        return runner(config_path, log_path)
+
+    results = _run_together([write_config("run_a"), write_config("run_b")], slow)
+    assert len(runner.configs) == 1 and [result.returncode for result in results.values()] == [0, 0]
+
+
+def test_follower_of_a_dead_leader_runs_alone(write_config, fake_redis, monkeypatch):
+    monkeypatch.setattr(coalesce, "CLAIM_TTL", 0.3)
+    runner = CountingRunner()
+    config = write_config("run_a")
+    group = coalesce._group_key(coalesce.read_config(config), runner)
+    # Another worker holds the window, then drains the request and dies without answering
+    fake_redis.set(f"coalesce:{group}:leader", "dead")
+    thread = threading.Thread(target=lambda: runner.configs.append(
+        coalesce.run_sampling(config, config.parent / "reinvent.log", runner=runner).returncode))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not fake_redis.llen(f"coalesce:{group}:pending") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    (item,) = fake_redis.lrange(f"coalesce:{group}:pending", 0, -1)
+    fake_redis.delete(f"coalesce:{group}:pending")
+    fake_redis.set(coalesce._claim_key(json.loads(item)["id"]), "dead", px=300)
+
+    thread.join(30)
+    assert runner.configs == [str(config), 0]
@@ -0,0 +1,86 @@
+#  ./tests/test_data_prep.py
+from pathlib import Path
+import pytest
+from rdkit import Chem
+from src.services import data_prep
+from tests import datasets
+
+RAW = [
+    "OCCCCC",                       # canonicalizes to CCCCCO
+    "CCCCCO",                       # duplicate of the above once canonical
+    "c1ccccc1CCN",
+    "not-a-smiles",
+    "C[Si](C)(C)CCCC",              # element outside the prior's vocabulary
+    "CC",                           # too few heavy atoms
+    "CCCC[N+](C)(C)CC[N+](C)(C)C",  # charge +2
+    "CCCCCC(=O)O.[Na+]",            # salt; the largest fragment is kept
+    "[13CH3]CCCCCN",                # isotope is removed
+]
+
+
+def _read(path):
+    with open(path) as f:
+        assert f.readline() == "SMILES\n"
+        return [line.strip() for line in f]
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / "input.smi"
+    path.write_text("SMILES\n" + "\n".join(RAW) + "\n")
+    return path
+
+
+def test_cleaning_filters_and_deduplicates(input_file, tmp_path):
+    manifest = data_prep.prepare_dataset(input_file, tmp_path / "prepared", validation_fraction=0, workers=1)
+    assert sorted(_read(manifest["files"]["train"])) == sorted(["CCCCCC(=O)O", "CCCCCCN", "CCCCCO", "NCCc1ccccc1"])
+    assert _read(manifest["files"]["validation"]) == []
+    assert sorted(path.name for path in Path(manifest["path"]).iterdir()) == [data_prep.MANIFEST, "train.smi", "validation.smi"]
+    stats = manifest["stats"]
+    assert stats["rows"] == len(RAW) and stats["duplicates"] == 1
+    assert (stats["invalid"], stats["elements"], stats["heavy_atoms"], stats["charge"]) == (1, 1, 1, 1)
+
+
+def test_unchanged_input_reuses_the_prepared_dataset(input_file, tmp_path):
+    first = data_prep.prepare_dataset(input_file, tmp_path / "prepared", workers=1)
+    again = data_prep.prepare_dataset(input_file, tmp_path / "prepared", workers=1)
+    assert again["key"] == first["key"] and again["path"] == first["path"]
+    other = data_prep.prepare_dataset(input_file, tmp_path / "prepared", split_seed=1, workers=1)
+    assert other["key"] != first["key"]
+
+
+def test_split_is_stable_as_the_input_grows(tmp_path):
+    small = datasets.write_smiles_file(tmp_path / "small.smi", 300, seed=1)
+    large = tmp_path / "large.smi"
+    large.write_text(small.read_text() + "\n".join(datasets.synthetic_smiles(300, seed=2)) + "\n")
+
+    before = data_prep.prepare_dataset(small, tmp_path / "prepared", validation_fraction=0.3, workers=1)
+    after = data_prep.prepare_dataset(large, tmp_path / "prepared", validation_fraction=0.3, workers=1)
+    validation_before = set(_read(before["files"]["validation"]))
+    assert validation_before and validation_before <= set(_read(after["files"]["validation"]))
+    assert not set(_read(after["files"]["train"])) & set(_read(after["files"]["validation"]))
+
+
+def test_workers_and_chunks_do_not_change_the_output(tmp_path, monkeypatch):
+    input_file = datasets.write_smiles_file(tmp_path / "input.smi", 400, seed=3)
+    serial = data_prep.prepare_dataset(input_file, tmp_path / "serial", workers=1)
+    monkeypatch.setattr(data_prep, "CHUNK_ROWS", 37)
+    parallel = data_prep.prepare_dataset(input_file, tmp_path / "parallel", workers=2)
+    for split in data_prep.SPLITS:
+        assert _read(parallel["files"][split]) == _read(serial["files"][split])
+
+
+def test_old_datasets_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_prep, "KEEP_PREPARED", 2)
+    paths = []
+    for seed in range(3):
+        input_file = datasets.write_smiles_file(tmp_path / f"input_{seed}.smi", 20, seed=seed)
+        paths.append(Path(data_prep.prepare_dataset(input_file, tmp_path / "prepared", workers=1)["path"]))
+    assert [path.exists() for path in paths] == [False, True, True]
+
+
+def test_prepared_smiles_are_canonical(tmp_path):
+    input_file = datasets.write_smiles_file(tmp_path / "input.smi", 100, seed=4)
+    manifest = data_prep.prepare_dataset(input_file, tmp_path / "prepared", workers=1)
+    for smiles in _read(manifest["files"]["train"]):
+        assert Chem.MolToSmiles(Chem.MolFromSmiles(smiles)) == smiles
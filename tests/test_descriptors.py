@@ -0,0 +1,82 @@
+#  ./tests/test_descriptors.py
+import sqlite3
+import numpy as np
+import pytest
+from rdkit import Chem
+from rdkit.Chem import Descriptors, QED
+from tests import datasets
+from src.services import descriptor_service
+from src.services.descriptor_service import DESCRIPTOR_COLUMNS, compute_descriptors
+
+INVALID = ["C1CC", "not-a-smiles", "C(C"]
+
+
+def _reference(smiles):
+    """ The descriptors as RDKit computes them one molecule at a time. """
+    mol = Chem.MolFromSmiles(smiles)
+    return [QED.qed(mol), Descriptors.MolWt(mol), Descriptors.MolLogP(mol), Descriptors.TPSA(mol),
+            Descriptors.NumRotatableBonds(mol), Descriptors.NumHDonors(mol), Descriptors.NumHAcceptors(mol)]
+
+
+@pytest.fixture
+def smiles():
+    smiles = datasets.synthetic_smiles(300, seed=3)
+    # Invalid rows scattered through the input must drop out without shifting the rest
+    for position, bad in zip((0, 150, 299), INVALID):
+        smiles.insert(position, bad)
+    return smiles
+
+
+def test_matches_rdkit_per_molecule(smiles):
+    df = compute_descriptors(smiles, workers=1, chunk_size=64, use_cache=False)
+    valid = [smi for smi in smiles if smi not in INVALID]
+    assert df["SMILES"].tolist() == valid
+    assert list(df.columns) == ["SMILES", *DESCRIPTOR_COLUMNS]
+    expected = np.array([_reference(smi) for smi in valid])
+    np.testing.assert_allclose(df[list(DESCRIPTOR_COLUMNS)].to_numpy(dtype=float), expected, rtol=1e-9)
+
+
+def test_dtypes():
+    df = compute_descriptors(["CCO"], workers=1, use_cache=False)
+    for name, dtype in DESCRIPTOR_COLUMNS.items():
+        assert df[name].dtype == dtype
+
+
+def test_chunking_and_workers_do_not_change_results(smiles):
+    single = compute_descriptors(smiles, workers=1, chunk_size=len(smiles), use_cache=False)
+    chunked = compute_descriptors(smiles, workers=2, chunk_size=37, use_cache=False)
+    assert single.equals(chunked)
+
+
+def test_cached_values_match_computed(smiles):
+    cache = descriptor_service.get_descriptor_cache()
+    fresh = compute_descriptors(smiles, workers=1, use_cache=False)
+    compute_descriptors(smiles, workers=1)
+    hits = cache.hits
+    cached = compute_descriptors(smiles, workers=1)
+    assert cache.hits - hits == len(fresh)
+    np.testing.assert_allclose(cached[list(DESCRIPTOR_COLUMNS)].to_numpy(dtype=float),
+                               fresh[list(DESCRIPTOR_COLUMNS)].to_numpy(dtype=float), rtol=1e-12)
+
+
+def test_empty_input():
+    df = compute_descriptors([], use_cache=False)
+    assert df.empty and list(df.columns) == ["SMILES", *DESCRIPTOR_COLUMNS]
+
+
+def test_failing_cache_is_a_miss(smiles, monkeypatch):
+    cache = descriptor_service.get_descriptor_cache()
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    for name in ("get_many", "put_many", "touch", "record"):
+        monkeypatch.setattr(cache, name, locked)
+    fresh = compute_descriptors(smiles, workers=1, use_cache=False)
+    assert compute_descriptors(smiles, workers=1).equals(fresh)
+
+
+def test_corrupt_cache_file_is_skipped(tmp_path):
+    path = tmp_path / "descriptors.sqlite"
+    path.write_bytes(b"not a database" * 100)
+    assert descriptor_service.get_descriptor_cache(str(path)) is None
@@ -0,0 +1,80 @@
+#  ./tests/test_embedding.py
+import numpy as np
+import pytest
+from src.services import embedding, fingerprints, results_store
+
+
+def test_features_fold_bits_with_or():
+    packed = np.zeros((1, 2048 // 64), dtype=np.uint64)
+    packed[0, 0] = 1
+    # Word 8 folds onto word 0 at 512 bits; bit 65 sits in word 1
+    packed[0, 8] = 2
+    packed[0, 1] = 2
+    folded = embedding.features(packed)
+    assert folded.shape == (1, embedding.FOLD_BITS) and folded.dtype == np.float32
+    assert np.flatnonzero(folded[0]).tolist() == [0, 1, 65]
+
+
+def test_fit_matches_numpy_pca(project_path, add_run):
+    add_run("run_a", 150, seed=1)
+    add_run("run_b", 100, seed=2)
+    model = embedding.fit(project_path)
+    assert model.meta["runs"] == ["run_a", "run_b"] and model.meta["fitted_rows"] == 250
+
+    data = embedding.features(np.concatenate([
+        fingerprints.load_run_fingerprints(project_path / "runs" / run_id) for run_id in ("run_a", "run_b")
+    ])).astype(np.float64)
+    centered = data - data.mean(axis=0)
+    _, _, vectors = np.linalg.svd(centered, full_matrices=False)
+    for component, expected in zip(model.components, vectors[:2]):
+        assert abs(float(np.dot(component, expected))) == pytest.approx(1, abs=1e-3)
+
+
+def test_model_is_cached_until_refitted(project_path, add_run):
+    add_run("run_a", 60)
+    assert embedding.load_model(project_path) is None
+    first = embedding.fit(project_path)
+    assert embedding.load_model(project_path) is first
+    second = embedding.fit(project_path)
+    assert embedding.load_model(project_path) is second and second.model_id != first.model_id
+
+
+def test_run_coordinates_are_cached_per_model(project_path, add_run):
+    run_path = add_run("run_a", 80)
+    model = embedding.fit(project_path)
+    coordinates = embedding.run_coordinates(run_path, model)
+    assert coordinates.shape == (80, 2)
+    stamp = (run_path / embedding.RUN_FILE).stat().st_mtime_ns
+    np.testing.assert_array_equal(embedding.run_coordinates(run_path, model), coordinates)
+    assert (run_path / embedding.RUN_FILE).stat().st_mtime_ns == stamp
+
+
+def test_new_runs_are_projected_without_refitting(project_path, add_run):
+    add_run("run_a", 60, seed=1)
+    model = embedding.fit(project_path)
+    run_b = add_run("run_b", 40, seed=2)
+    embedding.embed_finished_run(run_b)
+    assert (run_b / embedding.RUN_FILE).exists()
+    assert embedding.load_model(project_path).model_id == model.model_id
+
+
+def test_points_sample_each_run(project_path, add_run):
+    add_run("run_a", 300, seed=1)
+    add_run("run_b", 100, seed=2)
+    result = embedding.points(project_path, max_points=100)
+    assert result["total"] == 400 and result["count"] == 100
+    by_run = {run_id: [p for p in result["points"] if p["run_id"] == run_id] for run_id in ("run_a", "run_b")}
+    assert len(by_run["run_a"]) > len(by_run["run_b"]) > 0
+
+    smiles = results_store.read_rows(project_path / "runs" / "run_b" / results_store.RESULTS_PARQUET,
+                                     [p["row"] for p in by_run["run_b"]], columns=["SMILES"])["SMILES"]
+    assert [p["SMILES"] for p in by_run["run_b"]] == list(smiles)
+
+    only_b = embedding.points(project_path, run_id="run_b")
+    assert only_b["total"] == only_b["count"] == 100
+    with pytest.raises(LookupError):
+        embedding.points(project_path, run_id="run_c")
+
+
+def test_empty_project_has_no_points(project_path):
+    assert embedding.points(project_path) == {"model": None, "total": 0, "count": 0, "points": []}
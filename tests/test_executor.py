@@ -0,0 +1,114 @@
+#  ./tests/test_executor.py
+import threading
+import time
+import pytest
+from src.executor import client, server
+from src.executor.runners import ModelCache, StubRunner
+from src.executor.server import WarmExecutor, serve
+
+CONFIG = """
+run_type = "sampling"
+seed = 7
+json_out_config = "{folder}/sampling.json"
+
+[parameters]
+model_file = "{model}"
+output_file = "{folder}/results.csv"
+num_smiles = 50
+"""
+
+
+@pytest.fixture
+def job(tmp_path):
+    """ A sampling job for the stub runner, as the client sends it. """
+    model = tmp_path / "agent.pt"
+    model.write_bytes(b"weights")
+    config = tmp_path / "config.toml"
+    config.write_text(CONFIG.format(folder=tmp_path, model=model))
+    return {"config": str(config), "log": str(tmp_path / "reinvent.log")}
+
+
+@pytest.fixture
+def executor():
+    executor = WarmExecutor(workers=1, runner="stub", cache_bytes=1 << 20)
+    yield executor
+    executor.shutdown()
+
+
+def test_stub_sampling_is_deterministic(job, tmp_path):
+    runner = StubRunner()
+    assert runner.run(job["config"], job["log"]) == 0
+    first = (tmp_path / "results.csv").read_text()
+    assert runner.run(job["config"], job["log"]) == 0
+    assert (tmp_path / "results.csv").read_text() == first
+    rows = first.splitlines()
+    assert rows[0] == "SMILES,NLL" and len(rows) > 1
+    assert (tmp_path / "sampling.json").exists()
+
+
+def test_model_cache_evicts_by_size(tmp_path):
+    paths = []
+    for name in ("a", "b", "c"):
+        paths.append(tmp_path / f"{name}.pt")
+        paths[-1].write_bytes(b"x" * 10)
+    cache = ModelCache(max_bytes=20)
+    for path in paths:
+        cache.get(path, lambda: path.name)
+    assert cache.paths() == [str(p) for p in paths[1:]]
+    assert cache.get(paths[2], lambda: "reloaded") == "c.pt" and cache.hits == 1
+
+
+def test_warm_worker_keeps_the_model(executor, job, tmp_path):
+    first = executor.submit(job)
+    assert first["returncode"] == 0 and first["cache_misses"] == 1
+    assert first["models"] == [str(tmp_path / "agent.pt")]
+    assert "SMILES sampled" in first["stdout"]
+    again = executor.submit(job)
+    assert again["returncode"] == 0 and again["cache_hits"] == 1
+
+
+def test_dead_worker_is_replaced(executor, job):
+    (worker,) = executor._all
+    worker.process.kill()
+    worker.process.join()
+    reply = executor.submit(job)
+    assert reply["returncode"] == 1 and "worker died" in reply["stderr"]
+    assert executor._all[0] is not worker and executor._all[0].process.is_alive()
+    assert executor.submit(job)["returncode"] == 0
+
+
+def test_client_submits_over_the_socket(executor, job, tmp_path, monkeypatch):
+    socket_path = str(tmp_path / "executor.sock")
+    monkeypatch.setattr(client, "SOCKET_PATH", socket_path)
+    assert client.submit(job["config"], job["log"]) is None
+
+    threading.Thread(target=serve, args=(socket_path, executor), daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not (tmp_path / "executor.sock").exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    result = client.submit(job["config"], job["log"], timeout=60)
+    assert result.returncode == 0 and result.cpu_seconds is not None
+    assert (tmp_path / "results.csv").exists()
+
+
+def test_slow_job_times_out_and_the_worker_is_replaced(job, monkeypatch):
+    monkeypatch.setenv("STUB_REINVENT_DELAY", "30")
+    executor = WarmExecutor(workers=1, runner="stub", cache_bytes=1 << 20, job_timeout=0.5)
+    try:
+        (worker,) = executor._all
+        reply = executor.submit(job)
+        assert reply["returncode"] == 1 and "timed out" in reply["stderr"]
+        assert not worker.process.is_alive()
+        assert executor._all[0] is not worker and executor._idle == executor._all
+    finally:
+        executor.shutdown()
+
+
+def test_failed_replacement_is_not_released(executor, job, monkeypatch):
+    (worker,) = executor._all
+    worker.process.kill()
+    monkeypatch.setattr(server, "WarmWorker", lambda *args: (_ for _ in ()).throw(RuntimeError("no spawn")))
+    assert executor.submit(job)["returncode"] == 1
+    assert executor._all == [] and executor._idle == []
+    with pytest.raises(RuntimeError, match="No REINVENT workers"):
+        executor.submit(job)
@@ -0,0 +1,111 @@
+#  ./tests/test_fingerprint_index.py
+import shutil
+import numpy as np
+from tests import datasets
+from src.services import fingerprint_index, fingerprints
+from src.services.fingerprint_index import FingerprintIndex
+
+
+def _segment_rows(view, run_id):
+    (segment,) = [s for s in view.segments if s["live"] and s["run_id"] == run_id]
+    return np.asarray(view.data[segment["start"]:segment["start"] + segment["rows"]])
+
+
+def test_sync_appends_every_run(project_path, add_run):
+    run_a, run_b = add_run("run_a", 120, seed=1), add_run("run_b", 80, seed=2)
+    view = fingerprint_index.load_view(project_path)
+    assert view.live_rows == view.rows == 200
+    for run_path in (run_a, run_b):
+        np.testing.assert_array_equal(_segment_rows(view, run_path.name), fingerprints.load_run_fingerprints(run_path))
+    np.testing.assert_array_equal(np.asarray(view.counts), fingerprints.popcount(np.asarray(view.data)))
+
+
+def test_adding_a_current_run_is_a_no_op(project_path, add_run):
+    add_run("run_a", 50)
+    index = FingerprintIndex(project_path)
+    assert index.add_run("run_a")
+    assert not index.add_run("run_a")
+    assert index.manifest()["rows"] == 50
+
+
+def test_changed_run_is_appended_again(project_path, add_run):
+    add_run("run_a", 40, seed=1)
+    add_run("run_b", 200, seed=2)
+    fingerprint_index.load_view(project_path)
+    run_a = add_run("run_a", 60, seed=3)
+
+    # 40 dead of 300 rows stays under COMPACT_FRACTION, so nothing is rewritten yet
+    view = fingerprint_index.load_view(project_path)
+    assert view.rows == 300 and view.live_rows == 260
+    assert [(s["run_id"], s["live"]) for s in view.segments] == [("run_a", False), ("run_b", True), ("run_a", True)]
+    np.testing.assert_array_equal(_segment_rows(view, "run_a"), fingerprints.load_run_fingerprints(run_a))
+
+
+def test_compact_drops_dead_rows_and_keeps_open_views(project_path, add_run):
+    add_run("run_a", 40, seed=1)
+    run_b = add_run("run_b", 200, seed=2)
+    index = FingerprintIndex(project_path)
+    index.sync()
+    add_run("run_a", 60, seed=3)
+    index.sync()
+    before = fingerprint_index.load_view(project_path, sync=False)
+    old_files = [index.path / before.manifest["data"], index.path / before.manifest["counts"]]
+    live_before = {s["run_id"]: _segment_rows(before, s["run_id"]) for s in before.segments if s["live"]}
+
+    assert index.compact(force=True)
+    after = fingerprint_index.load_view(project_path, sync=False)
+    assert after.rows == after.live_rows == 260
+    assert all(s["live"] for s in after.segments)
+    assert not any(path.exists() for path in old_files)
+    for run_id, rows in live_before.items():
+        np.testing.assert_array_equal(_segment_rows(after, run_id), rows)
+    # A view taken before compaction still reads its own mapped files
+    np.testing.assert_array_equal(_segment_rows(before, "run_b"), fingerprints.load_run_fingerprints(run_b))
+    assert not index.compact(force=True)
+
+
+def test_deleted_runs_are_dropped(project_path, add_run):
+    add_run("run_a", 100, seed=1)
+    run_b = add_run("run_b", 50, seed=2)
+    fingerprint_index.load_view(project_path)
+    shutil.rmtree(project_path / "runs" / "run_a")
+
+    # Two thirds of the rows are dead, past COMPACT_FRACTION, so sync compacts
+    view = fingerprint_index.load_view(project_path)
+    assert [s["run_id"] for s in view.segments] == ["run_b"]
+    assert view.rows == 50
+    np.testing.assert_array_equal(_segment_rows(view, "run_b"), fingerprints.load_run_fingerprints(run_b))
+
+
+def test_compacting_every_run_away(project_path, add_run):
+    add_run("run_a", 30)
+    fingerprint_index.load_view(project_path)
+    shutil.rmtree(project_path / "runs" / "run_a")
+    view = fingerprint_index.load_view(project_path)
+    assert view.rows == 0 and view.live_ranges() == []
+
+
+def test_rows_map_back_to_runs(project_path, add_run):
+    add_run("run_a", 10, seed=1)
+    add_run("run_b", 10, seed=2)
+    view = fingerprint_index.load_view(project_path)
+    assert view.locate([0, 9, 10, 19]) == [("run_a", 0), ("run_a", 9), ("run_b", 0), ("run_b", 9)]
+    split = [(run_id, index_rows.tolist(), rows.tolist()) for run_id, index_rows, rows in view.split_by_run([2, 5, 11])]
+    assert split == [("run_a", [2, 5], [2, 5]), ("run_b", [11], [1])]
+
+
+def test_view_is_reused_until_the_manifest_changes(project_path, add_run):
+    add_run("run_a", 20)
+    first = fingerprint_index.load_view(project_path)
+    assert fingerprint_index.load_view(project_path) is first
+    add_run("run_b", 20, seed=1)
+    second = fingerprint_index.load_view(project_path)
+    assert second is not first and second.stamp != first.stamp
+
+
+def test_fingerprints_of_the_index_match_rdkit(project_path, add_run):
+    run_path = add_run("run_a", 25, seed=4)
+    view = fingerprint_index.load_view(project_path)
+    smiles = datasets.synthetic_smiles(25, seed=4)
+    expected = fingerprints.compute(smiles, "morgan", workers=1)
+    np.testing.assert_array_equal(_segment_rows(view, run_path.name), expected)
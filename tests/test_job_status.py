@@ -0,0 +1,87 @@
+#  ./tests/test_job_status.py
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from src.db.models import Base, Job
+from src.services import job_status
+from src.services.job_status import JobStatusWriter
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([Job(task_id=f"task_{i}", project_id="p", run_id=f"run_{i}", job_type="generate") for i in range(3)])
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    statuses = []
+    monkeypatch.setattr(job_status, "publish_status", lambda task_id, status: statuses.append((task_id, status)))
+    return statuses
+
+
+@pytest.fixture
+def writer(session_factory, published):
+    # The background flusher never fires on its own; tests flush explicitly
+    return JobStatusWriter(session_factory, flush_interval=3600, batch_size=1000)
+
+
+def _jobs(session_factory):
+    with session_factory() as db:
+        return {job.task_id: job for job in db.execute(select(Job)).scalars()}
+
+
+def test_updates_are_merged_and_written_together(writer, session_factory, published):
+    writer.record("task_0", status="running")
+    writer.record("task_1", status="running")
+    writer.record("task_0", status="completed", molecule_count=5)
+    assert _jobs(session_factory)["task_0"].status == "queued"
+
+    assert writer.flush() == 2
+    jobs = _jobs(session_factory)
+    assert (jobs["task_0"].status, jobs["task_0"].molecule_count) == ("completed", 5)
+    assert jobs["task_1"].status == "running" and jobs["task_2"].status == "queued"
+    assert sorted(published) == [("task_0", "completed"), ("task_1", "running")]
+    assert writer.flush() == 0
+
+
+def test_fail_marks_the_job_failed(writer, session_factory):
+    writer.fail("task_0", "x" * 5000)
+    assert writer.pop_failed("task_0") and not writer.pop_failed("task_0")
+    writer.flush()
+    job = _jobs(session_factory)["task_0"]
+    assert job.status == "failed" and len(job.error) == 2000 and job.finished_at is not None
+
+
+def test_failed_flush_keeps_newer_updates(writer, session_factory, tmp_path):
+    writer.record("task_0", status="running", molecule_count=1)
+    writer.session_factory = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'missing' / 'jobs.sqlite'}"))
+    with pytest.raises(OperationalError):
+        writer.flush()
+    writer.record("task_0", status="completed")
+    writer.session_factory = session_factory
+    writer.flush()
+    job = _jobs(session_factory)["task_0"]
+    assert (job.status, job.molecule_count) == ("completed", 1)
+
+
+def test_empty_task_ids_are_ignored(writer):
+    writer.record(None, status="running")
+    writer.record("", status="running")
+    assert writer.flush() == 0
+
+
+def test_updates_for_tasks_without_a_job_are_dropped(writer, session_factory, published, capsys):
+    writer.record("shard_task", status="running")
+    writer.record("task_0", status="running")
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+    assert published == [("task_0", "running")]
+    assert "Dropping" not in capsys.readouterr().out
@@ -0,0 +1,79 @@
+#  ./tests/test_process_pool.py
+import multiprocessing
+import os
+import pytest
+from src.services import process_pool
+from src.services.descriptor_service import compute_descriptors
+
+
+def _pid(item):
+    return item, os.getpid()
+
+
+def _fail(item):
+    if item == 3:
+        raise ValueError("bad item")
+    return item
+
+
+def _exit_in_pool(item):
+    # Kills its pool process, but not the caller that finishes the work in-process
+    if item == 2 and multiprocessing.current_process().name != "MainProcess":
+        os._exit(1)
+    return item
+
+
+def _in_daemon(target, queue):
+    try:
+        queue.put(target())
+    except Exception as e:
+        queue.put(e)
+
+
+def _run_in_daemon(target):
+    """ Runs target in a daemonic process, as Celery's prefork pool runs tasks, and returns its result. """
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_in_daemon, args=(target, queue), daemon=True)
+    process.start()
+    result = queue.get(timeout=120)
+    process.join()
+    return result
+
+
+def _pool_pids():
+    return os.getpid(), [pid for _, pid in process_pool.imap(_pid, range(8), 2, "Test")]
+
+
+def _descriptors_in_daemon():
+    smiles = ["CCO", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1", "C1CC"] * 10
+    return compute_descriptors(smiles, workers=2, chunk_size=5, use_cache=False)
+
+
+def test_results_keep_input_order():
+    assert [item for item, _ in process_pool.imap(_pid, range(20), 3, "Test")] == list(range(20))
+
+
+def test_single_worker_runs_in_process():
+    assert {pid for _, pid in process_pool.imap(_pid, range(4), 1, "Test")} == {os.getpid()}
+
+
+def test_pool_starts_inside_a_daemonic_process():
+    parent, pids = _run_in_daemon(_pool_pids)
+    assert len(pids) == 8 and parent not in pids
+
+
+def test_descriptors_from_a_daemonic_process(capfd):
+    expected = compute_descriptors(["CCO", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1", "C1CC"] * 10, workers=1, use_cache=False)
+    assert _run_in_daemon(_descriptors_in_daemon).equals(expected)
+    assert "pool unavailable" not in capfd.readouterr().out
+
+
+def test_work_errors_propagate():
+    with pytest.raises(ValueError, match="bad item"):
+        list(process_pool.imap(_fail, range(6), 2, "Test"))
+
+
+def test_lost_worker_falls_back_in_process(capfd):
+    assert list(process_pool.imap(_exit_in_pool, range(6), 2, "Test")) == list(range(6))
+    assert "Test pool unavailable" in capfd.readouterr().out
@@ -0,0 +1,130 @@
+#  ./tests/test_result_stream.py
+import base64
+import json
+import numpy as np
+import pytest
+from tests import datasets
+from src.services import result_stream, results_store
+
+
+@pytest.mark.parametrize("position", [-1, 0, 1, 12345, 2 ** 40])
+def test_cursor_round_trip(position):
+    assert result_stream.decode_cursor(result_stream.encode_cursor(position)) == position
+
+
+def test_cursor_kinds_are_not_interchangeable():
+    with pytest.raises(ValueError):
+        result_stream.decode_cursor(result_stream.encode_cursor(10), result_stream.OFFSET_CURSOR)
+    with pytest.raises(ValueError):
+        result_stream.decode_cursor(result_stream.encode_cursor(10, result_stream.OFFSET_CURSOR))
+
+
+def _cursor(document) -> str:
+    return base64.urlsafe_b64encode(json.dumps(document).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "", "abc", _cursor({"after": 1}), _cursor({"kind": "row", "after": "x"}), _cursor({"kind": "row", "after": -5}),
+    _cursor({"kind": "row", "after": 1.5}), _cursor({"kind": "row", "before": 1}), _cursor({"kind": "page", "after": 1}),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        result_stream.decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once():
+    row_ids = np.array([0, 3, 4, 9, 10, 11, 20, 31, 32], dtype=np.int64)
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = result_stream.paginate(row_ids, cursor, limit=4)
+        seen.extend(page.tolist())
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == row_ids.tolist()
+    assert pages == 3
+
+
+def test_exact_last_page_has_no_cursor():
+    row_ids = np.arange(8, dtype=np.int64)
+    page, cursor = result_stream.paginate(row_ids, limit=4)
+    page, cursor = result_stream.paginate(row_ids, cursor, limit=4)
+    assert page.tolist() == [4, 5, 6, 7] and cursor is None
+
+
+def test_cursor_survives_rows_removed_before_it():
+    # Keyset cursors point at a row id, so filtering earlier rows away does not skip or repeat rows
+    page, cursor = result_stream.paginate(np.arange(10, dtype=np.int64), limit=5)
+    page, _ = result_stream.paginate(np.array([1, 2, 7, 8], dtype=np.int64), cursor, limit=5)
+    assert page.tolist() == [7, 8]
+
+
+def test_no_limit_returns_everything():
+    page, cursor = result_stream.paginate(np.arange(5, dtype=np.int64))
+    assert page.tolist() == list(range(5)) and cursor is None
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    return datasets.write_results_run(tmp_path / "run", 500, seed=2)
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson", "csv"])
+def test_stream_rows_returns_selected_rows_in_order(parquet_path, output_format):
+    row_ids = np.array([1, 2, 3, 250, 499], dtype=np.int64)
+    body = b"".join(result_stream.stream_rows(parquet_path, row_ids, output_format)).decode()
+    expected = results_store.read_rows(parquet_path, row_ids, columns=["SMILES"])["SMILES"]
+    if output_format == "json":
+        smiles = [row["SMILES"] for row in json.loads(body)]
+    elif output_format == "ndjson":
+        smiles = [json.loads(line)["SMILES"] for line in body.splitlines()]
+    else:
+        lines = body.splitlines()
+        assert lines[0].startswith('"SMILES"')
+        smiles = [line.split(",", 1)[0].strip('"') for line in lines[1:]]
+    assert smiles == list(expected)
+
+
+@pytest.mark.parametrize("output_format", ["json", "csv"])
+def test_stream_rows_without_matches(parquet_path, output_format):
+    body = b"".join(result_stream.stream_rows(parquet_path, np.zeros(0, dtype=np.int64), output_format))
+    assert body == b"[]" if output_format == "json" else body.decode().startswith("SMILES,")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text("SMILES,QED\n" + "".join(f"C{i},0.{i}\n" for i in range(10)))
+    return path
+
+
+def test_csv_file_pages(csv_path):
+    cursor, lines = None, []
+    while True:
+        offset = result_stream.file_offset(csv_path, cursor)
+        end = result_stream.page_end_offset(csv_path, offset, 4)
+        page = b"".join(result_stream.stream_csv_file(csv_path, offset, end)).decode().splitlines()
+        assert page[0] == "SMILES,QED"
+        lines.extend(page[1:])
+        if end is None:
+            break
+        cursor = result_stream.encode_cursor(end, result_stream.OFFSET_CURSOR)
+    assert lines == [f"C{i},0.{i}" for i in range(10)]
+
+
+def test_file_offset_accepts_the_end_of_the_file(csv_path):
+    size = csv_path.stat().st_size
+    offset = result_stream.file_offset(csv_path, result_stream.encode_cursor(size, result_stream.OFFSET_CURSOR))
+    assert b"".join(result_stream.stream_csv_file(csv_path, offset)) == b"SMILES,QED\n"
+
+
+@pytest.mark.parametrize("offset", [-1, 0, 5, 13, 10 ** 6])
+def test_file_offset_rejects_offsets_off_a_data_line(csv_path, offset):
+    # 0 and 5 fall in the header, 13 inside the first data line, 10 ** 6 past the end
+    with pytest.raises(ValueError):
+        result_stream.file_offset(csv_path, result_stream.encode_cursor(offset, result_stream.OFFSET_CURSOR))
+
+
+def test_file_offset_rejects_row_cursors(csv_path):
+    with pytest.raises(ValueError):
+        result_stream.file_offset(csv_path, result_stream.encode_cursor(15))
@@ -0,0 +1,54 @@
+#  ./tests/test_results_index.py
+import json
+import numpy as np
+from src.services import results_index, results_store
+from tests import datasets
+
+
+def test_rebuild_switches_versions_and_keeps_the_previous(tmp_path):
+    parquet_path = datasets.write_results_run(tmp_path / "run", 200)
+    index_path = parquet_path.parent / results_index.INDEX_DIR
+    first = json.loads((index_path / results_index.META).read_text())["version"]
+    opened = results_index.RangeIndex(index_path)
+
+    for _ in range(2):
+        results_index.build_index(parquet_path)
+    current = json.loads((index_path / results_index.META).read_text())["version"]
+    versions = {p.name for p in index_path.iterdir() if p.is_dir()}
+    assert current in versions and first not in versions and len(versions) == 2
+    # An index opened before the swap still reads its memory maps
+    qed = results_store.read_columns(parquet_path, ["QED"])["QED"]
+    assert len(opened.select({"QED": (0.5, 1)})) == int((qed >= 0.5).sum())
+
+
+def test_selection_matches_a_scan(tmp_path):
+    parquet_path = datasets.write_results_run(tmp_path / "run", 500, seed=3)
+    values = results_store.read_columns(parquet_path, ["QED", "SlogP"])
+    expected = np.flatnonzero((values["QED"] >= 0.5) & (values["SlogP"] <= 2))
+    rows = results_index.RangeIndex(parquet_path.parent / results_index.INDEX_DIR).select(
+        {"QED": (0.5, 1), "SlogP": (-100, 2)})
+    assert sorted(rows.tolist()) == expected.tolist()
+
+
+def test_flat_index_is_still_read_and_replaced(tmp_path):
+    parquet_path = datasets.write_results_run(tmp_path / "run", 50)
+    index_path = parquet_path.parent / results_index.INDEX_DIR
+    meta = json.loads((index_path / results_index.META).read_text())
+    for path in (index_path / meta.pop("version")).iterdir():
+        path.rename(index_path / path.name)
+    (index_path / results_index.META).write_text(json.dumps(meta))
+    assert results_index.RangeIndex(index_path).rows == 50
+
+    results_index.build_index(parquet_path)
+    assert not list(index_path.glob("*.npy"))
+
+
+def test_loaded_indexes_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(results_index, "INDEX_CACHE_ENTRIES", 2)
+    monkeypatch.setattr(results_index, "_indexes", type(results_index._indexes)())
+    paths = [datasets.write_results_run(tmp_path / f"run_{i}", 20, seed=i) for i in range(3)]
+    for path in paths:
+        results_index.load_index(path)
+    results_index.load_index(paths[1])
+    results_index.load_index(paths[0])
+    assert list(results_index._indexes) == [str(paths[i].parent / results_index.INDEX_DIR) for i in (1, 0)]
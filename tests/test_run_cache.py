@@ -0,0 +1,87 @@
+#  ./tests/test_run_cache.py
+import pytest
+from src.services import run_cache
+
+CONFIG = """
+run_type = "sampling"
+device = "cpu"
+seed = {seed}
+json_out_config = "{folder}/sampling.json"
+
+[parameters]
+model_file = "{model}"
+output_file = "{folder}/results.csv"
+num_smiles = {num_smiles}
+"""
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "agent.pt"
+    path.write_bytes(b"weights-v1")
+    return path
+
+
+@pytest.fixture
+def write_config(tmp_path, model):
+    def write(name="run", seed=42, num_smiles=100, model_path=None):
+        folder = tmp_path / name
+        folder.mkdir(exist_ok=True)
+        path = folder / "config.toml"
+        seed_line = seed if seed is not None else '""'
+        text = CONFIG.format(seed=seed_line, folder=folder, model=model_path or model, num_smiles=num_smiles)
+        if seed is None:
+            text = text.replace('seed = ""\n', "")
+        path.write_text(text)
+        return path
+    return write
+
+
+def test_key_ignores_output_paths(write_config):
+    assert run_cache.run_key(write_config("run_1")) == run_cache.run_key(write_config("run_2"))
+
+
+def test_unseeded_runs_have_no_key(write_config):
+    assert run_cache.run_key(write_config(seed=None)) is None
+
+
+def test_missing_model_has_no_key(write_config, tmp_path):
+    assert run_cache.run_key(write_config(model_path=tmp_path / "missing.pt")) is None
+
+
+@pytest.mark.parametrize("change", [{"seed": 7}, {"num_smiles": 101}])
+def test_key_changes_with_parameters(write_config, change):
+    assert run_cache.run_key(write_config("run_1")) != run_cache.run_key(write_config("run_2", **change))
+
+
+def test_key_changes_with_model_content(write_config, model):
+    config = write_config()
+    before = run_cache.run_key(config)
+    model.write_bytes(b"weights-v2")
+    assert run_cache.run_key(config) != before
+
+
+def test_key_changes_with_extra_settings(write_config):
+    config = write_config()
+    assert run_cache.run_key(config, descriptors=True) != run_cache.run_key(config, descriptors=False)
+    assert run_cache.run_key(config, descriptors=True) == run_cache.run_key(config, descriptors=True)
+
+
+def test_store_and_restore(tmp_path):
+    cache = run_cache.RunCache(tmp_path / "cache")
+    run_path = tmp_path / "runs" / "run_1"
+    (run_path / "shards").mkdir(parents=True)
+    (run_path / "results.csv").write_text("SMILES\nCCO\n")
+    (run_path / "shards" / "0.csv").write_text("SMILES\nCCO\n")
+    key = "ab" * 32
+
+    assert cache.lookup(key) is None
+    cache.store(key, run_path, ["results.csv", "shards", "missing.parquet"], molecule_count=1)
+    entry = cache.lookup(key)
+    assert entry is not None
+
+    restored = tmp_path / "runs" / "run_2"
+    manifest = cache.restore(entry, restored)
+    assert manifest["artifacts"] == ["results.csv", "shards"] and manifest["molecule_count"] == 1
+    assert (restored / "results.csv").read_text() == "SMILES\nCCO\n"
+    assert (restored / "shards" / "0.csv").read_text() == "SMILES\nCCO\n"
@@ -0,0 +1,97 @@
+#  ./tests/test_sharding.py
+import subprocess
+import pandas as pd
+import pytest
+from src.executor.runners import StubRunner
+from src.services import results_store
+from src.services.smiles_stream import canonicalize
+from src.tasks import sharding
+
+
+def _stub(config_path, log_path):
+    returncode = StubRunner().run(config_path, log_path)
+    return subprocess.CompletedProcess(["reinvent", str(config_path)], returncode, "", "stub failed")
+
+
+@pytest.fixture
+def run_path(project_path, monkeypatch):
+    monkeypatch.setitem(sharding.RUNNERS, "stub", _stub)
+    path = project_path / "runs" / "run_1"
+    path.mkdir()
+    return path
+
+
+def _config(run_path, num_smiles, unique=True):
+    return {
+        "run_type": "sampling",
+        "seed": 11,
+        "parameters": {
+            "model_file": "",
+            "output_file": str(run_path / "raw_results.csv"),
+            "num_smiles": num_smiles,
+            "unique_molecules": unique,
+        },
+    }
+
+
+def _run_shards(config, run_path, shard_size, descriptors=False):
+    """ Runs a sharded sampling the way the chord would, shards first and then the merge. """
+    shard_results = []
+    for index, count in enumerate(sharding.plan_shards(config["parameters"]["num_smiles"], shard_size)):
+        spec = {"index": index, "count": count, "config": config, "run_path": str(run_path),
+                "descriptors": descriptors, "runner": "stub", "queue": "generation"}
+        shard_results.append(sharding.run_sampling_shard(spec))
+    merge_spec = {"config": config, "run_path": str(run_path), "descriptors": descriptors, "result": {"done": True}}
+    # Shards can finish in any order; the merge keeps them in index order
+    return shard_results, sharding.merge_sampling_shards(list(reversed(shard_results)), merge_spec)
+
+
+@pytest.mark.parametrize("num_smiles, shard_size, expected", [
+    (10, 50, [10]),
+    (100, 50, [50, 50]),
+    (101, 50, [34, 34, 33]),
+    (0, 50, [0]),
+])
+def test_plan_shards(num_smiles, shard_size, expected):
+    assert sharding.plan_shards(num_smiles, shard_size) == expected
+
+
+def test_merge_is_unique_across_shards(run_path):
+    config = _config(run_path, 300)
+    shard_results, result = _run_shards(config, run_path, shard_size=100)
+    assert result == {"done": True}
+    assert not (run_path / "shards").exists()
+
+    merged = pd.read_csv(run_path / "raw_results.csv")
+    canonical = [c for c in (canonicalize(smiles) for smiles in merged["SMILES"]) if c is not None]
+    assert len(set(canonical)) == len(canonical)
+    # The stub draws from a few fragments, so shards overlap and the merge has to drop repeats
+    assert len(merged) < sum(shard["rows"] for shard in shard_results)
+    assert list(merged.columns) == ["SMILES", "NLL"]
+
+
+def test_merge_keeps_duplicates_when_not_unique(run_path):
+    config = _config(run_path, 200, unique=False)
+    shard_results, _ = _run_shards(config, run_path, shard_size=100)
+    merged = pd.read_csv(run_path / "raw_results.csv")
+    assert len(merged) == 200 == sum(shard["rows"] for shard in shard_results)
+
+
+def test_merge_with_descriptors_writes_results(run_path):
+    config = _config(run_path, 120)
+    _run_shards(config, run_path, shard_size=60, descriptors=True)
+    merged = pd.read_csv(run_path / "raw_results.csv")
+    results = results_store.read_columns(run_path / results_store.RESULTS_PARQUET, ["SMILES", "MolecularWeight"])
+    # Unparseable molecules stay in the raw output but are not scored
+    assert results["SMILES"].tolist() == [s for s in merged["SMILES"] if canonicalize(s) is not None]
+    assert not pd.isna(results["MolecularWeight"]).any()
+
+
+def test_failed_shard_records_its_status(run_path, monkeypatch):
+    monkeypatch.setitem(sharding.RUNNERS, "stub", lambda config_path, log_path: subprocess.CompletedProcess([], 1, "", "boom"))
+    spec = {"index": 0, "count": 10, "config": _config(run_path, 10), "run_path": str(run_path),
+            "descriptors": False, "runner": "stub", "queue": "generation"}
+    with pytest.raises(RuntimeError, match="boom"):
+        sharding.run_sampling_shard(spec)
+    (status,) = sharding.shard_progress(run_path)
+    assert status["status"] == "failed" and status["error"] == "boom"
@@ -0,0 +1,69 @@
+#  ./tests/test_substructure.py
+import numpy as np
+import pytest
+from rdkit import Chem
+from tests import datasets
+from src.services import fingerprint_index, fingerprints, substructure
+
+PATTERNS = ["C(F)(F)F", "c1ccc2ccccc2c1", "[OX2H]c", "C#N", "c1ccncc1", "[#7]~[#6](=O)", "C1CCCCC1N", "[Cl,F]", "*"]
+RUNS = {"run_a": (400, 1), "run_b": (300, 2)}
+
+
+@pytest.fixture
+def project(project_path, add_run):
+    for run_id, (rows, seed) in RUNS.items():
+        add_run(run_id, rows, seed)
+    return project_path
+
+
+def _brute_force(smarts, runs=RUNS):
+    """ (run_id, row) of every molecule matching smarts, checked one by one. """
+    query = Chem.MolFromSmarts(smarts)
+    return {(run_id, row) for run_id, (rows, seed) in runs.items()
+            for row, smiles in enumerate(datasets.synthetic_smiles(rows, seed))
+            if Chem.MolFromSmiles(smiles).HasSubstructMatch(query)}
+
+
+@pytest.mark.parametrize("smarts", PATTERNS)
+def test_screen_keeps_every_match(project, smarts):
+    view = fingerprint_index.load_view(project, "pattern")
+    candidates = substructure.screen(view, fingerprints.query_pattern(substructure.parse_query(smarts)))
+    assert set(view.locate(candidates)) >= _brute_force(smarts)
+    assert np.all(np.diff(candidates) > 0)
+
+
+@pytest.mark.parametrize("smarts", PATTERNS)
+def test_search_equals_brute_force(project, smarts):
+    search = substructure.Search(project, smarts, workers=1)
+    found = [(run_id, int(row)) for run_id, rows in search for row in rows]
+    assert len(found) == len(set(found))
+    assert set(found) == _brute_force(smarts)
+
+
+def test_repeat_search_is_served_from_cache(project):
+    first = [(run_id, rows.tolist()) for run_id, rows in substructure.Search(project, "C#N", workers=1)]
+    # Bracketed atoms are written back without brackets, so this spelling shares the entry
+    again = substructure.Search(project, "[C]#[N]", workers=1)
+    assert again.cached is not None and again.candidates is None
+    assert [(run_id, rows.tolist()) for run_id, rows in again] == first
+
+
+def test_limited_search_is_not_cached(project):
+    limited = list(substructure.Search(project, "[Cl,F]", limit=5, workers=1))
+    assert sum(len(rows) for _, rows in limited) == 5
+    assert substructure.Search(project, "[Cl,F]", workers=1).cached is None
+
+
+def test_cache_is_invalidated_by_new_runs(project, add_run):
+    list(substructure.Search(project, "C(F)(F)F", workers=1))
+    add_run("run_c", 50, seed=3)
+    search = substructure.Search(project, "C(F)(F)F", workers=1)
+    assert search.cached is None
+    found = {(run_id, int(row)) for run_id, rows in search for row in rows}
+    assert found == _brute_force("C(F)(F)F", {**RUNS, "run_c": (50, 3)})
+
+
+@pytest.mark.parametrize("smarts", ["", "C(((", "[C"])
+def test_invalid_smarts(smarts):
+    with pytest.raises(ValueError):
+        substructure.parse_query(smarts)
@@ -0,0 +1,62 @@
+#  ./tests/test_training_state.py
+import threading
+from src.services import training_state
+
+
+def test_state_round_trip(tmp_path):
+    assert training_state.load_state(tmp_path) == {}
+    training_state.save_state(tmp_path, {"epochs": 3})
+    assert training_state.load_state(tmp_path) == {"epochs": 3}
+    assert [path.name for path in tmp_path.iterdir()] == [training_state.STATE_FILE]
+
+
+def test_appended_rows(tmp_path):
+    path = tmp_path / "train.smi"
+    path.write_text("SMILES\nCCO\n")
+    before = training_state.dataset_fingerprint(path)
+    assert training_state.appended_rows(path, before) is None
+    assert training_state.appended_rows(path, {}) is None
+
+    with open(path, "a") as f:
+        f.write("c1ccccc1\nCCN\n")
+    assert training_state.appended_rows(path, before) == b"c1ccccc1\nCCN\n"
+
+    # Rewriting the existing rows is not an append, even if the file grows
+    path.write_text("SMILES\nCCC\nc1ccccc1\n")
+    assert training_state.appended_rows(path, before) is None
+
+
+def test_checkpoints_are_renumbered_and_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(training_state, "KEEP_CHECKPOINTS", 2)
+    model_path, attempt_path = tmp_path / "models", tmp_path / "attempt"
+    attempt_path.mkdir()
+    for epoch in (1, 2, 3):
+        (attempt_path / f"agent.pt.{epoch}.chkpt").write_bytes(b"x")
+    (attempt_path / "agent.pt").write_bytes(b"model")
+
+    # The attempt resumed after epoch 5, so its epoch 1 is the project's epoch 6
+    assert training_state.collect_checkpoints(attempt_path, model_path, offset=5) == 8
+    assert [epoch for epoch, _ in training_state.checkpoints(model_path)] == [7, 8]
+    assert (attempt_path / "agent.pt").exists()
+
+    training_state.clear_checkpoints(model_path)
+    assert training_state.checkpoints(model_path) == []
+
+
+def test_lock_serializes_training(tmp_path):
+    order = []
+    holding = threading.Event()
+
+    def second():
+        holding.wait(5)
+        with training_state.locked(tmp_path / "models"):
+            order.append("second")
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    with training_state.locked(tmp_path / "models"):
+        holding.set()
+        thread.join(0.3)
+        order.append("first")
+    thread.join(5)
+    assert order == ["first", "second"]